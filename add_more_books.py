@@ -1,15 +1,13 @@
 """
 Add a larger, diverse set of books to the existing database.
-This script will add books only if their ISBN does not already exist in the database.
+Books whose ISBN already exists in the database are skipped.
 Run: python add_more_books.py
 """
 
 from app import app
-from extensions import db
-from models import Book
+from catalog_import import import_records
 
 books_to_add = [
-    {"title": "The Alchemist", "author": "Paulo Coelho", "isbn": "978-0061122415", "publication_year": 1988, "quantity": 5, "description": "A philosophical story about following your dreams."},
     {"title": "The Alchemist", "author": "Paulo Coelho", "isbn": "978-0061122415", "publication_year": 1988, "quantity": 5, "description": "A philosophical story about following your dreams.", "image_url": "https://covers.openlibrary.org/b/isbn/9780061122415-L.jpg"},
     {"title": "Sapiens: A Brief History of Humankind", "author": "Yuval Noah Harari", "isbn": "978-0062316097", "publication_year": 2011, "quantity": 4, "description": "Historical exploration of humanity's development."},
     {"title": "Atomic Habits", "author": "James Clear", "isbn": "978-0735211292", "publication_year": 2018, "quantity": 6, "description": "Practical strategies to build good habits and break bad ones."},
@@ -34,27 +32,9 @@ books_to_add = [
 
 
 def add_books():
-    added = 0
     with app.app_context():
-        for b in books_to_add:
-            existing = Book.query.filter_by(isbn=b['isbn']).first()
-            if existing:
-                print(f"Skipping existing book: {b['title']} ({b['isbn']})")
-                continue
-            book = Book(
-                title=b['title'],
-                author=b['author'],
-                isbn=b['isbn'],
-                publication_year=b['publication_year'],
-                quantity=b.get('quantity', 1),
-                available=True,
-                description=b.get('description', '')
-            )
-            db.session.add(book)
-            added += 1
-        if added:
-            db.session.commit()
-        print(f"Done. {added} new book(s) added.")
+        stats = import_records(books_to_add)
+    print(f"Done. {stats['inserted']} new book(s) added, {stats['duplicates']} already present.")
 
 
 if __name__ == '__main__':
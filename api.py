@@ -0,0 +1,275 @@
+"""Versioned JSON API for kiosks and mobile clients (`/api/v1`).
+
+Endpoints select only the columns they return and serialize plain rows, never
+ORM objects; responses are encoded with orjson when it is installed. The
+catalog listing shares `catalog.catalog_page()` (and its cache) with the HTML
+catalog, and borrow/return go through circulation.py like the web forms.
+Clients sign in with POST /api/v1/session and then send the session cookie.
+
+Errors are ``{"error": "..."}`` with a 4xx status. List endpoints take
+``limit`` and ``after`` and return ``{"items": [...], "next": cursor-or-null}``.
+"""
+import json
+from datetime import datetime
+from functools import wraps
+
+from flask import Blueprint, Response, request, session
+from sqlalchemy.exc import IntegrityError
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+import auth
+from auth import get_user_snapshot
+from catalog import FILTERS, SORTS, catalog_count, catalog_page
+from circulation import CirculationError, checkout_book, return_borrowing
+from extensions import db, read_replica
+from models import Book, Borrowing, Review, User, Wishlist
+from pagination import keyset_paginate
+from passwords import HashingBusy, password_hasher
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+BOOK_COLUMNS = (Book.id, Book.title, Book.author, Book.isbn, Book.publication_year, Book.quantity,
+                Book.available_copies, Book.rating_avg, Book.rating_count, Book.image_url)
+
+
+# -------------------- Helpers --------------------
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def json_response(data, status=200):
+    if orjson is not None:
+        body = orjson.dumps(data)
+    else:
+        body = json.dumps(data, default=_default, separators=(',', ':'))
+    return Response(body, status=status, mimetype='application/json')
+
+
+def error(message, status):
+    return json_response({'error': message}, status)
+
+
+def json_object():
+    """The request's JSON object body ({} when empty), or None for arrays, scalars and bad JSON"""
+    if not request.get_data():
+        return {}
+    data = request.get_json(silent=True)
+    return data if isinstance(data, dict) else None
+
+
+def api_login_required(view):
+    """401 instead of the HTML login redirect"""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if get_user_snapshot() is None:
+            return error('Authentication required.', 401)
+        return view(*args, **kwargs)
+    return wrapped
+
+
+def _limit():
+    return max(1, min(request.args.get('limit', DEFAULT_LIMIT, type=int), MAX_LIMIT))
+
+
+def _book_row(row):
+    book = dict(row._mapping)
+    book['available'] = book['available_copies'] > 0
+    book['rating_avg'] = round(book['rating_avg'], 1) if book['rating_count'] else 0
+    return book
+
+
+def _book_exists(book_id):
+    return db.session.query(Book.id).filter(Book.id == book_id).scalar() is not None
+
+
+def _page(page):
+    return {'items': page.items, 'next': page.next_cursor}
+
+
+def is_api_request():
+    """True for any URL under the API prefix, including ones that matched no route"""
+    return request.blueprint == api.name or request.path.startswith(api.url_prefix + '/')
+
+
+def http_error(e):
+    """JSON body for an HTTP error on an API URL (registered on the app, see app.py)"""
+    return error(e.description, e.code)
+
+
+# -------------------- Session --------------------
+@api.route('/session', methods=['POST'])
+def login():
+    data = json_object()
+    if data is None:
+        return error('Expected a JSON object.', 400)
+    username, password = data.get('username'), data.get('password')
+    if not isinstance(username, str) or not isinstance(password, str):
+        return error('username and password must be strings.', 400)
+    user = User.query.filter_by(username=username.strip()).first()
+    # Return the connection to the pool while the hash is checked
+    db.session.close()
+    try:
+        matches, new_hash = (password_hasher.verify(user.password, password)
+                             if user else (False, None))
+    except HashingBusy:
+        response = error('Too many sign-ins right now; retry shortly.', 503)
+        response.headers['Retry-After'] = '1'
+        return response
+    if not matches:
+        return error('Invalid username or password.', 401)
+    if new_hash:
+        user.password = new_hash
+        db.session.add(user)
+        try:
+            db.session.commit()
+        except Exception:
+            # Still a valid sign-in; the upgrade is retried next time
+            db.session.rollback()
+    session['user_id'] = user.id
+    session['username'] = user.username
+    return json_response({'id': user.id, 'username': user.username, 'is_admin': bool(user.is_admin)})
+
+
+@api.route('/session', methods=['DELETE'])
+def logout():
+    if 'user_id' in session:
+        auth.user_cache.discard(session['user_id'])
+    session.clear()
+    return json_response({}, 200)
+
+
+# -------------------- Catalog --------------------
+@api.route('/books')
+@read_replica
+@api_login_required
+def list_books():
+    search = request.args.get('search', '').strip()
+    filter_type = request.args.get('filter', 'all')
+    sort = request.args.get('sort', 'relevance' if search else 'title')
+    if filter_type not in FILTERS or sort not in SORTS:
+        return error(f'filter must be one of {", ".join(FILTERS)}; sort one of {", ".join(SORTS)}.', 400)
+    ids, next_cursor, _ = catalog_page(search, filter_type, sort, request.args.get('after', ''), _limit())
+    rows = {row.id: row for row in db.session.query(*BOOK_COLUMNS).filter(Book.id.in_(ids))} if ids else {}
+    return json_response({'items': [_book_row(rows[book_id]) for book_id in ids if book_id in rows],
+                          'next': next_cursor, 'total': catalog_count(search, filter_type)})
+
+
+@api.route('/books/<int:book_id>')
+@read_replica
+@api_login_required
+def book_detail(book_id):
+    row = db.session.query(*BOOK_COLUMNS, Book.description).filter(Book.id == book_id).first()
+    if row is None:
+        return error('Book not found.', 404)
+    book = _book_row(row)
+    book['on_loan'] = book['quantity'] - book['available_copies']
+    counts = dict(db.session.query(Review.rating, db.func.count(Review.id))
+                  .filter(Review.book_id == book_id).group_by(Review.rating))
+    book['rating_distribution'] = {str(stars): counts.get(stars, 0) for stars in range(1, 6)}
+    return json_response(book)
+
+
+# -------------------- Loans --------------------
+@api.route('/me/loans')
+@read_replica
+@api_login_required
+def my_loans():
+    status = request.args.get('status', 'open')
+    query = (db.session.query(Borrowing.id, Borrowing.book_id, Book.title, Book.author,
+                              Borrowing.borrow_date, Borrowing.due_date, Borrowing.return_date)
+             .join(Book, Book.id == Borrowing.book_id)
+             .filter(Borrowing.user_id == get_user_snapshot().id))
+    if status == 'open':
+        query = query.filter(Borrowing.return_date.is_(None))
+    elif status == 'returned':
+        query = query.filter(Borrowing.return_date.isnot(None))
+    elif status != 'all':
+        return error('status must be one of open, returned, all.', 400)
+    page = keyset_paginate(query, [Borrowing.borrow_date, Borrowing.id],
+                           after=request.args.get('after', ''), per_page=_limit(), descending=True)
+    now = datetime.now()
+    for loan in page.items:
+        loan['overdue'] = loan['return_date'] is None and loan['due_date'] < now
+    return json_response(_page(page))
+
+
+@api.route('/books/<int:book_id>/borrow', methods=['POST'])
+@api_login_required
+def borrow(book_id):
+    if not _book_exists(book_id):
+        return error('Book not found.', 404)
+    try:
+        borrowing = checkout_book(get_user_snapshot().id, book_id)
+    except CirculationError as e:
+        return error(str(e), 409)
+    return json_response({'id': borrowing.id, 'book_id': book_id, 'borrow_date': borrowing.borrow_date,
+                          'due_date': borrowing.due_date, 'return_date': None, 'overdue': False}, 201)
+
+
+@api.route('/loans/<int:borrowing_id>/return', methods=['POST'])
+@api_login_required
+def return_loan(borrowing_id):
+    owner = db.session.query(Borrowing.user_id).filter(Borrowing.id == borrowing_id).scalar()
+    if owner != get_user_snapshot().id:
+        return error('Loan not found.', 404)
+    try:
+        return_borrowing(borrowing_id)
+    except CirculationError as e:
+        return error(str(e), 409)
+    return json_response({'id': borrowing_id, 'returned': True})
+
+
+# -------------------- Wishlist --------------------
+@api.route('/me/wishlist')
+@read_replica
+@api_login_required
+def my_wishlist():
+    query = (db.session.query(Wishlist.id, Wishlist.book_id, Book.title, Book.author,
+                              Book.available_copies, Wishlist.added_at)
+             .join(Book, Book.id == Wishlist.book_id)
+             .filter(Wishlist.user_id == get_user_snapshot().id))
+    page = keyset_paginate(query, [Wishlist.added_at, Wishlist.id],
+                           after=request.args.get('after', ''), per_page=_limit(), descending=True)
+    return json_response(_page(page))
+
+
+@api.route('/me/wishlist', methods=['POST'])
+@api_login_required
+def add_to_wishlist():
+    data = json_object()
+    if data is None:
+        return error('Expected a JSON object.', 400)
+    book_id = data.get('book_id')
+    if not isinstance(book_id, int) or not _book_exists(book_id):
+        return error('Book not found.', 404)
+    item = Wishlist(user_id=get_user_snapshot().id, book_id=book_id)
+    db.session.add(item)
+    try:
+        # Flushes the new row, so a duplicate fails here
+        Wishlist.touch(item.user_id)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return error('Book already in wishlist.', 409)
+    return json_response({'id': item.id, 'book_id': book_id, 'added_at': item.added_at}, 201)
+
+
+@api.route('/me/wishlist/<int:book_id>', methods=['DELETE'])
+@api_login_required
+def remove_from_wishlist(book_id):
+    user_id = get_user_snapshot().id
+    removed = Wishlist.query.filter_by(user_id=user_id, book_id=book_id).delete(synchronize_session=False)
+    if removed:
+        Wishlist.touch(user_id)
+    db.session.commit()
+    if not removed:
+        return error('Book not in wishlist.', 404)
+    return json_response({}, 200)
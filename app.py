@@ -1,11 +1,14 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import (Flask, Response, render_template, request, redirect, url_for, session, flash, abort,
+                   jsonify, stream_with_context)
+import click
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
-from datetime import datetime, timedelta
+from sqlalchemy.orm import joinedload, selectinload
+from werkzeug.exceptions import HTTPException
+from datetime import datetime
+import hmac
 import os
-import uuid
 import re
+import time
 
 # -------------------- Validation Functions --------------------
 def validate_username(username):
@@ -39,25 +42,111 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///library.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SEARCH_BACKEND'] = os.environ.get('SEARCH_BACKEND', 'auto')
+# Seconds to cache catalog result totals; 0 hides totals entirely
+app.config['CATALOG_COUNT_TTL'] = int(os.environ.get('CATALOG_COUNT_TTL', '60'))
+app.config['DASHBOARD_BOOKS'] = int(os.environ.get('DASHBOARD_BOOKS', '6'))
+app.config['PROFILE_HISTORY_PER_PAGE'] = int(os.environ.get('PROFILE_HISTORY_PER_PAGE', '20'))
+app.config['OVERDUE_REPORT_PER_PAGE'] = int(os.environ.get('OVERDUE_REPORT_PER_PAGE', '25'))
+app.config['ADMIN_BOOKS_PER_PAGE'] = int(os.environ.get('ADMIN_BOOKS_PER_PAGE', '50'))
+# Listings eager-load their rows' books; when set, any other relationship access raises (see models.eager)
+app.config['STRICT_LOADING'] = os.environ.get('STRICT_LOADING', '') == '1'
+# Remembers Open Library cover lookups between resolve-covers runs
+app.config['COVER_CACHE_PATH'] = os.environ.get(
+    'COVER_CACHE_PATH', os.path.join(app.instance_path, 'cover_cache.sqlite3'))
+# Seconds a user's id/username/admin snapshot may be served from memory
+app.config['USER_CACHE_TTL'] = int(os.environ.get('USER_CACHE_TTL', '30'))
+app.config['USER_CACHE_MAX_ENTRIES'] = int(os.environ.get('USER_CACHE_MAX_ENTRIES', '10000'))
+# Password hashing pool (passwords.py); existing hashes are upgraded on login when these change
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2')
+app.config['PASSWORD_SALT_LENGTH'] = int(os.environ.get('PASSWORD_SALT_LENGTH', '16'))
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', '2'))
+# Unset: as many as the workers can finish within the timeout (passwords.default_queue_limit)
+app.config['PASSWORD_HASH_QUEUE'] = (int(os.environ['PASSWORD_HASH_QUEUE'])
+                                     if os.environ.get('PASSWORD_HASH_QUEUE') else None)
+app.config['PASSWORD_HASH_TIMEOUT'] = float(os.environ.get('PASSWORD_HASH_TIMEOUT', '10'))
+app.config['PASSWORD_HASH_NICE'] = int(os.environ.get('PASSWORD_HASH_NICE', '10'))
+# Rendered catalog cards kept in memory (one per book)
+app.config['BOOK_CARD_CACHE_SIZE'] = int(os.environ.get('BOOK_CARD_CACHE_SIZE', '5000'))
+# Query-result cache (cache.py): sqlite (file shared by the host's workers), redis, memory (one process) or null
+app.config['CACHE_BACKEND'] = os.environ.get('CACHE_BACKEND', 'sqlite')
+app.config['CACHE_URL'] = os.environ.get('CACHE_URL', os.path.join(app.instance_path, 'query_cache.sqlite3'))
+app.config['CACHE_DEFAULT_TTL'] = int(os.environ.get('CACHE_DEFAULT_TTL', '300'))
+# Requests over either budget are logged (metrics.py); METRICS_TOKEN lets a scraper read /admin/metrics
+app.config['METRICS_QUERY_BUDGET'] = int(os.environ.get('METRICS_QUERY_BUDGET', '20'))
+app.config['METRICS_LATENCY_BUDGET_MS'] = int(os.environ.get('METRICS_LATENCY_BUDGET_MS', '500'))
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN', '')
+
+# Database engine profile (pragmas / pooling), overridable via DB_* env vars
+from extensions import (REPLICA_BIND, db, engine_options, init_replica_routing,
+                        install_sqlite_pragmas, load_engine_profile, read_replica)
+app.config['DB_PROFILE'] = load_engine_profile()
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(
+    app.config['SQLALCHEMY_DATABASE_URI'], app.config['DB_PROFILE'])
+
+# Optional read replica for read-only views
+app.config['SQLALCHEMY_BINDS'] = {}
+if os.environ.get('DATABASE_REPLICA_URL'):
+    replica_url = os.environ['DATABASE_REPLICA_URL']
+    app.config['SQLALCHEMY_BINDS'][REPLICA_BIND] = dict(
+        url=replica_url, **engine_options(replica_url, app.config['DB_PROFILE']))
+app.config['REPLICA_RYW_SECONDS'] = int(os.environ.get('REPLICA_RYW_SECONDS', '5'))
 
 # Initialize extensions
-from extensions import db
 db.init_app(app)
+init_replica_routing(app)
+
+# Request timing and SQL counting; registered first so it times the other hooks too
+from metrics import metrics
+metrics.init_app(app)
+with app.app_context():
+    for engine in db.engines.values():
+        install_sqlite_pragmas(engine, app.config['DB_PROFILE'])
 
 # Import models after `db` is available (models import `db` from extensions)
-from models import User, Book, Borrowing, Wishlist, Review
+from models import User, Book, Borrowing, Wishlist, Review, eager
 
-# Ensure tables exist
+import auth
+from auth import admin_required, get_current_user, get_user_snapshot, login_required
+auth.init_app(app)
+from passwords import HashingBusy, password_hasher
+password_hasher.init_app(app)
+
+# Ensure tables exist, then bring older databases up to the current schema
+import migrations
 with app.app_context():
     db.create_all()
+    migrations.upgrade(db.engine)
+
+# Full-text catalog search (installs its index after the tables exist)
+from search import book_search
+book_search.init_app(app)
+
+from pagination import KeysetPage, keyset_paginate
+from circulation import CirculationError, checkout_book, return_borrowing
+from reminders import sweep_reminders
+from catalog_import import FORMATS, import_books
+from covers import CoverResolver, resolve_missing_covers
+import exports
+from cover_uploads import InvalidCover, cover_store
+cover_store.init_app(app)
+import conditional
+from conditional import not_modified, render_with_validators
+conditional.init_app(app)
+import fragments
+fragments.init_app(app)
+from cache import query_cache
+query_cache.init_app(app)
+metrics.register_cache('book_cards', fragments.book_cards.stats)
+metrics.register_cache('query_cache', query_cache.stats)
+from catalog import FILTERS, INVENTORY_SORTS, catalog_count, catalog_page, catalog_query
+from api import api, http_error as api_http_error, is_api_request
+app.register_blueprint(api)
 
 # -------------------- Template context --------------------
 @app.context_processor
 def inject_user():
-    user = None
-    if 'user_id' in session:
-        user = User.query.get(session['user_id'])
-    return dict(current_user=user)
+    return dict(current_user=get_user_snapshot())
 
 # -------------------- Routes --------------------
 @app.route('/')
@@ -101,7 +190,11 @@ def register():
             flash('Email already registered.', 'error')
             return redirect(url_for('register'))
 
-        hashed = generate_password_hash(password)
+        try:
+            hashed = password_hasher.hash(password)
+        except HashingBusy:
+            flash('The server is busy. Please try again in a moment.', 'error')
+            return redirect(url_for('register'))
         user = User(username=username, email=email, password=hashed)
         try:
             db.session.add(user)
@@ -125,7 +218,22 @@ def login():
             flash('Username and password required.', 'error')
             return redirect(url_for('login'))
         user = User.query.filter_by(username=username).first()
-        if user and check_password_hash(user.password, password):
+        # Return the connection to the pool; a login rush may wait on hashes for seconds
+        db.session.close()
+        try:
+            matches, new_hash = password_hasher.verify(user.password, password) if user else (False, None)
+        except HashingBusy:
+            flash('The server is busy. Please try again in a moment.', 'error')
+            return redirect(url_for('login'))
+        if matches:
+            if new_hash:
+                # Stored with older hash parameters; upgrade while we have the password
+                user.password = new_hash
+                db.session.add(user)
+                try:
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
             session['user_id'] = user.id
             session['username'] = user.username
             flash(f'Welcome back, {user.username}!', 'success')
@@ -137,105 +245,113 @@ def login():
 # Logout
 @app.route('/logout')
 def logout():
+    if 'user_id' in session:
+        auth.user_cache.discard(session['user_id'])
     session.clear()
     flash('You have been logged out.', 'info')
     return redirect(url_for('login'))
 
 # Dashboard
 @app.route('/dashboard')
+@read_replica
+@login_required
 def dashboard():
-    if 'user_id' not in session:
-        flash('Please log in first.', 'error')
-        return redirect(url_for('login'))
-    user = User.query.get(session['user_id'])
-    if not user:
-        session.clear()
-        flash('User not found.', 'error')
-        return redirect(url_for('login'))
-    borrowed_books = Borrowing.query.filter_by(user_id=user.id, return_date=None).all()
-    available_books = Book.query.filter(Book.quantity > 0).all()
-    return render_template('dashboard.html', user=user, borrowed_books=borrowed_books, available_books=available_books)
+    user = get_current_user()
+    borrowed_books = (Borrowing.query.options(*eager(joinedload(Borrowing.book)))
+                      .filter_by(user_id=user.id, return_date=None).all())
+    # Newest in-stock titles only; the full list lives on the catalog page
+    available_books = (Book.query.filter(Book.available_copies > 0)
+                       .order_by(Book.id.desc())
+                       .limit(app.config['DASHBOARD_BOOKS']).all())
+    # Same key as the catalog's "available" filter, so both share one cached count
+    available_count = catalog_count('', 'available')
+    return render_template('dashboard.html', user=user, borrowed_books=borrowed_books,
+                           available_books=available_books, available_count=available_count)
 
 # User Profile
 @app.route('/profile')
+@read_replica
+@login_required
 def profile():
-    if 'user_id' not in session:
-        flash('Please log in first.', 'error')
-        return redirect(url_for('login'))
-    user = User.query.get(session['user_id'])
-    if not user:
-        session.clear()
-        flash('User not found.', 'error')
-        return redirect(url_for('login'))
+    user = get_current_user()
+    stats = Borrowing.get_user_stats(user.id)
     
     # Get currently borrowed books
-    current_borrowings = Borrowing.query.filter_by(user_id=user.id, return_date=None).all()
+    current_borrowings = (Borrowing.query.options(*eager(joinedload(Borrowing.book)))
+                          .filter_by(user_id=user.id, return_date=None)
+                          .order_by(Borrowing.due_date).all())
     
-    # Get borrowing history (all borrowings)
-    all_borrowings = Borrowing.query.filter_by(user_id=user.id).order_by(Borrowing.borrow_date.desc()).all()
+    # Get borrowing history, newest first, one page at a time
+    history = keyset_paginate(
+        Borrowing.query.options(*eager(joinedload(Borrowing.book))).filter_by(user_id=user.id),
+        [Borrowing.borrow_date, Borrowing.id],
+        after=request.args.get('history_after', ''),
+        per_page=app.config['PROFILE_HISTORY_PER_PAGE'],
+        descending=True,
+    )
     
-    return render_template('profile.html', user=user, current_borrowings=current_borrowings, all_borrowings=all_borrowings)
+    return render_template('profile.html', user=user, stats=stats,
+                           current_borrowings=current_borrowings, history=history)
 
 # Browse books
 @app.route('/books')
+@read_replica
+@login_required
 def books():
-    if 'user_id' not in session:
-        flash('Please log in first.', 'error')
-        return redirect(url_for('login'))
+    # The page is a function of the URL, the catalog and the user's wishlist; check those first
+    user = get_user_snapshot()
+    validator = Book.catalog_version(user.id)
+    # The newest book edit or the user's last wishlist change, whichever is later
+    last_modified = max((v for v in (validator[0], validator[-1]) if v), default=None)
+    cached = not_modified(validator, last_modified)
+    if cached:
+        return cached
+    
     search = request.args.get('search', '').strip()
     filter_type = request.args.get('filter', 'all')
-    page = request.args.get('page', 1, type=int)
+    sort = request.args.get('sort', 'relevance' if search else 'title')
+    after = request.args.get('after', '')
     per_page = 10
     
-    query = Book.query
-    if search:
-        term = f"%{search}%"
-        query = query.filter((Book.title.ilike(term)) | (Book.author.ilike(term)) | (Book.isbn.ilike(term)))
-    if filter_type == 'available':
-        query = query.filter(Book.available == True)
-    elif filter_type == 'unavailable':
-        query = query.filter(Book.available == False)
+    # The page's ids are cached until the books table changes; the rows themselves come by primary key
+    page_ids, next_cursor, page_after = catalog_page(search, filter_type, sort, after, per_page)
+    rows = {book.id: book for book in Book.query.filter(Book.id.in_(page_ids))} if page_ids else {}
+    page = KeysetPage([rows[book_id] for book_id in page_ids if book_id in rows], next_cursor,
+                      after=page_after, total=catalog_count(search, filter_type))
     
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-    books_list = pagination.items
-    total_pages = pagination.pages
+    # Card markup is shared and cached (fragments.py); only these per-user bits are rendered each time
+    wishlisted_ids = {book_id for (book_id,) in db.session.query(Wishlist.book_id).filter(
+        Wishlist.user_id == user.id, Wishlist.book_id.in_(page_ids))}
+    borrowed_ids = {book_id for (book_id,) in db.session.query(Borrowing.book_id).filter(
+        Borrowing.user_id == user.id, Borrowing.return_date.is_(None), Borrowing.book_id.in_(page_ids))}
     
-    return render_template('books.html', books=books_list, search=search, filter_type=filter_type, 
-                         page=page, total_pages=total_pages)
+    return render_with_validators(validator, last_modified, 'books.html', books=page.items, search=search,
+                                  filter_type=filter_type, sort=sort, page=page,
+                                  wishlisted_ids=wishlisted_ids, borrowed_ids=borrowed_ids)
 
 # Borrow book
 @app.route('/borrow/<int:book_id>', methods=['POST'])
+@login_required
 def borrow_book(book_id):
-    if 'user_id' not in session:
-        flash('Please log in first.', 'error')
-        return redirect(url_for('login'))
-    user = User.query.get(session['user_id'])
+    user = get_user_snapshot()
     book = Book.query.get(book_id)
     if not book:
         flash('Book not found.', 'error')
         return redirect(url_for('books'))
-    if book.get_available_count() <= 0:
-        flash('No copies available.', 'error')
-        return redirect(url_for('books'))
-    borrow_date = datetime.now()
-    due_date = borrow_date + timedelta(days=14)
-    borrowing = Borrowing(user_id=user.id, book_id=book.id, borrow_date=borrow_date, due_date=due_date)
-    # reduce availability logic
+    title = book.title
     try:
-        db.session.add(borrowing)
-        db.session.commit()
-        flash(f'Borrowed "{book.title}". Due: {due_date.date()}', 'success')
+        borrowing = checkout_book(user.id, book_id)
+        flash(f'Borrowed "{title}". Due: {borrowing.due_date.date()}', 'success')
+    except CirculationError as e:
+        flash(str(e), 'error')
     except Exception as e:
-        db.session.rollback()
         flash('Error borrowing book: ' + str(e), 'error')
     return redirect(url_for('books'))
 
 # Return book
 @app.route('/return/<int:borrowing_id>', methods=['POST'])
+@login_required
 def return_book(borrowing_id):
-    if 'user_id' not in session:
-        flash('Please log in first.', 'error')
-        return redirect(url_for('login'))
     borrowing = Borrowing.query.get(borrowing_id)
     if not borrowing:
         flash('Record not found.', 'error')
@@ -243,22 +359,20 @@ def return_book(borrowing_id):
     if borrowing.user_id != session['user_id']:
         flash('You can only return your own books.', 'error')
         return redirect(url_for('dashboard'))
-    borrowing.return_date = datetime.now()
     try:
-        db.session.commit()
+        return_borrowing(borrowing_id)
         flash('Book returned successfully.', 'success')
+    except CirculationError as e:
+        flash(str(e), 'info')
     except Exception as e:
-        db.session.rollback()
         flash('Error returning book: ' + str(e), 'error')
     return redirect(url_for('dashboard'))
 
 # Wishlist - Add to wishlist
 @app.route('/wishlist/add/<int:book_id>', methods=['POST'])
+@login_required
 def add_to_wishlist(book_id):
-    if 'user_id' not in session:
-        flash('Please log in first.', 'error')
-        return redirect(url_for('login'))
-    user = User.query.get(session['user_id'])
+    user = get_user_snapshot()
     book = Book.query.get(book_id)
     if not book:
         flash('Book not found.', 'error')
@@ -271,6 +385,7 @@ def add_to_wishlist(book_id):
         wishlist_item = Wishlist(user_id=user.id, book_id=book_id)
         try:
             db.session.add(wishlist_item)
+            Wishlist.touch(user.id)
             db.session.commit()
             flash(f'"{book.title}" added to wishlist.', 'success')
         except Exception as e:
@@ -280,16 +395,15 @@ def add_to_wishlist(book_id):
 
 # Wishlist - Remove from wishlist
 @app.route('/wishlist/remove/<int:wishlist_id>', methods=['POST'])
+@login_required
 def remove_from_wishlist(wishlist_id):
-    if 'user_id' not in session:
-        flash('Please log in first.', 'error')
-        return redirect(url_for('login'))
     wishlist_item = Wishlist.query.get(wishlist_id)
     if not wishlist_item or wishlist_item.user_id != session['user_id']:
         flash('Wishlist item not found.', 'error')
         return redirect(url_for('wishlist'))
     try:
         db.session.delete(wishlist_item)
+        Wishlist.touch(wishlist_item.user_id)
         db.session.commit()
         flash('Removed from wishlist.', 'success')
     except Exception as e:
@@ -299,21 +413,19 @@ def remove_from_wishlist(wishlist_id):
 
 # Wishlist - View wishlist
 @app.route('/wishlist')
+@read_replica
+@login_required
 def wishlist():
-    if 'user_id' not in session:
-        flash('Please log in first.', 'error')
-        return redirect(url_for('login'))
-    user = User.query.get(session['user_id'])
-    wishlist_items = Wishlist.query.filter_by(user_id=user.id).all()
+    user = get_user_snapshot()
+    wishlist_items = (Wishlist.query.options(*eager(joinedload(Wishlist.book)))
+                      .filter_by(user_id=user.id).order_by(Wishlist.added_at.desc()).all())
     return render_template('wishlist.html', wishlist_items=wishlist_items)
 
 # Reviews - Submit review
 @app.route('/review/<int:book_id>', methods=['POST'])
+@login_required
 def submit_review(book_id):
-    if 'user_id' not in session:
-        flash('Please log in first.', 'error')
-        return redirect(url_for('login'))
-    user = User.query.get(session['user_id'])
+    user = get_user_snapshot()
     book = Book.query.get(book_id)
     if not book:
         flash('Book not found.', 'error')
@@ -328,6 +440,7 @@ def submit_review(book_id):
     
     existing_review = Review.query.filter_by(user_id=user.id, book_id=book_id).first()
     if existing_review:
+        book.record_rating(rating - existing_review.rating)
         existing_review.rating = rating
         existing_review.comment = comment
         existing_review.updated_at = datetime.now()
@@ -335,6 +448,7 @@ def submit_review(book_id):
     else:
         review = Review(user_id=user.id, book_id=book_id, rating=rating, comment=comment)
         db.session.add(review)
+        book.record_rating(rating, 1)
         action = 'added'
     
     try:
@@ -347,29 +461,31 @@ def submit_review(book_id):
 
 # Book detail page
 @app.route('/book/<int:book_id>')
+@read_replica
+@login_required
 def book_detail(book_id):
-    if 'user_id' not in session:
-        flash('Please log in first.', 'error')
-        return redirect(url_for('login'))
+    user = get_user_snapshot()
+    validator = Book.detail_version(book_id, user.id)
+    if validator is None:
+        abort(404)
+    # Book, review and wishlist timestamps; loan changes are caught by the ETag
+    last_modified = max((v for v in validator[:2] + validator[-1:] if v), default=None)
+    cached = not_modified(validator, last_modified)
+    if cached:
+        return cached
     book = Book.query.get_or_404(book_id)
-    user = User.query.get(session['user_id'])
-    reviews = Review.query.filter_by(book_id=book_id).all()
-    user_review = Review.query.filter_by(user_id=user.id, book_id=book_id).first()
+    reviews = Review.for_book(book_id)
+    user_review = next((review for review in reviews if review['user_id'] == user.id), None)
     wishlist_item = Wishlist.query.filter_by(user_id=user.id, book_id=book_id).first()
-    avg_rating = Review.get_average_rating(book_id)
-    return render_template('book_detail.html', book=book, reviews=reviews, user_review=user_review, 
-                         wishlist_item=wishlist_item, avg_rating=avg_rating)
+    return render_with_validators(validator, last_modified, 'book_detail.html',
+                                  book=book, reviews=reviews, user_review=user_review,
+                                  wishlist_item=wishlist_item, avg_rating=book.average_rating)
 
 # Admin - manage books
 @app.route('/admin/books', methods=['GET', 'POST'])
+@read_replica
+@admin_required
 def admin_books():
-    if 'user_id' not in session:
-        flash('Please log in first.', 'error')
-        return redirect(url_for('login'))
-    user = User.query.get(session['user_id'])
-    if not user or not user.is_admin:
-        flash('Admin access required.', 'error')
-        return redirect(url_for('dashboard'))
     if request.method == 'POST':
         title = request.form.get('title', '').strip()
         author = request.form.get('author', '').strip()
@@ -379,16 +495,15 @@ def admin_books():
         description = request.form.get('description', '').strip()
         image_url = request.form.get('image_url', '').strip()
         
-        # Handle file upload
+        # Handle file upload (stored by content hash; thumbnails render in the background)
         if 'cover_file' in request.files:
             file = request.files['cover_file']
             if file and file.filename:
-                upload_folder = os.path.join('static', 'uploads', 'covers')
-                os.makedirs(upload_folder, exist_ok=True)
-                # Generate unique filename
-                filename = f"{uuid.uuid4()}_{secure_filename(file.filename)}"
-                file.save(os.path.join(upload_folder, filename))
-                image_url = f"/static/uploads/covers/{filename}"
+                try:
+                    image_url = cover_store.save(file)
+                except InvalidCover as e:
+                    flash(str(e), 'error')
+                    return redirect(url_for('admin_books'))
         
         if not title or not author or not isbn or not publication_year:
             flash('All fields required.', 'error')
@@ -403,16 +518,197 @@ def admin_books():
         except Exception as e:
             db.session.rollback()
             flash('Error adding book: ' + str(e), 'error')
-    books_list = Book.query.all()
-    return render_template('admin_books.html', books=books_list)
+    # One page of the inventory, sorted and filtered in SQL over indexed columns
+    search = request.args.get('search', '').strip()
+    filter_type = request.args.get('filter', 'all')
+    filter_type = filter_type if filter_type in FILTERS else 'all'
+    sort = request.args.get('sort', 'title')
+    sort = sort if sort in INVENTORY_SORTS else 'title'
+    direction = 'desc' if request.args.get('dir') == 'desc' else 'asc'
+    query, _, _ = catalog_query(search, filter_type)
+    page = keyset_paginate(query, [INVENTORY_SORTS[sort], Book.id], after=request.args.get('after', ''),
+                           per_page=app.config['ADMIN_BOOKS_PER_PAGE'], descending=direction == 'desc')
+    page.total = catalog_count(search, filter_type)
+    return render_template('admin_books.html', books=page.items, page=page, search=search,
+                           filter_type=filter_type, sort=sort, direction=direction)
+
+# Admin - change the number of copies the library owns
+@app.route('/admin/books/<int:book_id>/quantity', methods=['POST'])
+@admin_required
+def update_book_quantity(book_id):
+    book = Book.query.get(book_id)
+    if not book:
+        flash('Book not found.', 'error')
+        return redirect(url_for('admin_books'))
+    quantity = request.form.get('quantity', type=int)
+    if quantity is None or quantity < 0:
+        flash('Quantity must be a non-negative number.', 'error')
+        return redirect(url_for('admin_books'))
+    on_loan = book.get_on_loan_count()
+    if quantity < on_loan:
+        flash(f'Cannot set quantity below the {on_loan} copy/copies currently on loan.', 'error')
+        return redirect(url_for('admin_books'))
+    # Shift the shelf count by the same delta so concurrent loans are preserved
+    book.available_copies = Book.available_copies + (quantity - book.quantity)
+    book.quantity = quantity
+    try:
+        db.session.commit()
+        flash(f'Quantity for "{book.title}" updated.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('Error updating quantity: ' + str(e), 'error')
+    return redirect(url_for('admin_books'))
+
+# Admin - overdue loans report
+@app.route('/admin/overdue')
+@read_replica
+@admin_required
+def admin_overdue():
+    # Whole minutes, as shown on the page, so the cached total is shared for a minute
+    now = datetime.now().replace(second=0, microsecond=0)
+    query = Borrowing.overdue_query(now).options(selectinload(Borrowing.book), selectinload(Borrowing.user))
+    page = keyset_paginate(query, [Borrowing.due_date, Borrowing.id],
+                           after=request.args.get('after', ''),
+                           per_page=app.config['OVERDUE_REPORT_PER_PAGE'])
+    page.total = Borrowing.overdue_count(now)
+    return render_template('admin_overdue.html', page=page, now=now)
+
+# Admin - in-process cache hit rates
+@app.route('/admin/cache-stats')
+@admin_required
+def admin_cache_stats():
+    return jsonify({'book_cards': fragments.book_cards.stats(), 'query_cache': query_cache.stats()})
+
+@app.route('/admin/metrics')
+def admin_metrics():
+    # Prometheus cannot log in, so a configured bearer token also grants access
+    token = app.config['METRICS_TOKEN']
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return metrics.response()
+    return admin_required(metrics.response)()
+
+@app.route('/admin/export/<any(books, borrowings, reviews):dataset>.<any(csv, jsonl):fmt>')
+@read_replica
+@admin_required
+def admin_export(dataset, fmt):
+    # Streamed as it is read, so the response starts at once and memory stays flat
+    return Response(stream_with_context(exports.export_chunks(dataset, fmt)), mimetype=exports.MIMETYPES[fmt],
+                    headers={'Content-Disposition':
+                             f'attachment; filename="{exports.export_filename(dataset, fmt)}"'})
+
+# -------------------- CLI --------------------
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Rebuild the full-text catalog index from the books table."""
+    backend = book_search.backend
+    if not hasattr(backend, 'rebuild'):
+        print(f'Search backend {backend.name!r} has no index to rebuild.')
+        return
+    backend.rebuild(db.engine)
+    print(f'Rebuilt {backend.name} search index.')
+
+@app.cli.command('recount-copies')
+def recount_copies_command():
+    """Recompute every book's available_copies from open borrowings."""
+    updated = Book.recount_available_copies()
+    db.session.commit()
+    print(f'Recounted available copies for {updated} book(s).')
+
+@app.cli.command('recount-ratings')
+def recount_ratings_command():
+    """Recompute every book's rating aggregates from the reviews table."""
+    updated = Book.recount_ratings()
+    db.session.commit()
+    print(f'Recounted ratings for {updated} book(s).')
+
+@app.cli.command('sweep-reminders')
+@click.option('--due-soon-days', default=3, show_default=True, help='Remind about loans due within this many days.')
+@click.option('--batch-size', default=500, show_default=True, help='Loans processed per transaction.')
+def sweep_reminders_command(due_soon_days, batch_size):
+    """Create reminder records for overdue and due-soon loans."""
+    counts = sweep_reminders(due_soon_days=due_soon_days, batch_size=batch_size)
+    print(f"Scanned {counts['scanned']} open loan(s) in {counts['batches']} batch(es): "
+          f"{counts['overdue']} new overdue and {counts['due_soon']} new due-soon reminder(s).")
+
+@app.cli.command('import-books')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help='Defaults to the file extension.')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows inserted per transaction.')
+@click.option('--resume/--restart', default=True, show_default=True,
+              help='Continue after the last committed batch of an earlier run of the same file.')
+@click.option('--default-quantity', default=1, show_default=True, help='Copies for records without a quantity.')
+def import_books_command(path, fmt, batch_size, resume, default_quantity):
+    """Bulk-load books from a CSV, JSONL or MARC file."""
+    def report(stats, seconds):
+        done = stats['read']
+        print(f"  {done} read, {stats['inserted']} inserted ({done / max(seconds, 1e-9):.0f} records/s)")
+
+    try:
+        stats = import_books(path, fmt=fmt, batch_size=batch_size, resume=resume,
+                             default_quantity=default_quantity, progress=report)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    if stats['skipped']:
+        print(f"Resumed after {stats['skipped']} record(s) imported by an earlier run.")
+    print(f"Imported {stats['inserted']} book(s) in {stats['seconds']:.1f}s "
+          f"({stats['read'] / max(stats['seconds'], 1e-9):.0f} records/s); "
+          f"{stats['duplicates']} duplicate ISBN(s) and {stats['invalid']} invalid record(s) skipped.")
+
+@app.cli.command('resolve-covers')
+@click.option('--workers', default=8, show_default=True, help='Concurrent lookups.')
+@click.option('--rate', default=10.0, show_default=True, help='Maximum requests per second to Open Library.')
+@click.option('--batch-size', default=100, show_default=True, help='Books looked up and committed per batch.')
+def resolve_covers_command(workers, rate, batch_size):
+    """Look up cover images for books that have none."""
+    os.makedirs(os.path.dirname(app.config['COVER_CACHE_PATH']) or '.', exist_ok=True)
+
+    def report(stats):
+        print(f"  {stats['checked']} looked up, {stats['cached']} from cache, {stats['found']} found")
+
+    stats = resolve_missing_covers(app.config['COVER_CACHE_PATH'], resolver=CoverResolver(rate=rate),
+                                   workers=workers, batch_size=batch_size, progress=report)
+    print(f"Found {stats['found']} new cover(s); {stats['not_found']} book(s) have none, "
+          f"{stats['cached']} answered from cache, {stats['errors']} lookup error(s) will be retried next run.")
+
+@app.cli.command('process-covers')
+def process_covers_command():
+    """Render missing thumbnail/medium variants for uploaded covers."""
+    if not cover_store.can_resize:
+        raise click.ClickException('Pillow is not installed; pip install Pillow to render cover variants.')
+    print(f'Processed {cover_store.backfill()} uploaded cover(s).')
+
+@app.cli.command('export')
+@click.argument('dataset', type=click.Choice(list(exports.DATASETS)))
+@click.option('--format', 'fmt', type=click.Choice(exports.FORMATS), default='csv', show_default=True)
+@click.option('--output', '-o', type=click.File('w', encoding='utf-8', lazy=True), default='-',
+              help='File to write (default: stdout).')
+@click.option('--chunk-rows', default=exports.CHUNK_ROWS, show_default=True, help='Rows fetched per round trip.')
+def export_command(dataset, fmt, output, chunk_rows):
+    """Stream the catalog, borrowings or reviews as CSV or JSONL."""
+    stats = {}
+    started = time.perf_counter()
+    for chunk in exports.export_chunks(dataset, fmt, chunk_rows=chunk_rows, stats=stats):
+        output.write(chunk)
+    output.flush()
+    click.echo(f"Exported {stats['rows']} {dataset} row(s) in {time.perf_counter() - started:.1f}s.", err=True)
+
+# Error handlers; API URLs get JSON, even for 404/405 raised while routing
+@app.errorhandler(HTTPException)
+def http_error(e):
+    if is_api_request():
+        return api_http_error(e)
+    return e
 
-# Error handlers
 @app.errorhandler(404)
 def not_found(e):
+    if is_api_request():
+        return api_http_error(e)
     return render_template('404.html'), 404
 
 @app.errorhandler(500)
 def server_error(e):
+    if is_api_request():
+        return api_http_error(e)
     return render_template('500.html'), 500
 
 # -------------------- Run --------------------
@@ -0,0 +1,128 @@
+"""Request-scoped current-user loading and route guards.
+
+`get_current_user()` loads the logged-in User row at most once per request
+(memoized on `flask.g`). Guards and templates usually only need the id,
+username and admin flag, so `get_user_snapshot()` serves those from a
+short-TTL in-process cache and only falls back to the full row on a miss.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+
+from flask import flash, g, redirect, session, url_for
+
+from extensions import db
+from models import User
+
+UserSnapshot = namedtuple('UserSnapshot', 'id username is_admin')
+
+
+class UserSnapshotCache:
+    """Thread-safe TTL cache of UserSnapshot keyed by user id, LRU-bounded to max_entries"""
+
+    def __init__(self, ttl=30, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[0]
+
+    def put(self, snapshot):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[snapshot.id] = (snapshot, time.monotonic() + self.ttl)
+            self._entries.move_to_end(snapshot.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def discard(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserSnapshotCache()
+
+
+def init_app(app):
+    app.config.setdefault('USER_CACHE_TTL', 30)
+    app.config.setdefault('USER_CACHE_MAX_ENTRIES', 10000)
+    user_cache.ttl = app.config['USER_CACHE_TTL']
+    user_cache.max_entries = app.config['USER_CACHE_MAX_ENTRIES']
+
+
+def snapshot_of(user):
+    return UserSnapshot(user.id, user.username, bool(user.is_admin))
+
+
+def get_current_user():
+    """Full User row for the logged-in user, loaded at most once per request"""
+    if 'user' not in g:
+        user_id = session.get('user_id')
+        g.user = db.session.get(User, user_id) if user_id is not None else None
+        if g.user is not None:
+            user_cache.put(snapshot_of(g.user))
+    return g.user
+
+
+def get_user_snapshot():
+    """Id, username and admin flag of the logged-in user (may be cached)"""
+    if 'user_snapshot' not in g:
+        user_id = session.get('user_id')
+        snapshot = None
+        if user_id is not None:
+            snapshot = user_cache.get(user_id)
+            if snapshot is None:
+                user = get_current_user()
+                snapshot = snapshot_of(user) if user else None
+        g.user_snapshot = snapshot
+    return g.user_snapshot
+
+
+def login_required(view):
+    """Redirect to the login page unless a valid user is logged in"""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if 'user_id' not in session:
+            flash('Please log in first.', 'error')
+            return redirect(url_for('login'))
+        if get_user_snapshot() is None:
+            session.clear()
+            flash('User not found.', 'error')
+            return redirect(url_for('login'))
+        return view(*args, **kwargs)
+    return wrapped
+
+
+def admin_required(view):
+    """Like login_required, but also checks the admin flag on the live row"""
+    @wraps(view)
+    @login_required
+    def wrapped(*args, **kwargs):
+        # Not the cached snapshot: revoked admin rights must apply immediately
+        user = get_current_user()
+        if not user or not user.is_admin:
+            flash('Admin access required.', 'error')
+            return redirect(url_for('dashboard'))
+        return view(*args, **kwargs)
+    return wrapped
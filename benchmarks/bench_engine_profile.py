@@ -0,0 +1,148 @@
+"""Mixed read/write throughput under different engine profiles.
+
+Each profile runs in its own process (the engine is configured at import
+time) against a fresh SQLite file. Reader threads request catalog and book
+pages through the Flask test client while writer threads borrow and return
+books, for a fixed duration. Single runs vary by 20% or more on a busy
+machine, so the profiles are run --runs times, interleaved, and the median
+is reported with the range.
+
+Run: python benchmarks/bench_engine_profile.py [--seconds 10] [--readers 8] [--writers 4] [--runs 5]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PROFILES = {
+    # What the app ran with before engine profiles existed
+    'legacy': {
+        'DB_JOURNAL_MODE': 'DELETE',
+        'DB_SYNCHRONOUS': 'FULL',
+        'DB_CACHE_SIZE_KB': '2000',
+        'DB_MMAP_SIZE': '0',
+        'DB_BUSY_TIMEOUT_MS': '5000',
+    },
+    # The defaults in extensions.ENGINE_PROFILE_DEFAULTS
+    'tuned': {},
+}
+
+BOOKS = 2000
+
+
+def seed(app, db, writers):
+    from werkzeug.security import generate_password_hash
+    from models import Book, User
+
+    with app.app_context():
+        db.session.execute(db.insert(Book), [
+            {'title': f'Book {i:05d}', 'author': f'Author {i % 97}', 'isbn': f'bench-{i}',
+             'publication_year': 1900 + i % 120, 'quantity': 50, 'available_copies': 50,
+             'description': 'Benchmark book'}
+            for i in range(BOOKS)
+        ])
+        password = generate_password_hash('Passw0rd!')
+        db.session.execute(db.insert(User), [
+            {'username': f'bench{i}', 'email': f'bench{i}@example.com', 'password': password}
+            for i in range(writers + 1)
+        ])
+        db.session.commit()
+
+
+def run_worker(seconds, readers, writers):
+    from app import app
+    from circulation import CirculationError, checkout_book, return_borrowing
+    from extensions import db
+
+    seed(app, db, writers)
+    stop = time.monotonic() + seconds
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    lock = threading.Lock()
+
+    def bump(key):
+        with lock:
+            counts[key] += 1
+
+    def reader(n):
+        rng = random.Random(n)
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+        while time.monotonic() < stop:
+            url = rng.choice(['/books', f'/book/{rng.randint(1, BOOKS)}'])
+            bump('reads' if client.get(url).status_code == 200 else 'errors')
+
+    def writer(n):
+        rng = random.Random(1000 + n)
+        user_id = n + 2
+        while time.monotonic() < stop:
+            try:
+                with app.app_context():
+                    borrowing = checkout_book(user_id, rng.randint(1, BOOKS))
+                    return_borrowing(borrowing.id)
+                bump('writes')
+            except CirculationError:
+                bump('writes')
+            except Exception:
+                bump('errors')
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    print(json.dumps(counts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.seconds, args.readers, args.writers)
+        return
+
+    print(f'{args.readers} readers, {args.writers} writers, {args.seconds:g}s per profile, '
+          f'median of {args.runs} runs\n')
+    runs = {name: [] for name in PROFILES}
+    for _ in range(args.runs):
+        for name, overrides in PROFILES.items():
+            workdir = tempfile.mkdtemp(prefix=f'bench_engine_{name}_')
+            env = dict(os.environ, **overrides)
+            env['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+            # The default shared query cache, but not the one in instance/
+            env['CACHE_URL'] = os.path.join(workdir, 'query_cache.sqlite3')
+            out = subprocess.run(
+                [sys.executable, __file__, '--worker', '--seconds', str(args.seconds),
+                 '--readers', str(args.readers), '--writers', str(args.writers)],
+                env=env, check=True, capture_output=True, text=True,
+            ).stdout.strip().splitlines()[-1]
+            runs[name].append(json.loads(out))
+
+    def summary(counts, key):
+        rates = [c[key] / args.seconds for c in counts]
+        return f'{statistics.median(rates):.0f} ({min(rates):.0f}-{max(rates):.0f})'
+
+    print(f'{"profile":<10}{"reads/s":>16}{"borrow+return/s":>18}{"errors":>8}')
+    for name, counts in runs.items():
+        print(f'{name:<10}{summary(counts, "reads"):>16}{summary(counts, "writes"):>18}'
+              f'{sum(c["errors"] for c in counts):>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Catalog latency during a login burst, hashing inline vs in the pool.
+
+Each mode runs in its own process against a fresh SQLite file. Requests go
+through a fixed pool of "server" threads, like a threaded WSGI server with
+`--threads` workers. A probe requests the catalog every 50ms throughout,
+and after a quiet second a burst of `--logins` logins arrives at once. The
+table compares probe latency before and during the burst.
+
+Run: python benchmarks/bench_login_burst.py [--threads 8] [--logins 64]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODES = {
+    # What login/register did before passwords.py: hash on the request thread
+    'inline': {'PASSWORD_HASH_WORKERS': '0'},
+    # The defaults in app.py
+    'pool': {},
+}
+BOOKS = 2000
+PROBE_INTERVAL = 0.05
+
+
+def seed(app, db, users):
+    from werkzeug.security import generate_password_hash
+    from models import Book, User
+
+    with app.app_context():
+        db.session.execute(db.insert(Book), [
+            {'title': f'Book {i:05d}', 'author': f'Author {i % 97}', 'isbn': f'bench-{i}',
+             'publication_year': 1900 + i % 120, 'quantity': 5, 'available_copies': 5}
+            for i in range(BOOKS)
+        ])
+        password = generate_password_hash('Passw0rd!')
+        db.session.execute(db.insert(User), [
+            {'username': f'bench{i}', 'email': f'bench{i}@example.com', 'password': password}
+            for i in range(users)
+        ])
+        db.session.commit()
+
+
+def run_worker(threads, logins):
+    from app import app
+    from extensions import db
+    from passwords import password_hasher
+
+    seed(app, db, logins + 1)
+    if password_hasher.workers:
+        password_hasher.current_prefix()  # start the pool before measuring
+    server = ThreadPoolExecutor(max_workers=threads)
+    results = {'probes': [], 'logins': {'ok': 0, 'busy': 0}}
+    lock = threading.Lock()
+
+    def browse(n):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+        client.get(f'/books?search=author {n % 97}')
+
+    def login(n):
+        response = app.test_client().post('/login', data={'username': f'bench{n + 1}', 'password': 'Passw0rd!'})
+        with lock:
+            results['logins']['ok' if response.headers['Location'].endswith('/dashboard') else 'busy'] += 1
+
+    def probe(n, phase):
+        submitted = time.perf_counter()
+        server.submit(browse, n).add_done_callback(
+            lambda _: results['probes'].append((phase, time.perf_counter() - submitted)))
+
+    started = time.perf_counter()
+    n = 0
+    while time.perf_counter() - started < 1:
+        probe(n, 'before')
+        n += 1
+        time.sleep(PROBE_INTERVAL)
+    burst = [server.submit(login, i) for i in range(logins)]
+    while not all(f.done() for f in burst):
+        probe(n, 'during')
+        n += 1
+        time.sleep(PROBE_INTERVAL)
+    results['burst_seconds'] = time.perf_counter() - started - 1
+    server.shutdown(wait=True)
+    print(json.dumps(results))
+
+
+def summary(latencies):
+    if not latencies:
+        return '-'
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    return f'{statistics.median(latencies) * 1000:.0f} / {p95 * 1000:.0f} ms'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=8, help='Server request threads.')
+    parser.add_argument('--logins', type=int, default=64, help='Logins in the burst.')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.threads, args.logins)
+        return
+
+    print(f'{args.threads} server threads, burst of {args.logins} logins, {os.cpu_count()} CPU(s)\n')
+    print(f'{"mode":<8}{"catalog p50/p95 before":>24}{"during burst":>18}{"logins ok/busy":>16}{"burst":>8}')
+    for name, overrides in MODES.items():
+        workdir = tempfile.mkdtemp(prefix=f'bench_login_{name}_')
+        env = dict(os.environ, **overrides)
+        env['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+        out = subprocess.run(
+            [sys.executable, __file__, '--worker', '--threads', str(args.threads), '--logins', str(args.logins)],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout.strip().splitlines()[-1]
+        results = json.loads(out)
+        phases = {phase: [t for p, t in results['probes'] if p == phase] for phase in ('before', 'during')}
+        logins = results['logins']
+        print(f'{name:<8}{summary(phases["before"]):>24}{summary(phases["during"]):>18}'
+              f'{logins["ok"]:>9}/{logins["busy"]:<6}{results["burst_seconds"]:>7.1f}s')
+
+
+if __name__ == '__main__':
+    main()
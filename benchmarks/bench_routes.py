@@ -0,0 +1,243 @@
+"""Per-route timings and query counts against a synthetic library.
+
+Builds (or reuses) a datagen.py database at --scale, then drives the main
+pages through the Flask test client as a heavy reader: the user with the
+most open loans, looking at the most-reviewed book. Each route gets
+--warmup untimed calls and --rounds timed ones, reported as min / median /
+mean / max / stddev like pytest-benchmark. Every SQL statement a request
+runs is counted.
+
+Results are compared with benchmarks/baseline.json and the script exits 1 on
+a regression:
+  * a route running more queries than its baseline `queries` always fails;
+  * a route whose median, relative to the `index` calibration route timed in
+    the same run, is more than --tolerance above its baseline `relative`
+    fails when the baseline was recorded at the same scale and seed.
+Absolute milliseconds depend on the machine, so they are reported but never
+compared. The calibration route is a sub-millisecond redirect and its jitter
+moves every ratio, so .github/workflows/benchmarks.yml passes
+--advisory-timings: on shared CI runners only the query budgets block, and
+timing regressions are printed as warnings. After an intended change, rerun
+with --update-baseline and commit the file.
+
+Run: python benchmarks/bench_routes.py [--scale 0.01] [--rounds 20]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# A redirect with no page work: measures how fast this machine runs a request
+CALIBRATION = 'index'
+
+
+class QueryCounter:
+    """Counts statements on every engine while active"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def pick_subjects(db):
+    from models import Book, Borrowing, Review
+
+    user_id = db.session.execute(
+        db.select(Borrowing.user_id).where(Borrowing.return_date.is_(None))
+        .group_by(Borrowing.user_id).order_by(db.func.count().desc(), Borrowing.user_id).limit(1)
+    ).scalar()
+    book_id = db.session.execute(
+        db.select(Review.book_id).group_by(Review.book_id)
+        .order_by(db.func.count().desc(), Review.book_id).limit(1)
+    ).scalar()
+    # A book the reader can borrow and return for the write routes
+    spare_id = db.session.execute(
+        db.select(Book.id).where(Book.available_copies > 1, ~Book.id.in_(
+            db.select(Borrowing.book_id).where(Borrowing.user_id == user_id, Borrowing.return_date.is_(None))
+        )).order_by(Book.id).limit(1)
+    ).scalar()
+    return user_id, book_id, spare_id
+
+
+def routes(app, db, user_id, book_id, spare_id):
+    """name -> (method, url or callable returning one)"""
+    from models import Borrowing
+
+    def open_loan():
+        loan_id = db.session.execute(db.select(Borrowing.id).where(
+            Borrowing.user_id == user_id, Borrowing.book_id == spare_id, Borrowing.return_date.is_(None))
+        ).scalar()
+        db.session.remove()
+        return f'/return/{loan_id}'
+
+    return {
+        CALIBRATION: ('GET', '/'),
+        'books': ('GET', '/books'),
+        'books_search': ('GET', '/books?search=garden'),
+        'dashboard': ('GET', '/dashboard'),
+        'profile': ('GET', '/profile'),
+        'wishlist': ('GET', '/wishlist'),
+        'book_detail': ('GET', f'/book/{book_id}'),
+        # Paired: each return undoes the borrow before it
+        'borrow_book': ('POST', f'/borrow/{spare_id}'),
+        'return_book': ('POST', open_loan),
+    }
+
+
+def measure(app, client, counter, method, url):
+    counter.count = 0
+    started = time.perf_counter()
+    response = client.open(url, method=method)
+    elapsed = time.perf_counter() - started
+    if response.status_code >= 400:
+        raise SystemExit(f'{method} {url} returned {response.status_code}')
+    return elapsed, counter.count
+
+
+def run(app, db, rounds, warmup):
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    with app.app_context():
+        user_id, book_id, spare_id = pick_subjects(db)
+        plan = routes(app, db, user_id, book_id, spare_id)
+        db.session.remove()
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+    counter = QueryCounter()
+    event.listen(Engine, 'after_cursor_execute', counter)
+    samples = {name: ([], []) for name in plan}
+    try:
+        reads = [name for name, (method, _) in plan.items() if method == 'GET']
+        for name in reads:
+            method, url = plan[name]
+            for i in range(warmup + rounds):
+                elapsed, queries = measure(app, client, counter, method, url)
+                if i >= warmup:
+                    samples[name][0].append(elapsed)
+                    samples[name][1].append(queries)
+        for i in range(warmup + rounds):
+            for name in ('borrow_book', 'return_book'):
+                method, url = plan[name]
+                if callable(url):
+                    with app.app_context():
+                        url = url()
+                elapsed, queries = measure(app, client, counter, method, url)
+                if i >= warmup:
+                    samples[name][0].append(elapsed)
+                    samples[name][1].append(queries)
+    finally:
+        event.remove(Engine, 'after_cursor_execute', counter)
+    calibration = statistics.median(samples[CALIBRATION][0])
+    return {
+        name: {
+            'min_ms': min(times) * 1000,
+            'median_ms': statistics.median(times) * 1000,
+            'mean_ms': statistics.fmean(times) * 1000,
+            'max_ms': max(times) * 1000,
+            'stddev_ms': statistics.pstdev(times) * 1000,
+            'relative': statistics.median(times) / calibration,
+            'queries': max(queries),
+        }
+        for name, (times, queries) in samples.items()
+    }
+
+
+def compare(results, baseline, scale, seed, tolerance):
+    """(query budget failures, timing regressions); timings only at the baseline's scale"""
+    failures, slower = [], []
+    same_data = baseline.get('scale') == scale and baseline.get('seed') == seed
+    for name, result in results.items():
+        expected = baseline.get('routes', {}).get(name)
+        if expected is None:
+            continue
+        if result['queries'] > expected['queries']:
+            failures.append(f'{name}: {result["queries"]} queries, budget {expected["queries"]}')
+        if name == CALIBRATION or 'relative' not in expected:
+            continue
+        limit = expected['relative'] * (1 + tolerance)
+        if same_data and result['relative'] > limit:
+            slower.append(f'{name}: median {result["relative"]:.1f}x {CALIBRATION}, '
+                          f'baseline {expected["relative"]:.1f}x (+{tolerance:.0%} allowed)')
+    return failures, slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=float, default=0.01, help='Fraction of the full datagen.py size.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', help='Database file; generated if missing (default: one per scale in the temp dir).')
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='Allowed slowdown relative to the calibration route, 0.5 = 50%%.')
+    parser.add_argument('--advisory-timings', action='store_true',
+                        help='Report timing regressions without failing; only query budgets fail.')
+    parser.add_argument('--update-baseline', action='store_true', help='Write these results as the new baseline.')
+    args = parser.parse_args()
+
+    path = os.path.abspath(args.db or os.path.join(tempfile.gettempdir(),
+                                                   f'library_bench_{args.scale:g}_{args.seed}.db'))
+    fresh = not os.path.exists(path)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + path
+    os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+    # One process; and datagen's bulk inserts bypass the session, so nothing bumps a shared cache
+    os.environ.setdefault('CACHE_BACKEND', 'memory')
+    from app import app
+    from extensions import db
+    import datagen
+
+    if fresh:
+        print(f'Generating {path} at scale {args.scale:g}')
+        with app.app_context():
+            datagen.generate(args.scale, args.seed, progress=lambda line: print('  ' + line))
+    counts = datagen.sizes(args.scale)
+    print(f'{counts["books"]:,} books, {counts["users"]:,} users, {counts["borrowings"]:,} borrowings, '
+          f'{counts["reviews"]:,} reviews; {args.rounds} rounds after {args.warmup} warmup\n')
+
+    results = run(app, db, args.rounds, args.warmup)
+    print(f'{"route":<14}{"min":>9}{"median":>9}{"mean":>9}{"max":>9}{"stddev":>9}'
+          f'{"relative":>10}{"queries":>9}   (ms)')
+    for name, r in results.items():
+        print(f'{name:<14}{r["min_ms"]:>9.2f}{r["median_ms"]:>9.2f}{r["mean_ms"]:>9.2f}'
+              f'{r["max_ms"]:>9.2f}{r["stddev_ms"]:>9.2f}{r["relative"]:>9.1f}x{r["queries"]:>9}')
+
+    if args.update_baseline:
+        routes_ = {name: {'median_ms': round(r['median_ms'], 3), 'relative': round(r['relative'], 2),
+                          'queries': r['queries']}
+                   for name, r in results.items()}
+        with open(args.baseline, 'w') as f:
+            json.dump({'scale': args.scale, 'seed': args.seed, 'routes': routes_}, f, indent=2)
+            f.write('\n')
+        print(f'\nBaseline written to {args.baseline}')
+        return
+    if not os.path.exists(args.baseline):
+        print(f'\nNo baseline at {args.baseline}; run with --update-baseline to record one.')
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    failures, slower = compare(results, baseline, args.scale, args.seed, args.tolerance)
+    if slower and args.advisory_timings:
+        print('\nSlower than ' + args.baseline + ' (advisory):\n  ' + '\n  '.join(slower))
+    else:
+        failures += slower
+    if failures:
+        print('\nRegressions against ' + args.baseline + ':\n  ' + '\n  '.join(failures))
+        sys.exit(1)
+    print('\nNo regressions against ' + args.baseline)
+
+
+if __name__ == '__main__':
+    main()
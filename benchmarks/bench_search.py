@@ -0,0 +1,94 @@
+"""Compare catalog search backends on a large synthetic catalog.
+
+Builds a throwaway SQLite database with N books (100k by default), then
+times the same searches through the LIKE scan and the FTS5 index.
+
+Run: python benchmarks/bench_search.py [--books 100000] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORDS = (
+    'river night garden shadow empire silver winter storm glass house city '
+    'ocean crown forest secret letter memory stone fire island mountain road '
+    'king queen war peace love death dream light dark journey'
+).split()
+# Pad the vocabulary with pronounceable nonsense words so that, like a real
+# catalog, most terms match a small fraction of the books.
+SYLLABLES = 'ka lo mi ren tor va shi dun pel or ast ix ne bra qu'.split()
+VOCABULARY = WORDS + sorted({
+    a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES
+})[:3000]
+FIRST = 'James Mary John Patricia Robert Jennifer Michael Linda David Elena Kenji Amara'.split()
+LAST = 'Smith Johnson Brown Garcia Miller Davis Lopez Tanaka Okafor Novak Rossi Kim'.split()
+
+SEARCHES = ['garden', 'silver storm', 'tanaka', 'jour', 'kalomi', 'river tanaka', '978-1-00042']
+
+
+def make_books(n, rng):
+    for i in range(n):
+        title = ' '.join(rng.choice(VOCABULARY) for _ in range(rng.randint(2, 5))).title()
+        yield {
+            'title': title,
+            'author': f'{rng.choice(FIRST)} {rng.choice(LAST)}',
+            'isbn': f'978-1-{i:08d}',
+            'publication_year': rng.randint(1800, 2024),
+            'quantity': 3,
+            'available_copies': 3,
+            'description': ' '.join(rng.choice(VOCABULARY) for _ in range(30)),
+        }
+
+
+def time_query(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--books', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_search_')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+
+    from app import app
+    from extensions import db
+    from models import Book
+    from search import LikeSearchBackend, SQLiteFTS5Backend
+
+    rng = random.Random(42)
+    with app.app_context():
+        start = time.perf_counter()
+        db.session.execute(db.insert(Book), list(make_books(args.books, rng)))
+        db.session.commit()
+        print(f'Inserted {args.books} books in {time.perf_counter() - start:.1f}s')
+
+        backends = [LikeSearchBackend(), SQLiteFTS5Backend()]
+        print(f'\n{"search":<18}' + ''.join(f'{b.name + " (ms)":>20}' for b in backends) + f'{"hits":>10}')
+        for term in SEARCHES:
+            row = f'{term:<18}'
+            for backend in backends:
+                # Same work the /books view does: one page plus the total count
+                def run():
+                    backend.apply(Book.query, term).paginate(page=1, per_page=10, error_out=False)
+                row += f'{time_query(run, args.repeat):>20.1f}'
+            hits = SQLiteFTS5Backend().apply(Book.query, term).order_by(None).count()
+            print(row + f'{hits:>10}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""Synthetic library data at realistic scale, bulk-inserted.
+
+At --scale 1 this is 100k books, 50k users, 5M borrowings (1% still open),
+500k reviews and 100k wishlist entries. Rows are generated lazily and sent
+to SQLite with executemany in large batches inside one transaction per
+table. Derived columns (available_copies, rating aggregates) are then
+recomputed in SQL, so the data is as consistent as the app's own writes
+would leave it. The same seed always produces the same database.
+
+Run: python benchmarks/datagen.py PATH [--scale 1] [--seed 42]
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_search import FIRST, LAST, VOCABULARY  # noqa: E402
+
+FULL_SIZE = {'books': 100_000, 'users': 50_000, 'borrowings': 5_000_000, 'reviews': 500_000,
+             'wishlists': 100_000}
+OPEN_SHARE = 0.01         # loans still out; about one per user at full size
+BATCH = 50_000
+PASSWORD = 'Passw0rd!'
+# SQLAlchemy's storage format for DateTime on SQLite
+STAMP = '%Y-%m-%d %H:%M:%S.%f'
+
+
+def sizes(scale):
+    return {name: max(1, int(n * scale)) for name, n in FULL_SIZE.items()}
+
+
+def _stamp(value):
+    return value.strftime(STAMP)
+
+
+def _users(n, password, now):
+    created = _stamp(now - timedelta(days=1000))
+    for i in range(1, n + 1):
+        yield (i, f'user{i}', f'user{i}@example.com', password, int(i == 1), created, created)
+
+
+def _books(n, rng, now):
+    created = _stamp(now - timedelta(days=1000))
+    for i in range(1, n + 1):
+        title = ' '.join(rng.choice(VOCABULARY) for _ in range(rng.randint(2, 5))).title()
+        author = f'{rng.choice(FIRST)} {rng.choice(LAST)}'
+        quantity = rng.randint(1, 5)
+        yield (i, title, author, f'{9780000000000 + i}', rng.randint(1900, 2024), quantity, 1, quantity,
+               0, 0, 0.0, f'{title} by {author}.', created, created)
+
+
+def _borrowings(n, users, books, rng, now):
+    for i in range(1, n + 1):
+        user_id = (i - 1) % users + 1
+        book_id = rng.randint(1, books)
+        if rng.random() < OPEN_SHARE:
+            # Open loans were taken out in the last 30 days, so some are overdue
+            borrowed = now - timedelta(days=rng.random() * 30)
+            returned = None
+        else:
+            borrowed = now - timedelta(days=30 + rng.random() * 1000)
+            returned = _stamp(borrowed + timedelta(days=rng.random() * 20))
+        yield (i, user_id, book_id, _stamp(borrowed), _stamp(borrowed + timedelta(days=14)), returned)
+
+
+def _pairs(n, users, books, step):
+    """n distinct (user_id, book_id) pairs: user i % users, books spaced by a prime"""
+    for i in range(n):
+        user_id = i % users + 1
+        yield user_id, (user_id * 7919 + (i // users) * step) % books + 1
+
+
+def _reviews(n, users, books, rng, now):
+    for i, (user_id, book_id) in enumerate(_pairs(n, users, books, 104729), start=1):
+        created = _stamp(now - timedelta(days=rng.random() * 1000))
+        yield (i, user_id, book_id, rng.choices((1, 2, 3, 4, 5), (1, 1, 3, 5, 4))[0],
+               rng.choice(('Loved it.', 'Not for me.', 'A solid read.', None)), created, created)
+
+
+def _wishlists(n, users, books, rng, now):
+    for i, (user_id, book_id) in enumerate(_pairs(n, users, books, 15485863), start=1):
+        yield (i, user_id, book_id, _stamp(now - timedelta(days=rng.random() * 300)))
+
+
+INSERTS = {
+    'users': 'INSERT INTO users (id, username, email, password, is_admin, created_at, updated_at) '
+             'VALUES (?, ?, ?, ?, ?, ?, ?)',
+    'books': 'INSERT INTO books (id, title, author, isbn, publication_year, quantity, available, '
+             'available_copies, rating_sum, rating_count, rating_avg, description, created_at, updated_at) '
+             'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+    'borrowings': 'INSERT INTO borrowings (id, user_id, book_id, borrow_date, due_date, return_date) '
+                  'VALUES (?, ?, ?, ?, ?, ?)',
+    'reviews': 'INSERT INTO reviews (id, user_id, book_id, rating, comment, created_at, updated_at) '
+               'VALUES (?, ?, ?, ?, ?, ?, ?)',
+    'wishlists': 'INSERT INTO wishlists (id, user_id, book_id, added_at) VALUES (?, ?, ?, ?)',
+}
+
+
+def generate(scale=1.0, seed=42, progress=print):
+    """Fill the app's (empty) database; call inside an app context"""
+    from werkzeug.security import generate_password_hash
+    from extensions import db
+    from models import Book, Borrowing
+
+    counts = sizes(scale)
+    rng = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+    password = generate_password_hash(PASSWORD)
+    rows = {
+        'users': _users(counts['users'], password, now),
+        'books': _books(counts['books'], rng, now),
+        'borrowings': _borrowings(counts['borrowings'], counts['users'], counts['books'], rng, now),
+        'reviews': _reviews(counts['reviews'], counts['users'], counts['books'], rng, now),
+        'wishlists': _wishlists(counts['wishlists'], counts['users'], counts['books'], rng, now),
+    }
+    for table, generated in rows.items():
+        started = time.perf_counter()
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql('PRAGMA synchronous=OFF')
+            while batch := list(itertools.islice(generated, BATCH)):
+                conn.exec_driver_sql(INSERTS[table], batch)
+        seconds = time.perf_counter() - started
+        progress(f'{table:<11}{counts[table]:>10,} rows {seconds:6.1f}s ({counts[table] / seconds:,.0f}/s)')
+
+    started = time.perf_counter()
+    # Random loans can put more copies of a book out than it has; buy the library more
+    open_loans = db.select(db.func.count(Borrowing.id)).where(
+        Borrowing.book_id == Book.id, Borrowing.return_date.is_(None)).scalar_subquery()
+    db.session.execute(db.update(Book).values(quantity=db.func.max(Book.quantity, open_loans)))
+    Book.recount_available_copies()
+    Book.recount_ratings()
+    db.session.execute(db.update(Book).values(available=Book.available_copies > 0))
+    db.session.commit()
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql('ANALYZE')
+    progress(f'aggregates recomputed in {time.perf_counter() - started:.1f}s')
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', help='SQLite file to create (must not exist).')
+    parser.add_argument('--scale', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    if os.path.exists(args.path):
+        parser.error(f'{args.path} already exists')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath(args.path)
+    from app import app
+
+    with app.app_context():
+        generate(args.scale, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,313 @@
+"""Query-result cache with commit-driven invalidation.
+
+Cached values are plain data (ids, tuples, dicts), never ORM instances. Every
+entry is filed under one or more tags, the table names it was read from, and
+each tag carries a generation number that is part of the entry's key. When a
+session commits changes to a table, by unit of work or by an UPDATE/INSERT/
+DELETE statement, that table's generation is bumped and everything read from
+it becomes unreachable at once, with no key scanning.
+
+Generations must be shared by every process that writes, or a borrow in
+one worker would leave the others serving stale results. Backends
+(CACHE_BACKEND):
+  sqlite  a file shared by every process on the host (default; CACHE_URL is the path)
+  redis   a Redis server, for several hosts (CACHE_URL, needs the optional `redis` package)
+  memory  per-process LRU with TTL; single-process servers only, refused when
+          WEB_CONCURRENCY says there are several workers
+  null    caching off
+
+A miss is computed on the primary database even in a @read_replica view. A
+lagging replica could otherwise store pre-write data under the new generation.
+"""
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from extensions import primary_reads
+
+try:
+    import redis
+except ImportError:  # optional dependency
+    redis = None
+
+
+# -------------------- Backends --------------------
+class MemoryBackend:
+    """Thread-safe LRU with per-entry expiry; generations are never evicted"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def generations(self, tags):
+        with self._lock:
+            return tuple(self._generations.get(tag, 0) for tag in tags)
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteBackend:
+    """Cache file shared by all processes on one host"""
+
+    PURGE_EVERY = 500
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._sets = 0
+        # instance/ does not exist on a fresh checkout
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._conn() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_entries '
+                         '(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_generations '
+                         '(tag TEXT PRIMARY KEY, generation INTEGER NOT NULL)')
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute('SELECT value FROM cache_entries WHERE key = ? AND expires > ?',
+                                   (key, time.time())).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def set(self, key, value, ttl):
+        conn = self._conn()
+        with conn:
+            conn.execute('INSERT OR REPLACE INTO cache_entries (key, value, expires) VALUES (?, ?, ?)',
+                         (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), time.time() + ttl))
+            self._sets += 1
+            if self._sets % self.PURGE_EVERY == 0:
+                conn.execute('DELETE FROM cache_entries WHERE expires <= ?', (time.time(),))
+
+    def generations(self, tags):
+        rows = dict(self._conn().execute(
+            f'SELECT tag, generation FROM cache_generations WHERE tag IN ({",".join("?" * len(tags))})',
+            tags).fetchall())
+        return tuple(rows.get(tag, 0) for tag in tags)
+
+    def bump(self, tags):
+        conn = self._conn()
+        with conn:
+            conn.executemany('INSERT INTO cache_generations (tag, generation) VALUES (?, 1) '
+                             'ON CONFLICT(tag) DO UPDATE SET generation = generation + 1',
+                             [(tag,) for tag in tags])
+
+    def clear(self):
+        conn = self._conn()
+        with conn:
+            conn.execute('DELETE FROM cache_entries')
+
+
+class RedisBackend:
+    """Cache on a Redis server, shared by every process that points at it"""
+
+    def __init__(self, url, prefix='library:'):
+        if redis is None:
+            raise RuntimeError('CACHE_BACKEND=redis needs the redis package (pip install redis)')
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), ex=max(int(ttl), 1))
+
+    def generations(self, tags):
+        values = self.client.mget([f'{self.prefix}gen:{tag}' for tag in tags])
+        return tuple(int(v) if v is not None else 0 for v in values)
+
+    def bump(self, tags):
+        with self.client.pipeline() as pipe:
+            for tag in tags:
+                pipe.incr(f'{self.prefix}gen:{tag}')
+            pipe.execute()
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + 'q:*'):
+            self.client.delete(key)
+
+
+class NullBackend:
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def generations(self, tags):
+        return (0,) * len(tags)
+
+    def bump(self, tags):
+        pass
+
+    def clear(self):
+        pass
+
+
+# -------------------- Cache --------------------
+class QueryCache:
+    """get_or_set/@cached over a backend, invalidated by table tag on commit"""
+
+    def __init__(self):
+        self.backend = MemoryBackend()
+        self.default_ttl = 300
+        self.namespace = ''
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault('CACHE_BACKEND', 'sqlite')
+        app.config.setdefault('CACHE_URL', None)
+        app.config.setdefault('CACHE_DEFAULT_TTL', 300)
+        app.config.setdefault('CACHE_MAX_ENTRIES', 10000)
+        name = app.config['CACHE_BACKEND']
+        if name == 'memory':
+            workers = int(os.environ.get('WEB_CONCURRENCY', '1'))
+            if workers > 1:
+                raise ValueError(f'CACHE_BACKEND=memory cannot invalidate across {workers} workers; '
+                                 'use sqlite or redis')
+            self.backend = MemoryBackend(app.config['CACHE_MAX_ENTRIES'])
+        elif name == 'sqlite':
+            self.backend = SQLiteBackend(app.config['CACHE_URL'])
+        elif name == 'redis':
+            self.backend = RedisBackend(app.config['CACHE_URL'])
+        elif name == 'null':
+            self.backend = NullBackend()
+        else:
+            raise ValueError(f'Unknown CACHE_BACKEND {name!r}')
+        self.default_ttl = app.config['CACHE_DEFAULT_TTL']
+        # Apps on different databases may share a cache file or Redis server
+        self.namespace = app.config.get('SQLALCHEMY_DATABASE_URI', '')
+        app.extensions['query_cache'] = self
+
+    def _key(self, key, tags):
+        versioned = repr((self.namespace, key, tags, self.backend.generations(tags)))
+        return 'q:' + hashlib.sha1(versioned.encode()).hexdigest()
+
+    def get_or_set(self, key, compute, tags, ttl=None):
+        """Cached value for `key`, computing and storing it on a miss"""
+        tags = tuple(sorted(tags))
+        full_key = self._key(key, tags)
+        value = self.backend.get(full_key)
+        if value is not None:
+            with self._lock:
+                self.hits += 1
+            return value
+        with self._lock:
+            self.misses += 1
+        with primary_reads():
+            value = compute()
+        if value is not None:
+            self.backend.set(full_key, value, ttl or self.default_ttl)
+        return value
+
+    def cached(self, name, tags, ttl=None):
+        """Decorator caching a function's plain-data result by its arguments"""
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                key = (name, args, tuple(sorted(kwargs.items())))
+                return self.get_or_set(key, lambda: fn(*args, **kwargs), tags, ttl)
+            wrapper.uncached = fn
+            return wrapper
+        return decorator
+
+    def invalidate(self, *tags):
+        if tags:
+            self.backend.bump(tuple(sorted(set(tags))))
+
+    def clear(self):
+        self.backend.clear()
+        with self._lock:
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'backend': type(self.backend).__name__, 'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': round(self.hits / lookups, 4) if lookups else None}
+
+
+query_cache = QueryCache()
+
+
+# -------------------- Invalidation --------------------
+# Tables written in a transaction are collected on the session and their
+# generations bumped only once it commits; a rollback discards them.
+_TAGS = 'query_cache_tags'
+
+
+def _pending(session):
+    return session.info.setdefault(_TAGS, set())
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_flushed(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if table:
+            _pending(session).add(table)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_statement(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, 'table', None)
+        if table is not None:
+            _pending(orm_execute_state.session).add(table.name)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    tags = session.info.pop(_TAGS, None)
+    if tags:
+        query_cache.invalidate(*tags)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back(session):
+    session.info.pop(_TAGS, None)
@@ -0,0 +1,64 @@
+"""Catalog listing shared by the HTML pages and the JSON API.
+
+A listing is (search, filter, sort, cursor). Both front ends get the book ids
+for one page from `catalog_page()` and load whatever columns they need for
+those ids, so the search, ordering and caching rules live in one place.
+"""
+from flask import current_app
+
+from cache import query_cache
+from models import Book
+from pagination import keyset_paginate
+from search import book_search
+
+FILTERS = ('all', 'available', 'unavailable')
+SORTS = ('relevance', 'title', 'rating')
+# Admin inventory columns; each is indexed, with the id as tie-breaker
+INVENTORY_SORTS = {
+    'title': Book.title,
+    'author': Book.author,
+    'year': Book.publication_year,
+    'available': Book.available_copies,
+}
+
+
+def catalog_query(search='', filter_type='all', sort='title'):
+    """(query, sort_key, descending) for one catalog listing"""
+    query = Book.query
+    # Browse alphabetically; searches are ordered by relevance when ranked
+    sort_key, descending = [Book.title, Book.id], False
+    if search:
+        query = book_search.filter(query, search)
+        rank = book_search.rank(search)
+        if rank is not None and sort == 'relevance':
+            sort_key = [rank, Book.id]
+    if sort == 'rating':
+        sort_key, descending = [Book.rating_avg, Book.id], True
+    if filter_type == 'available':
+        query = query.filter(Book.available_copies > 0)
+    elif filter_type == 'unavailable':
+        query = query.filter(Book.available_copies <= 0)
+    return query, sort_key, descending
+
+
+def catalog_page(search='', filter_type='all', sort='title', after='', per_page=10):
+    """(ids, next_cursor, after) for one page; cached until the books table changes"""
+    def find_page():
+        query, sort_key, descending = catalog_query(search, filter_type, sort)
+        ids = keyset_paginate(query.with_entities(Book.id), sort_key, after=after,
+                              per_page=per_page, descending=descending)
+        return ids.items, ids.next_cursor, ids.after
+    return query_cache.get_or_set(('catalog_page', search, filter_type, sort, after, per_page),
+                                  find_page, tags=('books',))
+
+
+def catalog_count(search='', filter_type='all'):
+    """Cached total for a catalog listing, or None when totals are turned off"""
+    ttl = current_app.config['CATALOG_COUNT_TTL']
+    if ttl <= 0:
+        return None
+
+    def count():
+        query, _, _ = catalog_query(search, filter_type)
+        return query.order_by(None).count()
+    return query_cache.get_or_set(('catalog_count', search, filter_type), count, tags=('books',), ttl=ttl)
@@ -0,0 +1,276 @@
+"""Streaming bulk import of catalog records from CSV, JSONL or MARC files.
+
+Records are read one at a time, deduplicated by normalized ISBN against a set
+loaded from the books table once, and inserted in batches with a single
+executemany per transaction. After each committed batch the number of source
+records consumed is written to a checkpoint file next to the source, so an
+interrupted import can be resumed without re-reading what was already done.
+
+Used by `flask --app app import-books`.
+"""
+import csv
+import json
+import os
+import re
+import time
+
+from extensions import db
+from models import Book
+
+FORMATS = ('csv', 'jsonl', 'marc')
+EXTENSIONS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.mrc': 'marc', '.marc': 'marc'}
+
+# Source field name -> Book column, for CSV headers and JSON keys
+FIELD_ALIASES = {
+    'title': 'title', 'author': 'author', 'isbn': 'isbn',
+    'publication_year': 'publication_year', 'year': 'publication_year',
+    'quantity': 'quantity', 'copies': 'quantity',
+    'description': 'description', 'image_url': 'image_url',
+}
+
+
+class InvalidRecord(ValueError):
+    """A source record that cannot become a Book"""
+
+
+def detect_format(path):
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+
+def normalize_isbn(isbn):
+    """ISBN digits (and a trailing X) only; the stored form and the duplicate key"""
+    return re.sub(r'[^0-9X]', '', (isbn or '').upper())
+
+
+_ISBN_RE = re.compile(r'\d{9}[\dX]|\d{13}')
+
+
+# -------------------- Readers --------------------
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        yield from csv.DictReader(f)
+
+
+def read_jsonl(path):
+    """One object per line; a line that is not valid JSON yields None (counted as invalid)"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield None
+
+
+MARC_RECORD_END = b'\x1d'
+MARC_FIELD_END = b'\x1e'
+MARC_SUBFIELD = b'\x1f'
+
+
+def _marc_fields(record):
+    """{tag: [field, ...]} for one ISO 2709 record; data fields as [(code, value), ...]"""
+    leader = record[:24]
+    encoding = 'utf-8' if leader[9:10] == b'a' else 'latin-1'
+    base = int(leader[12:17])
+    directory = record[24:base - 1]
+    fields = {}
+    for i in range(0, len(directory) - 11, 12):
+        tag = directory[i:i + 3].decode('ascii')
+        length = int(directory[i + 3:i + 7])
+        start = int(directory[i + 7:i + 12])
+        data = record[base + start:base + start + length].rstrip(MARC_FIELD_END)
+        if tag < '010':
+            fields.setdefault(tag, []).append(data.decode(encoding, 'replace'))
+        else:
+            subfields = [(chunk[:1].decode('ascii', 'replace'), chunk[1:].decode(encoding, 'replace'))
+                         for chunk in data[2:].split(MARC_SUBFIELD) if chunk]
+            fields.setdefault(tag, []).append(subfields)
+    return fields
+
+
+def _subfield(fields, tag, *codes):
+    for field in fields.get(tag, []):
+        values = [value for code, value in field if code in codes]
+        if values:
+            return ' '.join(v.strip() for v in values)
+    return None
+
+
+def marc_to_record(fields):
+    """Map MARC 21 bibliographic fields to import field names"""
+    title = _subfield(fields, '245', 'a', 'b')
+    year = _subfield(fields, '264', 'c') or _subfield(fields, '260', 'c')
+    if not year and fields.get('008'):
+        year = fields['008'][0][7:11]
+    isbn = _subfield(fields, '020', 'a')
+    return {
+        'title': re.sub(r'\s+([:;,])', r'\1', title).rstrip(' /:;,.') if title else None,
+        'author': (_subfield(fields, '100', 'a') or _subfield(fields, '110', 'a')
+                   or _subfield(fields, '700', 'a') or '').rstrip(' ,.') or None,
+        'isbn': isbn.split()[0] if isbn else None,
+        'publication_year': year,
+        'description': _subfield(fields, '520', 'a'),
+    }
+
+
+def read_marc(path):
+    with open(path, 'rb') as f:
+        buffer = b''
+        while True:
+            chunk = f.read(1 << 16)
+            if not chunk:
+                break
+            buffer += chunk
+            *records, buffer = buffer.split(MARC_RECORD_END)
+            for record in records:
+                if record.strip():
+                    yield marc_to_record(_marc_fields(record.lstrip()))
+
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl, 'marc': read_marc}
+
+
+# -------------------- Normalization --------------------
+def to_book_row(raw, default_quantity=1):
+    """Validated Book column values for one source record"""
+    if not isinstance(raw, dict):
+        raise InvalidRecord('not a record')
+    row = {}
+    for key, value in raw.items():
+        column = FIELD_ALIASES.get(str(key).strip().lower())
+        if column and value not in (None, ''):
+            row[column] = value.strip() if isinstance(value, str) else value
+    for column in ('title', 'author', 'isbn'):
+        if not row.get(column):
+            raise InvalidRecord(f'missing {column}')
+        row[column] = str(row[column])
+    # Stored without hyphens: Book.isbn is String(13)
+    row['isbn'] = normalize_isbn(row['isbn'])
+    if not _ISBN_RE.fullmatch(row['isbn']):
+        raise InvalidRecord('invalid ISBN')
+    match = re.search(r'\d{3,4}', str(row.get('publication_year', '')))
+    if not match:
+        raise InvalidRecord('missing publication year')
+    row['publication_year'] = int(match.group())
+    try:
+        row['quantity'] = max(int(row.get('quantity', default_quantity)), 0)
+    except (TypeError, ValueError):
+        raise InvalidRecord('invalid quantity')
+    row['title'] = row['title'][:200]
+    row['author'] = row['author'][:120]
+    row['available_copies'] = row['quantity']
+    row['available'] = True
+    # Same keys in every row keeps each batch a single executemany
+    row.setdefault('description', None)
+    row.setdefault('image_url', None)
+    return row
+
+
+# -------------------- Checkpoints --------------------
+def checkpoint_path(path):
+    return path + '.import-state'
+
+
+def _source_signature(path):
+    stat = os.stat(path)
+    return {'source': os.path.abspath(path), 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def load_checkpoint(path):
+    """Records already consumed from `path` by an earlier run (0 if the file changed)"""
+    try:
+        with open(checkpoint_path(path)) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return 0
+    if {k: state.get(k) for k in ('source', 'size', 'mtime')} != _source_signature(path):
+        return 0
+    return state.get('records', 0)
+
+
+def save_checkpoint(path, records):
+    state = dict(_source_signature(path), records=records)
+    tmp = checkpoint_path(path) + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, checkpoint_path(path))
+
+
+# -------------------- Import --------------------
+def _insert_statement():
+    """(INSERT for books, whether it returns the inserted ids)
+
+    Where supported, ISBNs inserted concurrently by someone else are skipped
+    and only the rows really inserted come back.
+    """
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return db.insert(Book), False
+    return insert(Book).on_conflict_do_nothing(index_elements=['isbn']).returning(Book.id), True
+
+
+def import_records(records, batch_size=1000, default_quantity=1, skip=0, on_commit=None, progress=None):
+    """Insert an iterable of source records, skipping known ISBNs; returns counts and timing
+
+    on_commit(position) is called after each committed batch with the number
+    of records consumed so far (including the `skip` records passed over).
+    """
+    seen = {normalize_isbn(isbn) for (isbn,) in db.session.query(Book.isbn)}
+    stats = {'read': 0, 'skipped': skip, 'inserted': 0, 'duplicates': 0, 'invalid': 0}
+    statement, returns_ids = _insert_statement()
+    started = time.perf_counter()
+    position = 0
+    batch = []
+
+    def flush():
+        if batch:
+            result = db.session.execute(statement, batch)
+            inserted = len(result.all()) if returns_ids else len(batch)
+            stats['inserted'] += inserted
+            stats['duplicates'] += len(batch) - inserted
+        db.session.commit()
+        batch.clear()
+        if on_commit:
+            on_commit(position)
+        if progress:
+            progress(stats, time.perf_counter() - started)
+
+    for raw in records:
+        position += 1
+        if position <= skip:
+            continue
+        stats['read'] += 1
+        try:
+            row = to_book_row(raw, default_quantity)
+        except InvalidRecord:
+            stats['invalid'] += 1
+            continue
+        if row['isbn'] in seen:
+            stats['duplicates'] += 1
+            continue
+        seen.add(row['isbn'])
+        batch.append(row)
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+
+    stats['seconds'] = time.perf_counter() - started
+    return stats
+
+
+def import_books(path, fmt=None, batch_size=1000, resume=True, default_quantity=1, progress=None):
+    """Stream a CSV/JSONL/MARC file into the books table, checkpointing each batch"""
+    fmt = fmt or detect_format(path)
+    if fmt not in READERS:
+        raise ValueError(f'Unknown import format for {path!r}; use one of {", ".join(FORMATS)}')
+    return import_records(
+        READERS[fmt](path), batch_size=batch_size, default_quantity=default_quantity,
+        skip=load_checkpoint(path) if resume else 0,
+        on_commit=lambda position: save_checkpoint(path, position),
+        progress=progress,
+    )
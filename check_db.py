@@ -25,4 +25,4 @@ with app.app_context():
         print(f"\nBooks found! First 5 books:")
         books = Book.query.limit(5).all()
         for b in books:
-            print(f"  - {b.title} by {b.author} (Available: {b.get_available_count()}/{b.quantity})")
+            print(f"  - {b.title} by {b.author} (Available: {b.available_copies}/{b.quantity})")
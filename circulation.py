@@ -0,0 +1,92 @@
+"""Atomic borrow and return operations.
+
+Availability is claimed with a single conditional UPDATE
+(``available_copies = available_copies - 1 WHERE available_copies > 0``), so
+two borrowers can never take the same last copy: whichever UPDATE runs second
+sees the new count and matches no row. Only the one book row is locked, and
+only for the length of the transaction. SQLite may still report "database
+is locked" under heavy write contention, so those transactions are retried
+with a short backoff.
+"""
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import OperationalError
+
+from extensions import db
+from models import Book, Borrowing
+
+LOAN_DAYS = 14
+MAX_ATTEMPTS = 5
+
+
+class CirculationError(Exception):
+    """Raised when a borrow or return cannot be completed"""
+
+
+def _is_lock_error(error):
+    message = str(error.orig).lower() if error.orig is not None else str(error).lower()
+    return 'locked' in message or 'busy' in message or 'deadlock' in message
+
+
+def _run_with_retry(operation):
+    """Run `operation` in its own transaction, retrying on lock contention"""
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            result = operation()
+            db.session.commit()
+            return result
+        except OperationalError as e:
+            db.session.rollback()
+            if attempt == MAX_ATTEMPTS or not _is_lock_error(e):
+                raise
+            time.sleep(random.uniform(0, 0.01 * 2 ** attempt))
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+def checkout_book(user_id, book_id, loan_days=LOAN_DAYS):
+    """Borrow one copy of a book; returns the new Borrowing"""
+    def operation():
+        claimed = db.session.execute(
+            db.update(Book)
+            .where(Book.id == book_id, Book.available_copies > 0)
+            .values(available_copies=Book.available_copies - 1)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not claimed:
+            raise CirculationError('No copies available.')
+        borrow_date = datetime.now()
+        borrowing = Borrowing(user_id=user_id, book_id=book_id, borrow_date=borrow_date,
+                              due_date=borrow_date + timedelta(days=loan_days))
+        db.session.add(borrowing)
+        db.session.flush()
+        return borrowing
+
+    return _run_with_retry(operation)
+
+
+def return_borrowing(borrowing_id):
+    """Close an open loan and put the copy back on the shelf"""
+    def operation():
+        closed = db.session.execute(
+            db.update(Borrowing)
+            .where(Borrowing.id == borrowing_id, Borrowing.return_date.is_(None))
+            .values(return_date=datetime.now())
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not closed:
+            raise CirculationError('This book has already been returned.')
+        book_id = db.session.execute(
+            db.select(Borrowing.book_id).where(Borrowing.id == borrowing_id)
+        ).scalar_one()
+        db.session.execute(
+            db.update(Book)
+            .where(Book.id == book_id)
+            .values(available_copies=Book.available_copies + 1)
+            .execution_options(synchronize_session=False)
+        )
+
+    _run_with_retry(operation)
@@ -0,0 +1,78 @@
+"""Conditional GET for rendered pages.
+
+A view computes a small validator (row versions from one cheap query) before
+doing any real work. If `not_modified(validator)` finds the browser's cached
+copy carries the same ETag, the view returns that 304 without querying or
+rendering anything else; otherwise it renders through
+`render_with_validators`, which sets ETag and Last-Modified.
+
+The ETag also covers who is asking (the navigation bar is per user) and a
+deploy salt, so a template change never revalidates stale HTML.
+"""
+import hashlib
+import os
+from datetime import timezone
+
+from flask import current_app, make_response, render_template, request, session
+
+from auth import get_user_snapshot
+
+
+def _template_salt(app):
+    """Changes whenever a template file changes (same value in every worker)"""
+    newest = 0
+    for root, _, files in os.walk(os.path.join(app.root_path, app.template_folder)):
+        for name in files:
+            newest = max(newest, os.path.getmtime(os.path.join(root, name)))
+    return str(newest)
+
+
+def init_app(app):
+    app.config.setdefault('ETAG_SALT', _template_salt(app))
+
+
+def make_etag(*parts):
+    user = get_user_snapshot()
+    key = repr((current_app.config['ETAG_SALT'], user and tuple(user), parts))
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def _http_time(value):
+    """Naive local datetime -> aware UTC, as Last-Modified expects"""
+    return value.astimezone(timezone.utc).replace(microsecond=0) if value else None
+
+
+def not_modified(validator, last_modified=None):
+    """A 304 response if the client's cached copy matches `validator`, else None"""
+    # A pending flash message is part of the page even when the data is not
+    if '_flashes' in session:
+        return None
+    etag = make_etag(*validator)
+    last_modified = _http_time(last_modified)
+    if request.if_none_match:
+        fresh = request.if_none_match.contains(etag)
+    else:
+        fresh = bool(last_modified and request.if_modified_since
+                     and last_modified <= request.if_modified_since)
+    if not fresh:
+        return None
+    response = make_response('', 304)
+    _set_validators(response, etag, last_modified)
+    return response
+
+
+def render_with_validators(validator, last_modified, template, **context):
+    """Render `template` with the ETag/Last-Modified that not_modified() checks"""
+    response = make_response(render_template(template, **context))
+    _set_validators(response, make_etag(*validator), _http_time(last_modified))
+    return response
+
+
+def _set_validators(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    # Per-user HTML: browsers may keep it but must revalidate, shared caches must not
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
@@ -0,0 +1,70 @@
+"""Shared pytest fixtures.
+
+The app binds its database when `app` is first imported, so point it at a
+throwaway SQLite file before anything imports it.
+"""
+import os
+import tempfile
+
+import pytest
+
+_TEST_DIR = tempfile.mkdtemp(prefix='library_tests_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_TEST_DIR, 'test.db')
+os.environ['CACHE_BACKEND'] = 'memory'
+
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from app import app as flask_app  # noqa: E402
+import auth  # noqa: E402
+from cache import query_cache  # noqa: E402
+import fragments  # noqa: E402
+from extensions import db  # noqa: E402
+from models import Book, User  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    flask_app.config['TESTING'] = True
+    flask_app.config['STRICT_LOADING'] = True
+    with flask_app.app_context():
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
+    query_cache.clear()
+    auth.user_cache.clear()
+    fragments.book_cards.clear()
+    yield flask_app
+
+
+@pytest.fixture
+def make_user(app):
+    def make(username, is_admin=False):
+        with app.app_context():
+            user = User(username=username, email=f'{username}@example.com',
+                        password=generate_password_hash('Passw0rd!'), is_admin=is_admin)
+            db.session.add(user)
+            db.session.commit()
+            return user.id
+    return make
+
+
+@pytest.fixture
+def make_book(app):
+    def make(title='Test Book', quantity=1, **fields):
+        with app.app_context():
+            book = Book(title=title, author=fields.pop('author', 'Test Author'),
+                        isbn=fields.pop('isbn', f'isbn-{title}'),
+                        publication_year=fields.pop('publication_year', 2000),
+                        quantity=quantity, **fields)
+            db.session.add(book)
+            db.session.commit()
+            return book.id
+    return make
+
+
+def login(client, user_id):
+    """Log a test client in as `user_id` without going through the form"""
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+        sess['username'] = f'user{user_id}'
+    return client
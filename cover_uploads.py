@@ -0,0 +1,157 @@
+"""Uploaded cover images: content-hash storage and resized variants.
+
+An upload is streamed to disk while it is hashed and stored as
+`<sha256 prefix>.<ext>`, so uploading the same image twice keeps one file.
+Smaller WebP variants (`<name>-thumb.webp`, `<name>-medium.webp`) are then
+rendered on a background thread. Templates ask for a size with the `cover`
+filter and get the original until the variant exists:
+
+    <img src="{{ book.image_url|cover('thumb') }}">
+
+Resizing needs Pillow. Without it uploads are still deduplicated and every
+size is served the original.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from werkzeug.utils import secure_filename
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # optional dependency
+    Image = None
+
+ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'webp'}
+# Largest box each variant must fit in; roughly 1.5-2x the size it is displayed at
+VARIANTS = {
+    'thumb': (240, 360),    # catalog grid, dashboard, profile, wishlist cards
+    'medium': (480, 720),   # book detail page
+}
+URL_PREFIX = '/static/uploads/covers/'
+# Open Library serves its own sizes: S, M (~180px wide) and L
+OPEN_LIBRARY_COVER = re.compile(r'^(https?://covers\.openlibrary\.org/b/\w+/[^/]+)-L\.jpg$')
+OPEN_LIBRARY_SIZES = {'thumb': 'M', 'medium': 'L'}
+
+
+def _variant_format():
+    """(Pillow format, extension): WebP when Pillow was built with it, else JPEG"""
+    if Image is not None and features.check('webp'):
+        return 'WEBP', 'webp'
+    return 'JPEG', 'jpg'
+
+
+VARIANT_FORMAT, VARIANT_EXT = _variant_format()
+
+
+class InvalidCover(ValueError):
+    """The uploaded file is not an accepted image type"""
+
+
+class CoverStore:
+    """Stores uploaded covers under static/uploads/covers and renders their variants"""
+
+    def __init__(self, workers=2):
+        self.folder = None
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='cover-variants')
+        self._ready = set()
+        self._pending = set()
+
+    def init_app(self, app):
+        self.folder = os.path.join(app.static_folder, 'uploads', 'covers')
+        app.add_template_filter(self.variant_url, 'cover')
+        app.extensions['cover_store'] = self
+
+    @property
+    def can_resize(self):
+        return Image is not None
+
+    @staticmethod
+    def variant_name(filename, size):
+        return f'{os.path.splitext(filename)[0]}-{size}.{VARIANT_EXT}'
+
+    def save(self, file_storage):
+        """Store an uploaded file; returns its URL and schedules the variants"""
+        ext = secure_filename(file_storage.filename).rsplit('.', 1)[-1].lower()
+        if ext not in ALLOWED_EXTENSIONS:
+            raise InvalidCover(f'Cover must be one of: {", ".join(sorted(ALLOWED_EXTENSIONS))}')
+        os.makedirs(self.folder, exist_ok=True)
+
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.folder, suffix='.upload')
+        with os.fdopen(fd, 'wb') as tmp:
+            for chunk in iter(lambda: file_storage.stream.read(1 << 16), b''):
+                digest.update(chunk)
+                tmp.write(chunk)
+        filename = f'{digest.hexdigest()[:32]}.{"jpg" if ext == "jpeg" else ext}'
+        path = os.path.join(self.folder, filename)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+        if self.can_resize and not all(os.path.exists(os.path.join(self.folder, self.variant_name(filename, size)))
+                                       for size in VARIANTS):
+            future = self.executor.submit(self.render_variants, filename)
+            self._pending.add(future)
+            future.add_done_callback(self._pending.discard)
+        return URL_PREFIX + filename
+
+    def join(self):
+        """Wait for variants still being rendered"""
+        wait(list(self._pending))
+
+    def render_variants(self, filename):
+        """Write every missing variant of an uploaded file (runs off the request thread)"""
+        with Image.open(os.path.join(self.folder, filename)) as original:
+            image = ImageOps.exif_transpose(original)
+            keep_alpha = VARIANT_FORMAT == 'WEBP' and image.mode in ('RGBA', 'LA', 'P')
+            image = image.convert('RGBA' if keep_alpha else 'RGB')
+            for size, box in VARIANTS.items():
+                target = os.path.join(self.folder, self.variant_name(filename, size))
+                if os.path.exists(target):
+                    continue
+                variant = image.copy()
+                variant.thumbnail(box, Image.LANCZOS)
+                fd, tmp_path = tempfile.mkstemp(dir=self.folder, suffix='.' + VARIANT_EXT)
+                with os.fdopen(fd, 'wb') as tmp:
+                    if VARIANT_FORMAT == 'WEBP':
+                        variant.save(tmp, 'WEBP', quality=80, method=4)
+                    else:
+                        variant.save(tmp, 'JPEG', quality=82, optimize=True, progressive=True)
+                os.replace(tmp_path, target)
+
+    def backfill(self):
+        """Render missing variants for every stored upload; returns how many files were processed"""
+        if not self.can_resize or not os.path.isdir(self.folder):
+            return 0
+        done = 0
+        for filename in sorted(os.listdir(self.folder)):
+            stem, _, ext = filename.rpartition('.')
+            if ext.lower() not in ALLOWED_EXTENSIONS or any(stem.endswith('-' + size) for size in VARIANTS):
+                continue
+            try:
+                self.render_variants(filename)
+                done += 1
+            except OSError:  # not a readable image; keep serving the original
+                continue
+        return done
+
+    def variant_url(self, url, size):
+        """URL of the `size` variant of a cover, or the original if there is none yet"""
+        if not url or size not in VARIANTS:
+            return url
+        if url.startswith(URL_PREFIX):
+            variant = self.variant_name(url[len(URL_PREFIX):], size)
+            if variant in self._ready or (self.folder and os.path.exists(os.path.join(self.folder, variant))):
+                self._ready.add(variant)
+                return URL_PREFIX + variant
+            return url
+        match = OPEN_LIBRARY_COVER.match(url)
+        if match:
+            return f'{match.group(1)}-{OPEN_LIBRARY_SIZES[size]}.jpg'
+        return url
+
+
+cover_store = CoverStore()
@@ -0,0 +1,209 @@
+"""Concurrent cover-image lookup with a persistent result cache.
+
+Books without an image_url are walked in id order, one batch at a time. Each
+batch is looked up on Open Library from a thread pool (bounded by `workers`
+and a shared requests-per-second limit), and the covers found are written
+back in one UPDATE per batch. Every definitive answer, cover or no cover, is
+remembered in a small SQLite file so later runs skip books already checked
+until the entry expires. Network errors are not cached and are retried next
+run.
+
+Used by `flask --app app resolve-covers` and fill_missing_images.py.
+"""
+import json
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from extensions import db
+from models import Book
+
+COVERS_URL = 'https://covers.openlibrary.org'
+SEARCH_URL = 'https://openlibrary.org/search.json'
+FOUND_TTL = 30 * 24 * 3600
+NOT_FOUND_TTL = 7 * 24 * 3600
+
+
+class LookupFailed(Exception):
+    """The cover service could not be reached; the answer is unknown"""
+
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across all threads"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class CoverCache:
+    """ISBN/title lookups already answered, with separate expiry for hits and misses"""
+
+    def __init__(self, path, found_ttl=FOUND_TTL, not_found_ttl=NOT_FOUND_TTL):
+        self.found_ttl = found_ttl
+        self.not_found_ttl = not_found_ttl
+        self._conn = sqlite3.connect(path)
+        self._conn.execute('CREATE TABLE IF NOT EXISTS covers '
+                           '(key TEXT PRIMARY KEY, url TEXT, checked_at REAL NOT NULL)')
+
+    def get(self, key):
+        """(hit, url) where url is None for a cached "no cover" answer"""
+        row = self._conn.execute('SELECT url, checked_at FROM covers WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return False, None
+        url, checked_at = row
+        ttl = self.found_ttl if url else self.not_found_ttl
+        if time.time() - checked_at > ttl:
+            return False, None
+        return True, url
+
+    def put_many(self, answers):
+        now = time.time()
+        with self._conn:
+            self._conn.executemany('INSERT OR REPLACE INTO covers (key, url, checked_at) VALUES (?, ?, ?)',
+                                   [(key, url, now) for key, url in answers])
+
+    def close(self):
+        self._conn.close()
+
+
+def cache_key(isbn, title, author):
+    isbn = (isbn or '').replace('-', '').strip()
+    return f'isbn:{isbn}' if isbn else f'search:{(title or "").lower()}|{(author or "").lower()}'
+
+
+class CoverResolver:
+    """Finds an Open Library cover URL for a book by ISBN, then by title/author search"""
+
+    def __init__(self, covers_url=COVERS_URL, search_url=SEARCH_URL, timeout=5, rate=10):
+        self.covers_url = covers_url.rstrip('/')
+        self.search_url = search_url
+        self.timeout = timeout
+        self.limiter = RateLimiter(rate)
+
+    def _open(self, url, method='GET'):
+        self.limiter.wait()
+        request = urllib.request.Request(url, method=method, headers={'User-Agent': 'library-cover-resolver'})
+        try:
+            return urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return None
+            raise LookupFailed(f'{url}: HTTP {e.code}') from e
+        except (urllib.error.URLError, OSError) as e:
+            raise LookupFailed(f'{url}: {e}') from e
+
+    def by_isbn(self, isbn):
+        isbn = (isbn or '').replace('-', '').strip()
+        if not isbn:
+            return None
+        url = f'{self.covers_url}/b/isbn/{urllib.parse.quote(isbn)}-L.jpg'
+        # default=false makes a missing cover a 404 instead of a placeholder image
+        response = self._open(url + '?default=false', method='HEAD')
+        if response is None:
+            return None
+        response.close()
+        return url
+
+    def by_search(self, title, author):
+        params = {k: v for k, v in (('title', title), ('author', author)) if v}
+        if not params:
+            return None
+        params.update(limit=5, fields='cover_i,isbn')
+        response = self._open(f'{self.search_url}?{urllib.parse.urlencode(params)}')
+        if response is None:
+            return None
+        url = response.url
+        # The body read can time out too, and a proxy can answer with HTML
+        try:
+            with response:
+                body = json.load(response)
+        except (ValueError, OSError) as e:
+            raise LookupFailed(f'{url}: bad search response ({e})') from e
+        docs = (body.get('docs') if isinstance(body, dict) else None) or []
+        for doc in docs:
+            if doc.get('cover_i'):
+                return f'{self.covers_url}/b/id/{doc["cover_i"]}-L.jpg'
+        for doc in docs:
+            for isbn in (doc.get('isbn') or [])[:1]:
+                url = self.by_isbn(isbn)
+                if url:
+                    return url
+        return None
+
+    def resolve(self, isbn, title, author):
+        return self.by_isbn(isbn) or self.by_search(title, author)
+
+
+def resolve_missing_covers(cache_path, resolver=None, workers=8, batch_size=100, progress=None):
+    """Fill in image_url for books that have none; returns counts"""
+    resolver = resolver or CoverResolver()
+    cache = CoverCache(cache_path)
+    stats = {'checked': 0, 'found': 0, 'not_found': 0, 'cached': 0, 'errors': 0}
+    missing = (Book.image_url.is_(None)) | (Book.image_url == '')
+    last_id = 0
+
+    def lookup(book):
+        try:
+            return book, resolver.resolve(book.isbn, book.title, book.author), None
+        except LookupFailed as e:
+            return book, None, e
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                books = (db.session.query(Book.id, Book.isbn, Book.title, Book.author)
+                         .filter(missing, Book.id > last_id)
+                         .order_by(Book.id).limit(batch_size).all())
+                if not books:
+                    break
+                last_id = books[-1].id
+
+                covers, to_fetch = {}, []
+                for book in books:
+                    hit, url = cache.get(cache_key(book.isbn, book.title, book.author))
+                    if hit:
+                        stats['cached'] += 1
+                        if url:
+                            covers[book.id] = url
+                    else:
+                        to_fetch.append(book)
+
+                answers = []
+                for book, url, error in pool.map(lookup, to_fetch):
+                    stats['checked'] += 1
+                    if error is not None:
+                        stats['errors'] += 1
+                        continue
+                    answers.append((cache_key(book.isbn, book.title, book.author), url))
+                    if url:
+                        covers[book.id] = url
+                        stats['found'] += 1
+                    else:
+                        stats['not_found'] += 1
+
+                if covers:
+                    db.session.execute(db.update(Book), [{'id': book_id, 'image_url': url}
+                                                         for book_id, url in covers.items()])
+                db.session.commit()
+                cache.put_many(answers)
+                if progress:
+                    progress(stats)
+    finally:
+        cache.close()
+    return stats
@@ -0,0 +1,96 @@
+"""Streaming CSV/JSONL exports of the catalog, loans and reviews.
+
+Rows are read with `yield_per`, so the database hands them over in
+partitions of `chunk_rows` rather than all at once. Each partition is
+encoded and yielded as one text chunk before the next is fetched, so memory
+stays flat however many rows are exported. The same generator feeds the
+admin download (a streamed response) and `flask --app app export`.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+from extensions import db
+from models import Book, Borrowing, Review, User
+
+FORMATS = ('csv', 'jsonl')
+MIMETYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+CHUNK_ROWS = 1000
+
+
+def _books():
+    return db.select(Book.id, Book.isbn, Book.title, Book.author, Book.publication_year, Book.quantity,
+                     Book.available_copies, Book.rating_avg, Book.rating_count, Book.description,
+                     Book.image_url, Book.created_at, Book.updated_at).order_by(Book.id)
+
+
+def _borrowings():
+    return (db.select(Borrowing.id, Borrowing.user_id, User.username, Borrowing.book_id, Book.isbn, Book.title,
+                      Borrowing.borrow_date, Borrowing.due_date, Borrowing.return_date)
+            .join(User, User.id == Borrowing.user_id)
+            .join(Book, Book.id == Borrowing.book_id)
+            .order_by(Borrowing.id))
+
+
+def _reviews():
+    return (db.select(Review.id, Review.user_id, User.username, Review.book_id, Book.isbn, Book.title,
+                      Review.rating, Review.comment, Review.created_at, Review.updated_at)
+            .join(User, User.id == Review.user_id)
+            .join(Book, Book.id == Review.book_id)
+            .order_by(Review.id))
+
+
+DATASETS = {'books': _books, 'borrowings': _borrowings, 'reviews': _reviews}
+
+
+def _isoformat(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _json_line(record):
+    if orjson is not None:
+        return orjson.dumps(record).decode('utf-8')
+    return json.dumps(record, default=_isoformat, separators=(',', ':'))
+
+
+def export_chunks(dataset, fmt, chunk_rows=CHUNK_ROWS, stats=None):
+    """Yield `dataset` encoded as `fmt`, one text chunk per `chunk_rows` rows.
+
+    If given, `stats['rows']` is kept up to date with the rows written.
+    """
+    if dataset not in DATASETS:
+        raise ValueError(f'Unknown dataset {dataset!r}; expected one of: {", ".join(DATASETS)}')
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown format {fmt!r}; expected one of: {", ".join(FORMATS)}')
+    stats = stats if stats is not None else {}
+    stats['rows'] = 0
+    result = db.session.execute(DATASETS[dataset]().execution_options(yield_per=chunk_rows))
+    columns = list(result.keys())
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    if fmt == 'csv':
+        writer.writerow(columns)
+    for rows in result.partitions():
+        if fmt == 'csv':
+            writer.writerows(rows)
+        else:
+            buffer.writelines(_json_line(dict(zip(columns, row))) + '\n' for row in rows)
+        stats['rows'] += len(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():  # CSV header of an empty export
+        yield buffer.getvalue()
+
+
+def export_filename(dataset, fmt):
+    return f'library-{dataset}-{datetime.now():%Y%m%d-%H%M%S}.{fmt}'
@@ -1,4 +1,157 @@
+import os
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, has_request_context, request, session as http_session
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+REPLICA_BIND = 'replica'
+
+
+class RoutingSession(Session):
+    """Sends reads to the replica bind when the current request allows it"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing
+                and not getattr(clause, 'is_dml', False)
+                and has_request_context() and g.get('read_replica')):
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
 
 # Central place for extensions (db, login_manager, migrate, etc.)
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+# -------------------- Engine profile --------------------
+# Every setting can be overridden with an environment variable of the same name.
+ENGINE_PROFILE_DEFAULTS = {
+    # SQLite pragmas, applied to every new connection
+    'DB_JOURNAL_MODE': 'WAL',          # readers no longer block the writer
+    'DB_SYNCHRONOUS': 'NORMAL',        # safe with WAL; fsync at checkpoints only
+    'DB_BUSY_TIMEOUT_MS': 5000,        # wait for locks instead of failing
+    'DB_CACHE_SIZE_KB': 65536,         # page cache per connection
+    'DB_MMAP_SIZE': 268435456,         # memory-map up to 256 MB of the file
+    'DB_FOREIGN_KEYS': True,
+    # Connection pool, used for server databases (PostgreSQL, MySQL)
+    'DB_POOL_SIZE': 10,
+    'DB_MAX_OVERFLOW': 20,
+    'DB_POOL_TIMEOUT': 30,
+    'DB_POOL_RECYCLE': 1800,
+    'DB_POOL_PRE_PING': True,
+}
+
+
+def load_engine_profile(environ=None):
+    """Engine settings from the environment, falling back to the defaults"""
+    environ = os.environ if environ is None else environ
+    profile = {}
+    for key, default in ENGINE_PROFILE_DEFAULTS.items():
+        raw = environ.get(key)
+        if raw is None:
+            profile[key] = default
+        elif isinstance(default, bool):
+            profile[key] = raw.strip().lower() in ('1', 'true', 'yes', 'on')
+        elif isinstance(default, int):
+            profile[key] = int(raw)
+        else:
+            profile[key] = raw.strip().upper()
+    return profile
+
+
+def is_sqlite_uri(uri):
+    return uri.startswith('sqlite')
+
+
+def engine_options(uri, profile):
+    """SQLALCHEMY_ENGINE_OPTIONS for the given database URI"""
+    if is_sqlite_uri(uri):
+        # pysqlite's own lock timeout, in seconds
+        return {'connect_args': {'timeout': profile['DB_BUSY_TIMEOUT_MS'] / 1000}}
+    return {
+        'pool_size': profile['DB_POOL_SIZE'],
+        'max_overflow': profile['DB_MAX_OVERFLOW'],
+        'pool_timeout': profile['DB_POOL_TIMEOUT'],
+        'pool_recycle': profile['DB_POOL_RECYCLE'],
+        'pool_pre_ping': profile['DB_POOL_PRE_PING'],
+    }
+
+
+def sqlite_pragmas(profile):
+    return [
+        f"PRAGMA journal_mode={profile['DB_JOURNAL_MODE']}",
+        f"PRAGMA synchronous={profile['DB_SYNCHRONOUS']}",
+        f"PRAGMA busy_timeout={int(profile['DB_BUSY_TIMEOUT_MS'])}",
+        f"PRAGMA cache_size={-int(profile['DB_CACHE_SIZE_KB'])}",
+        f"PRAGMA mmap_size={int(profile['DB_MMAP_SIZE'])}",
+        f"PRAGMA foreign_keys={'ON' if profile['DB_FOREIGN_KEYS'] else 'OFF'}",
+    ]
+
+
+def install_sqlite_pragmas(engine, profile):
+    """Apply the profile's pragmas to each new connection of a SQLite engine"""
+    if engine.dialect.name != 'sqlite':
+        return
+    statements = sqlite_pragmas(profile)
+
+    @event.listens_for(engine, 'connect')
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+
+# -------------------- Read replica routing --------------------
+# Views decorated with @read_replica read from the 'replica' bind (when one is
+# configured) on GET/HEAD. Writes always go to the primary, and for
+# REPLICA_RYW_SECONDS after a user's own commit their reads stay on the
+# primary too, so the page they are redirected to reflects the change.
+RYW_SESSION_KEY = 'primary_until'
+
+
+def read_replica(view):
+    """Let a read-only view run its queries against the replica"""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if (request.method in ('GET', 'HEAD')
+                and http_session.get(RYW_SESSION_KEY, 0) < time.time()):
+            g.read_replica = True
+        return view(*args, **kwargs)
+    return wrapped
+
+
+@contextmanager
+def primary_reads():
+    """Run the enclosed queries on the primary, even inside a @read_replica view"""
+    if not (has_request_context() and g.get('read_replica')):
+        yield
+        return
+    g.read_replica = False
+    try:
+        yield
+    finally:
+        g.read_replica = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _remember_write(db_session):
+    if has_request_context():
+        g.db_wrote = True
+
+
+def init_replica_routing(app):
+    app.config.setdefault('REPLICA_RYW_SECONDS', 5)
+
+    @app.after_request
+    def start_read_your_writes_window(response):
+        if g.get('db_wrote') and REPLICA_BIND in app.config.get('SQLALCHEMY_BINDS', {}):
+            http_session[RYW_SESSION_KEY] = time.time() + app.config['REPLICA_RYW_SECONDS']
+        return response
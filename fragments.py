@@ -0,0 +1,94 @@
+"""Cached book-card markup for the catalog grid.
+
+The shared part of a card (cover, metadata, availability) is rendered once
+per book version and reused for every user; the per-user action buttons are
+rendered on each request and spliced in at ACTIONS_SLOT. Entries are keyed on
+the book id and checked against its updated_at, which changes on every write
+(including the Core UPDATEs in circulation.py), and are evicted eagerly by
+ORM events on Book and Borrowing.
+"""
+import threading
+from collections import OrderedDict
+
+from markupsafe import Markup
+from sqlalchemy import event
+
+from models import Book, Borrowing
+
+ACTIONS_SLOT = '<!--card-actions-->'
+
+
+class FragmentCache:
+    """Bounded LRU of rendered fragments, one per id, with hit/miss counters"""
+
+    def __init__(self, max_entries=5000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.invalidations = 0
+
+    def get_or_render(self, ident, version, render):
+        with self._lock:
+            entry = self._entries.get(ident)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(ident)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        html = render()
+        with self._lock:
+            self._entries[ident] = (version, html)
+            self._entries.move_to_end(ident)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return html
+
+    def invalidate(self, ident):
+        with self._lock:
+            if self._entries.pop(ident, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.invalidations = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                    'invalidations': self.invalidations,
+                    'hit_rate': round(self.hits / lookups, 4) if lookups else None}
+
+
+book_cards = FragmentCache()
+
+
+def init_app(app):
+    app.config.setdefault('BOOK_CARD_CACHE_SIZE', 5000)
+    book_cards.max_entries = app.config['BOOK_CARD_CACHE_SIZE']
+    template = app.jinja_env.get_template('_book_card.html')
+
+    def book_card(book, actions):
+        """The card for `book` with this user's `actions` markup in place"""
+        cover = app.jinja_env.filters['cover'](book.image_url, 'thumb')
+        html = book_cards.get_or_render(
+            book.id, (book.updated_at, cover),
+            lambda: template.render(book=book, actions=Markup(ACTIONS_SLOT)),
+        )
+        return Markup(html.replace(ACTIONS_SLOT, str(actions), 1))
+
+    app.jinja_env.globals['book_card'] = book_card
+
+
+@event.listens_for(Book, 'after_insert')
+@event.listens_for(Book, 'after_update')
+@event.listens_for(Book, 'after_delete')
+def _evict_book(mapper, connection, target):
+    book_cards.invalidate(target.id)
+
+
+@event.listens_for(Borrowing, 'after_insert')
+@event.listens_for(Borrowing, 'after_update')
+def _evict_borrowed_book(mapper, connection, target):
+    book_cards.invalidate(target.book_id)
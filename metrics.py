@@ -0,0 +1,179 @@
+"""Per-endpoint latency, SQL query count and DB time.
+
+Every request is timed from before_request to teardown_request, so streamed
+responses (exports) include the time spent streaming. Every SQL statement
+executed while handling it is counted and timed through the engine's
+before/after_cursor_execute events. Histograms are kept per endpoint and
+method (never per URL, so ids do not multiply the series) and are served in
+Prometheus text format by /admin/metrics.
+
+A request that runs more than METRICS_QUERY_BUDGET statements or takes
+longer than METRICS_LATENCY_BUDGET_MS is logged as a warning, which makes
+N+1 query patterns show up in production logs.
+
+Counters live in this process; with several workers, scrape each one.
+"""
+import threading
+import time
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, Prometheus style"""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][i] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self, label_names):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for labels, (counts, total, count) in sorted(self.series.items()):
+            base = _labels(zip(label_names, labels))
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{base},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{base}}} {total:.6f}')
+            lines.append(f'{self.name}_count{{{base}}} {count}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in pairs)
+
+
+class RequestMetrics:
+    """Collects request, query and cache figures and renders them for Prometheus"""
+
+    LABELS = ('endpoint', 'method')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._caches = {}
+        self.query_budget = 20
+        self.latency_budget = 0.5
+        self.logger = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.latency = Histogram('library_request_duration_seconds',
+                                     'Time from request start to response end.', LATENCY_BUCKETS)
+            self.db_time = Histogram('library_request_db_seconds',
+                                     'Time spent executing SQL per request.', LATENCY_BUCKETS)
+            self.queries = Histogram('library_request_queries', 'SQL statements executed per request.',
+                                     QUERY_BUCKETS)
+            self.responses = {}
+            self.over_budget = {}
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_QUERY_BUDGET', 20)
+        app.config.setdefault('METRICS_LATENCY_BUDGET_MS', 500)
+        self.query_budget = app.config['METRICS_QUERY_BUDGET']
+        self.latency_budget = app.config['METRICS_LATENCY_BUDGET_MS'] / 1000
+        self.logger = app.logger
+        app.before_request(self._start)
+        app.after_request(self._status)
+        app.teardown_request(self._finish)
+        app.extensions['metrics'] = self
+
+    def register_cache(self, name, stats):
+        """Export a cache's stats() hits/misses as counters"""
+        self._caches[name] = stats
+
+    # -------------------- Request hooks --------------------
+    @staticmethod
+    def _start():
+        g.metrics_started = time.perf_counter()
+        g.metrics_queries = 0
+        g.metrics_db_time = 0.0
+
+    @staticmethod
+    def _status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    def _finish(self, error=None):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        queries, db_time = g.get('metrics_queries', 0), g.get('metrics_db_time', 0.0)
+        status = 500 if error is not None else g.get('metrics_status', 500)
+        endpoint = request.endpoint or 'unmatched'
+        labels = (endpoint, request.method)
+        with self._lock:
+            self.latency.observe(labels, elapsed)
+            self.db_time.observe(labels, db_time)
+            self.queries.observe(labels, queries)
+            key = labels + (str(status),)
+            self.responses[key] = self.responses.get(key, 0) + 1
+            reasons = [reason for reason, over in (('queries', queries > self.query_budget),
+                                                   ('latency', elapsed > self.latency_budget)) if over]
+            for reason in reasons:
+                self.over_budget[labels + (reason,)] = self.over_budget.get(labels + (reason,), 0) + 1
+        if reasons and self.logger is not None:
+            self.logger.warning('Over budget (%s): %s %s [%s] %d ms, %d queries, %.1f ms in DB',
+                                ', '.join(reasons), request.method, request.path, endpoint,
+                                elapsed * 1000, queries, db_time * 1000)
+
+    # -------------------- Output --------------------
+    def render(self):
+        with self._lock:
+            lines = []
+            for histogram in (self.latency, self.db_time, self.queries):
+                lines += histogram.render(self.LABELS)
+            lines += ['# HELP library_responses_total Responses by endpoint, method and status.',
+                      '# TYPE library_responses_total counter']
+            for key, count in sorted(self.responses.items()):
+                lines.append(f'library_responses_total{{{_labels(zip(self.LABELS + ("status",), key))}}} {count}')
+            lines += ['# HELP library_over_budget_total Requests over the query or latency budget.',
+                      '# TYPE library_over_budget_total counter']
+            for key, count in sorted(self.over_budget.items()):
+                lines.append(f'library_over_budget_total{{{_labels(zip(self.LABELS + ("budget",), key))}}} {count}')
+        for kind in ('hits', 'misses'):
+            lines += [f'# HELP library_cache_{kind}_total Cache {kind} by cache.',
+                      f'# TYPE library_cache_{kind}_total counter']
+            for name, stats in sorted(self._caches.items()):
+                lines.append(f'library_cache_{kind}_total{{cache="{_escape(name)}"}} {stats()[kind]}')
+        return '\n'.join(lines) + '\n'
+
+    def response(self):
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+
+metrics = RequestMetrics()
+
+
+# -------------------- Query counting --------------------
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['metrics_query_start'] = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'metrics_started' in g:
+        g.metrics_queries += 1
+        g.metrics_db_time += time.perf_counter() - conn.info.pop('metrics_query_start', time.perf_counter())
@@ -0,0 +1,248 @@
+"""Versioned schema migrations for existing databases.
+
+`db.create_all()` only creates missing tables, so columns and indexes added to
+an existing table need a migration. Each migration runs once, in its own
+short transaction, and is recorded in the `schema_migrations` table. The
+version row is claimed first, so when several workers boot at once only one
+runs each migration; the others wait on its lock, then skip it. Every
+step is additive (ADD COLUMN, CREATE INDEX IF NOT EXISTS), so it is a no-op
+on databases that create_all() already built and the app can keep serving
+while it runs.
+
+The app applies pending migrations at startup. To upgrade database files
+directly (a backup of each is taken first):
+
+    python migrations.py                   # library.db and instance/library.db
+    python migrations.py path/to/other.db
+    python migrations.py --status
+"""
+import argparse
+import os
+import shutil
+import time
+from datetime import datetime
+
+from sqlalchemy import (Column, DateTime, Integer, MetaData, String, Table, bindparam, create_engine, inspect,
+                        text)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.schema import CreateTable
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATHS = [
+    os.path.join(BASE_DIR, 'library.db'),
+    os.path.join(BASE_DIR, 'instance', 'library.db'),
+]
+BACKUP_DIR = os.path.join(BASE_DIR, 'backups')
+
+schema_migrations = Table(
+    'schema_migrations', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('description', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """Register fn(connection) as schema version `version`"""
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+# -------------------- Helpers --------------------
+def has_column(conn, table, column):
+    return column in {c['name'] for c in inspect(conn).get_columns(table)}
+
+
+def add_column(conn, table, column, ddl):
+    """ALTER TABLE ... ADD COLUMN unless it exists; True if it was added"""
+    if has_column(conn, table, column):
+        return False
+    conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+    return True
+
+
+def create_index(conn, name, table, columns, where=None):
+    sql = f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({", ".join(columns)})'
+    if where:
+        sql += f' WHERE {where}'
+    conn.execute(text(sql))
+
+
+# -------------------- Migrations --------------------
+@migration(1, 'books.image_url')
+def _books_image_url(conn):
+    add_column(conn, 'books', 'image_url', 'VARCHAR(512)')
+
+
+@migration(2, 'books.available_copies counter')
+def _books_available_copies(conn):
+    if add_column(conn, 'books', 'available_copies', 'INTEGER NOT NULL DEFAULT 0'):
+        conn.execute(text(
+            'UPDATE books SET available_copies = COALESCE(quantity, 1) - '
+            '(SELECT COUNT(*) FROM borrowings WHERE borrowings.book_id = books.id '
+            'AND borrowings.return_date IS NULL)'
+        ))
+    create_index(conn, 'ix_books_available_copies', 'books', ['available_copies'])
+
+
+@migration(3, 'books rating aggregates')
+def _books_rating_aggregates(conn):
+    added = [
+        add_column(conn, 'books', 'rating_sum', 'INTEGER NOT NULL DEFAULT 0'),
+        add_column(conn, 'books', 'rating_count', 'INTEGER NOT NULL DEFAULT 0'),
+        add_column(conn, 'books', 'rating_avg', 'FLOAT NOT NULL DEFAULT 0'),
+    ]
+    if any(added):
+        conn.execute(text(
+            'UPDATE books SET '
+            'rating_sum = (SELECT COALESCE(SUM(rating), 0) FROM reviews WHERE reviews.book_id = books.id), '
+            'rating_count = (SELECT COUNT(*) FROM reviews WHERE reviews.book_id = books.id), '
+            'rating_avg = (SELECT COALESCE(AVG(rating), 0) FROM reviews WHERE reviews.book_id = books.id)'
+        ))
+    create_index(conn, 'ix_books_rating_avg', 'books', ['rating_avg'])
+
+
+@migration(4, 'reminders table and open-loan due date index')
+def _reminders(conn):
+    from models import Reminder
+    Reminder.__table__.create(conn, checkfirst=True)
+    create_index(conn, 'ix_borrowings_open_due', 'borrowings', ['due_date'], where='return_date IS NULL')
+
+
+@migration(5, 'active loan, review and wishlist indexes')
+def _hot_path_indexes(conn):
+    create_index(conn, 'ix_borrowings_user_open', 'borrowings', ['user_id', 'due_date'],
+                 where='return_date IS NULL')
+    create_index(conn, 'ix_borrowings_book_return', 'borrowings', ['book_id', 'return_date'])
+    create_index(conn, 'ix_borrowings_user_history', 'borrowings', ['user_id', 'borrow_date', 'id'])
+    create_index(conn, 'ix_reviews_book_created', 'reviews', ['book_id', 'created_at'])
+    create_index(conn, 'ix_wishlists_user_added', 'wishlists', ['user_id', 'added_at'])
+
+
+@migration(6, 'books.updated_at index')
+def _books_updated_at(conn):
+    create_index(conn, 'ix_books_updated_at', 'books', ['updated_at'])
+
+
+@migration(7, 'books.publication_year index')
+def _books_publication_year(conn):
+    create_index(conn, 'ix_books_publication_year', 'books', ['publication_year'])
+
+
+@migration(8, 'backfill books.updated_at')
+def _books_updated_at_backfill(conn):
+    # Validators and the catalog's Last-Modified read updated_at; legacy rows never set it
+    conn.execute(text(
+        'UPDATE books SET updated_at = COALESCE(created_at, :now) WHERE updated_at IS NULL'
+    ).bindparams(bindparam('now', datetime.now(), type_=DateTime)))
+
+
+@migration(9, 'users.wishlist_updated_at')
+def _users_wishlist_updated_at(conn):
+    add_column(conn, 'users', 'wishlist_updated_at', 'DATETIME')
+
+
+# -------------------- Runner --------------------
+def applied_versions(engine):
+    with engine.begin() as conn:
+        conn.execute(CreateTable(schema_migrations, if_not_exists=True))
+        return {row.version for row in conn.execute(schema_migrations.select())}
+
+
+_UPSERT_DIALECTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def claim(conn, version, description):
+    """Record `version` as applied in this transaction; False if another process already did
+
+    The insert takes the write lock (SQLite) or the row lock (PostgreSQL) before
+    the migration runs, so a concurrent upgrade blocks here until this one
+    commits and then finds the row.
+    """
+    values = dict(version=version, description=description, applied_at=datetime.now())
+    insert = _UPSERT_DIALECTS.get(conn.dialect.name)
+    if insert is not None:
+        result = conn.execute(insert(schema_migrations).values(**values).on_conflict_do_nothing())
+        return result.rowcount == 1
+    if conn.execute(schema_migrations.select().where(schema_migrations.c.version == version)).first():
+        return False
+    conn.execute(schema_migrations.insert().values(**values))
+    return True
+
+
+def upgrade(engine):
+    """Apply pending migrations in order; returns the (version, description) pairs applied"""
+    done = applied_versions(engine)
+    applied = []
+    for version, description, fn in MIGRATIONS:
+        if version in done:
+            continue
+        with engine.begin() as conn:
+            if not claim(conn, version, description):
+                continue
+            fn(conn)
+        applied.append((version, description))
+    return applied
+
+
+def _has_schema(engine):
+    return inspect(engine).has_table('books')
+
+
+def upgrade_file(db_path):
+    if not os.path.exists(db_path):
+        print('No database found at', db_path)
+        return
+    engine = create_engine('sqlite:///' + db_path)
+    try:
+        if not _has_schema(engine):
+            print('No library tables in', db_path)
+            return
+        pending = [m for m in MIGRATIONS if m[0] not in applied_versions(engine)]
+        if not pending:
+            print(f'{db_path} is up to date.')
+            return
+        os.makedirs(BACKUP_DIR, exist_ok=True)
+        backup_name = os.path.relpath(db_path, BASE_DIR)
+        if backup_name.startswith(os.pardir):
+            backup_name = os.path.basename(db_path)
+        backup_name = backup_name.replace(os.sep, '_')
+        backup_path = os.path.join(BACKUP_DIR, f'{backup_name}.bak.{time.strftime("%Y%m%d_%H%M%S")}')
+        shutil.copy2(db_path, backup_path)
+        print(f'Backup created at: {backup_path}')
+        for version, description in upgrade(engine):
+            print(f'  applied {version}: {description}')
+    finally:
+        engine.dispose()
+
+
+def print_status(db_path):
+    if not os.path.exists(db_path):
+        print('No database found at', db_path)
+        return
+    engine = create_engine('sqlite:///' + db_path)
+    try:
+        if inspect(engine).has_table(schema_migrations.name):
+            done = applied_versions(engine)
+        else:
+            done = set()
+    finally:
+        engine.dispose()
+    print(db_path)
+    for version, description, _ in MIGRATIONS:
+        print(f'  [{"x" if version in done else " "}] {version}: {description}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Apply schema migrations to SQLite database files.')
+    parser.add_argument('paths', nargs='*', help='database files (default: library.db and instance/library.db)')
+    parser.add_argument('--status', action='store_true', help='list applied and pending migrations only')
+    args = parser.parse_args()
+    for path in args.paths or DB_PATHS:
+        (print_status if args.status else upgrade_file)(path)
+    print('Done.')
@@ -1,6 +1,25 @@
+from flask import current_app
 from extensions import db
+from cache import query_cache
 from datetime import datetime
 
+
+def _initial_available_copies(context):
+    """New books start with every copy on the shelf"""
+    quantity = context.get_current_parameters().get('quantity')
+    return quantity if quantity is not None else 1
+
+
+def eager(*loaders):
+    """Loader options for a page listing: `loaders` fetch what the template shows.
+
+    With STRICT_LOADING (the test suite) every other relationship raises
+    instead of lazy-loading, so an N+1 added to a template fails loudly.
+    """
+    if current_app.config.get('STRICT_LOADING'):
+        return loaders + (db.raiseload('*'),)
+    return loaders
+
 class User(db.Model):
     """User model for library management system"""
     __tablename__ = 'users'
@@ -12,6 +31,8 @@ class User(db.Model):
     is_admin = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.now)
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+    # Last wishlist add or remove; removals leave no row behind for page validators to see
+    wishlist_updated_at = db.Column(db.DateTime, nullable=True)
     
     # Relationships
     borrowings = db.relationship('Borrowing', backref='user', lazy=True, cascade='all, delete-orphan')
@@ -21,16 +42,11 @@ class User(db.Model):
     
     def get_borrowed_books_count(self):
         """Get count of currently borrowed books"""
-        return len([b for b in self.borrowings if b.return_date is None])
+        return Borrowing.query.filter(Borrowing.user_id == self.id, Borrowing.return_date.is_(None)).count()
     
     def get_overdue_books(self):
         """Get list of overdue books"""
-        from datetime import datetime as dt
-        overdue = []
-        for borrowing in self.borrowings:
-            if borrowing.return_date is None and borrowing.due_date < dt.now():
-                overdue.append(borrowing)
-        return overdue
+        return Borrowing.overdue_query().filter(Borrowing.user_id == self.id).all()
 
 
 class Book(db.Model):
@@ -41,13 +57,20 @@ class Book(db.Model):
     title = db.Column(db.String(200), nullable=False, index=True)
     author = db.Column(db.String(120), nullable=False, index=True)
     isbn = db.Column(db.String(13), unique=True, nullable=False, index=True)
-    publication_year = db.Column(db.Integer, nullable=False)
+    publication_year = db.Column(db.Integer, nullable=False, index=True)
     quantity = db.Column(db.Integer, default=1)
     available = db.Column(db.Boolean, default=True)
+    # Copies currently on the shelf; maintained by borrow/return/quantity edits
+    available_copies = db.Column(db.Integer, nullable=False, default=_initial_available_copies, index=True)
+    # Review aggregates; maintained by record_rating() so no AVG() per render
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_avg = db.Column(db.Float, nullable=False, default=0, index=True)
     description = db.Column(db.Text, nullable=True)
     image_url = db.Column(db.String(512), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.now)
-    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+    # Indexed so the catalog's conditional-GET validator (max updated_at) is a lookup
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now, index=True)
     
     # Relationships
     borrowings = db.relationship('Borrowing', backref='book', lazy=True, cascade='all, delete-orphan')
@@ -57,12 +80,92 @@ class Book(db.Model):
     
     def get_available_count(self):
         """Get count of available copies"""
-        borrowed_count = len([b for b in self.borrowings if b.return_date is None])
-        return self.quantity - borrowed_count
+        return self.available_copies
     
     def is_available(self):
         """Check if at least one copy is available"""
-        return self.get_available_count() > 0
+        return self.available_copies > 0
+    
+    def get_on_loan_count(self):
+        """Get count of copies currently borrowed"""
+        return self.quantity - self.available_copies
+    
+    @property
+    def average_rating(self):
+        """Average review rating rounded to one decimal (0 if unrated)"""
+        return round(self.rating_avg, 1) if self.rating_count else 0
+    
+    def record_rating(self, delta_sum, delta_count=0):
+        """Adjust the rating aggregates in SQL as part of the current transaction"""
+        new_sum = Book.rating_sum + delta_sum
+        new_count = Book.rating_count + delta_count
+        self.rating_sum = new_sum
+        self.rating_count = new_count
+        self.rating_avg = db.case((new_count > 0, new_sum * 1.0 / new_count), else_=0)
+    
+    @staticmethod
+    def catalog_version(user_id):
+        """(latest updated_at, highest id, user's wishlist size, newest entry and last change) for catalog validators
+
+        All are index lookups. Edits bump updated_at and new books raise the id;
+        the app never deletes books (a COUNT(*) would catch that, at O(n)).
+        """
+        # Separate subqueries: SQLite only short-circuits MIN/MAX when it is the sole aggregate
+        wishlist = db.select(Wishlist.id).where(Wishlist.user_id == user_id)
+        return tuple(db.session.query(
+            db.select(db.func.max(Book.updated_at)).scalar_subquery(),
+            db.select(db.func.max(Book.id)).scalar_subquery(),
+            db.select(db.func.count()).select_from(wishlist.subquery()).scalar_subquery(),
+            db.select(db.func.max(Wishlist.id)).where(Wishlist.user_id == user_id).scalar_subquery(),
+            db.select(User.wishlist_updated_at).where(User.id == user_id).scalar_subquery(),
+        ).one())
+    
+    @staticmethod
+    def detail_version(book_id, user_id):
+        """Everything book_detail renders that can change, in one query (None if no such book)"""
+        def scalar(*columns, where):
+            return db.select(*columns).where(*where).scalar_subquery()
+        row = db.session.query(
+            scalar(Book.id, where=[Book.id == book_id]),
+            # Rows from before updated_at was maintained fall back to created_at
+            scalar(db.func.coalesce(Book.updated_at, Book.created_at), where=[Book.id == book_id]),
+            scalar(db.func.max(Review.updated_at), where=[Review.book_id == book_id]),
+            scalar(db.func.count(Review.id), where=[Review.book_id == book_id]),
+            scalar(Wishlist.id, where=[Wishlist.book_id == book_id, Wishlist.user_id == user_id]),
+            scalar(db.func.count(Borrowing.id), where=[Borrowing.book_id == book_id, Borrowing.user_id == user_id]),
+            scalar(db.func.count(Borrowing.return_date),
+                   where=[Borrowing.book_id == book_id, Borrowing.user_id == user_id]),
+            scalar(User.wishlist_updated_at, where=[User.id == user_id]),
+        ).one()
+        return None if row[0] is None else tuple(row[1:])
+    
+    @staticmethod
+    def recount_ratings():
+        """Rebuild rating aggregates from the reviews table (repair tool)"""
+        rating_sum = db.select(db.func.coalesce(db.func.sum(Review.rating), 0)).where(
+            Review.book_id == Book.id
+        ).scalar_subquery()
+        rating_count = db.select(db.func.count(Review.id)).where(
+            Review.book_id == Book.id
+        ).scalar_subquery()
+        rating_avg = db.select(db.func.coalesce(db.func.avg(Review.rating), 0)).where(
+            Review.book_id == Book.id
+        ).scalar_subquery()
+        result = db.session.execute(
+            db.update(Book).values(rating_sum=rating_sum, rating_count=rating_count, rating_avg=rating_avg)
+        )
+        return result.rowcount
+    
+    @staticmethod
+    def recount_available_copies():
+        """Rebuild available_copies from open borrowings (repair tool)"""
+        open_loans = db.select(db.func.count(Borrowing.id)).where(
+            Borrowing.book_id == Book.id, Borrowing.return_date.is_(None)
+        ).scalar_subquery()
+        result = db.session.execute(
+            db.update(Book).values(available_copies=Book.quantity - open_loans)
+        )
+        return result.rowcount
 
 
 class Borrowing(db.Model):
@@ -76,9 +179,43 @@ class Borrowing(db.Model):
     due_date = db.Column(db.DateTime, nullable=False)
     return_date = db.Column(db.DateTime, nullable=True)
     
+    # Indexes are mirrored in migrations.py for databases created before them
+    __table_args__ = (
+        # Open loans by due date, for overdue and due-soon sweeps
+        db.Index('ix_borrowings_open_due', 'due_date',
+                 sqlite_where=db.text('return_date IS NULL'),
+                 postgresql_where=db.text('return_date IS NULL')),
+        # A user's open loans (dashboard, profile, borrow limit) in due-date order
+        db.Index('ix_borrowings_user_open', 'user_id', 'due_date',
+                 sqlite_where=db.text('return_date IS NULL'),
+                 postgresql_where=db.text('return_date IS NULL')),
+        # A book's open loans (availability recount); a partial index on book_id
+        # alone ties with ix_borrowings_book_id in SQLite's planner
+        db.Index('ix_borrowings_book_return', 'book_id', 'return_date'),
+        # A user's loan history, newest first (profile pagination)
+        db.Index('ix_borrowings_user_history', 'user_id', 'borrow_date', 'id'),
+    )
+    
     def __repr__(self):
         return f'<Borrowing {self.user_id} - {self.book_id}>'
     
+    @staticmethod
+    def open_query():
+        """Loans not yet returned (matches the partial index predicate)"""
+        return Borrowing.query.filter(Borrowing.return_date.is_(None))
+    
+    @staticmethod
+    def overdue_query(now=None):
+        """Open loans whose due date has passed"""
+        from datetime import datetime as dt
+        return Borrowing.open_query().filter(Borrowing.due_date < (now or dt.now()))
+    
+    @staticmethod
+    @query_cache.cached('overdue_count', tags=('borrowings',))
+    def overdue_count(now):
+        """Number of loans overdue at `now` (cached until a loan changes; pass a rounded time)"""
+        return Borrowing.overdue_query(now).count()
+    
     def is_overdue(self):
         """Check if the borrowing is overdue"""
         from datetime import datetime as dt
@@ -98,6 +235,19 @@ class Borrowing(db.Model):
         if self.return_date is None and self.is_overdue():
             return (dt.now() - self.due_date).days
         return 0
+    
+    @staticmethod
+    def get_user_stats(user_id):
+        """Current, total, returned and overdue loan counts in one query"""
+        from datetime import datetime as dt
+        is_open = Borrowing.return_date.is_(None)
+        total, returned, current, overdue = db.session.query(
+            db.func.count(Borrowing.id),
+            db.func.count(Borrowing.return_date),
+            db.func.coalesce(db.func.sum(db.case((is_open, 1), else_=0)), 0),
+            db.func.coalesce(db.func.sum(db.case((is_open & (Borrowing.due_date < dt.now()), 1), else_=0)), 0),
+        ).filter(Borrowing.user_id == user_id).one()
+        return {'total': total, 'returned': returned, 'current': current, 'overdue': overdue}
 
 
 class Wishlist(db.Model):
@@ -113,7 +263,15 @@ class Wishlist(db.Model):
     user = db.relationship('User', backref='wishlist')
     book = db.relationship('Book', backref='wishlisted_by')
     
-    __table_args__ = (db.UniqueConstraint('user_id', 'book_id', name='_user_book_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'book_id', name='_user_book_uc'),
+        db.Index('ix_wishlists_user_added', 'user_id', 'added_at'),
+    )
+    
+    @staticmethod
+    def touch(user_id):
+        """Record a wishlist change for the user's page validators (part of the current transaction)"""
+        db.session.execute(db.update(User).where(User.id == user_id).values(wishlist_updated_at=datetime.now()))
     
     def __repr__(self):
         return f'<Wishlist {self.user_id} - {self.book_id}>'
@@ -135,7 +293,10 @@ class Review(db.Model):
     user = db.relationship('User', backref='reviews')
     book = db.relationship('Book', backref='reviews')
     
-    __table_args__ = (db.UniqueConstraint('user_id', 'book_id', name='_user_book_review_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'book_id', name='_user_book_review_uc'),
+        db.Index('ix_reviews_book_created', 'book_id', 'created_at'),
+    )
     
     def __repr__(self):
         return f'<Review {self.user_id} - {self.book_id} ({self.rating}★)>'
@@ -151,3 +312,39 @@ class Review(db.Model):
     def get_review_count(book_id):
         """Get number of reviews for a book"""
         return Review.query.filter_by(book_id=book_id).count()
+    
+    @staticmethod
+    @query_cache.cached('book_reviews', tags=('reviews', 'users'))
+    def for_book(book_id):
+        """Reviews of a book, newest first, as plain dicts (cached until a review or user changes)"""
+        rows = (db.session.query(Review.user_id, User.username, Review.rating, Review.comment, Review.created_at)
+                .join(User, User.id == Review.user_id)
+                .filter(Review.book_id == book_id)
+                .order_by(Review.created_at.desc()).all())
+        return tuple(row._asdict() for row in rows)
+
+
+class Reminder(db.Model):
+    """Due-date reminder produced by the overdue sweep"""
+    __tablename__ = 'reminders'
+    
+    KIND_DUE_SOON = 'due_soon'
+    KIND_OVERDUE = 'overdue'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    borrowing_id = db.Column(db.Integer, db.ForeignKey('borrowings.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    kind = db.Column(db.String(20), nullable=False)
+    due_date = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    
+    # Relationships
+    borrowing = db.relationship('Borrowing', backref=db.backref('reminders', cascade='all, delete-orphan'))
+    user = db.relationship('User')
+    
+    # One reminder of each kind per loan, so re-running a sweep is harmless
+    __table_args__ = (db.UniqueConstraint('borrowing_id', 'kind', name='_borrowing_kind_uc'),)
+    
+    def __repr__(self):
+        return f'<Reminder {self.kind} {self.borrowing_id}>'
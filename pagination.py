@@ -0,0 +1,98 @@
+"""Keyset (cursor) pagination helpers.
+
+Instead of ``OFFSET``, each page remembers the sort key of its last row in an
+opaque ``after`` token and the next page asks for rows strictly after it, so
+deep pages cost the same as the first one. Totals are optional; callers cache
+them rather than running a ``COUNT(*)`` on every page view.
+"""
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and value.keys() == {'dt'}:
+        return datetime.fromisoformat(value['dt'])
+    # Anything else in a hand-made token (lists, objects) would reach the SQL as a bound value
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    raise ValueError(f'Unsupported cursor value {value!r}')
+
+
+def encode_cursor(values):
+    """Turn a row's sort key into an opaque URL-safe token"""
+    raw = json.dumps([_encode_value(v) for v in values], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Inverse of encode_cursor; returns None for missing or malformed tokens"""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if not isinstance(values, list):
+            return None
+        return [_decode_value(v) for v in values]
+    except (ValueError, TypeError, KeyError):
+        return None
+
+
+class KeysetPage:
+    """One page of keyset-paginated results"""
+
+    def __init__(self, items, next_cursor, after=None, total=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.after = after
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def is_first(self):
+        return not self.after
+
+
+def keyset_paginate(query, sort_key, after=None, per_page=10, descending=False):
+    """Return the page of `query` that follows the `after` cursor.
+
+    `sort_key` is a list of SQL expressions whose combination is unique per
+    row (end it with the primary key); all of them are sorted ascending, or
+    all descending. The query selects either a single entity (items are
+    instances) or several columns (items are dicts keyed by column name);
+    the sort key values are fetched alongside.
+    """
+    names = [column['name'] for column in query.column_descriptions]
+    values = decode_cursor(after)
+    if values is not None and len(values) != len(sort_key):
+        values = None
+    labelled = [expr.label(f'_keyset_{i}') for i, expr in enumerate(sort_key)]
+    ordering = [expr.desc() for expr in sort_key] if descending else sort_key
+    query = query.add_columns(*labelled).order_by(None).order_by(*ordering)
+    if values is not None:
+        row, cursor = tuple_(*sort_key), tuple_(*values)
+        query = query.filter(row < cursor if descending else row > cursor)
+    rows = query.limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(rows[-1][len(names):])
+    if len(names) == 1:
+        items = [row[0] for row in rows]
+    else:
+        items = [dict(zip(names, row)) for row in rows]
+    return KeysetPage(items, next_cursor, after=after if values else None)
+
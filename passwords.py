@@ -0,0 +1,157 @@
+"""Password hashing off the request threads.
+
+Hashing is deliberately slow (about 0.2s of CPU per pbkdf2 hash with the
+default 600k iterations), so login and register hand it to a small process
+pool instead of running it inline. At most PASSWORD_HASH_WORKERS hashes run
+at once and PASSWORD_HASH_QUEUE more may wait. By default the queue holds as
+many hashes as the workers can finish within PASSWORD_HASH_TIMEOUT, so a
+login rush waits its turn instead of failing. A request beyond that, or one
+waiting longer than the timeout, gets `HashingBusy` and the page asks the
+user to retry.
+The pool processes run at a lower CPU priority (PASSWORD_HASH_NICE), so a
+login rush slows other logins, not the catalog.
+
+PASSWORD_HASH_METHOD and PASSWORD_SALT_LENGTH are passed to werkzeug's
+generate_password_hash. A successful login whose stored hash used another
+method or salt length is rehashed with the current ones in the same pool task.
+
+Set PASSWORD_HASH_WORKERS=0 to hash inline (single-process tools, debugging).
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# One pbkdf2:sha256:600000 hash on a typical core; sizes the default queue
+HASH_SECONDS = 0.2
+
+
+def default_queue_limit(workers, timeout):
+    """Hashes that can wait behind `workers` and still finish within `timeout`"""
+    # Workers beyond the CPU count do not hash any faster
+    parallel = min(max(workers, 1), os.cpu_count() or 1)
+    return max(int(parallel * timeout / HASH_SECONDS) - workers, 0)
+
+
+class HashingBusy(Exception):
+    """Too many password hashes queued, or one took longer than the timeout"""
+
+
+# -------------------- Pool tasks (run in the worker processes) --------------------
+def _lower_priority(nice):
+    if nice:
+        os.nice(nice)
+
+
+def _hash(password, method, salt_length):
+    return generate_password_hash(password, method=method, salt_length=salt_length)
+
+
+def _verify(stored, password, method, salt_length, current_prefix):
+    """(matches, new hash or None); rehashes when `stored` used other parameters"""
+    if not stored or not check_password_hash(stored, password):
+        return False, None
+    prefix, salt = stored.split('$', 2)[:2]
+    if prefix == current_prefix and len(salt) == salt_length:
+        return True, None
+    return True, _hash(password, method, salt_length)
+
+
+# -------------------- Hasher --------------------
+class PasswordHasher:
+    """Bounded process pool for generate/check_password_hash"""
+
+    def __init__(self):
+        self.method = 'pbkdf2'
+        self.salt_length = 16
+        self.workers = 2
+        self.queue_limit = None  # None: default_queue_limit()
+        self.timeout = 10
+        self.nice = 10
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size())
+        self._prefix = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault('PASSWORD_HASH_METHOD', 'pbkdf2')
+        app.config.setdefault('PASSWORD_SALT_LENGTH', 16)
+        app.config.setdefault('PASSWORD_HASH_WORKERS', 2)
+        app.config.setdefault('PASSWORD_HASH_QUEUE', None)
+        app.config.setdefault('PASSWORD_HASH_TIMEOUT', 10)
+        app.config.setdefault('PASSWORD_HASH_NICE', 10)
+        self.configure(method=app.config['PASSWORD_HASH_METHOD'],
+                       salt_length=app.config['PASSWORD_SALT_LENGTH'],
+                       workers=app.config['PASSWORD_HASH_WORKERS'],
+                       queue_limit=app.config['PASSWORD_HASH_QUEUE'],
+                       timeout=app.config['PASSWORD_HASH_TIMEOUT'],
+                       nice=app.config['PASSWORD_HASH_NICE'])
+        app.extensions['password_hasher'] = self
+
+    def configure(self, **settings):
+        """Change parameters; the pool is restarted on next use"""
+        self.shutdown()
+        for name, value in settings.items():
+            setattr(self, name, value)
+        self._slots = threading.BoundedSemaphore(max(self.workers, 1) + self.queue_size())
+        self._prefix = None
+
+    def queue_size(self):
+        if self.queue_limit is None:
+            return default_queue_limit(self.workers, self.timeout)
+        return self.queue_limit
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_lower_priority,
+                                                     initargs=(self.nice,))
+            return self._executor
+
+    def run(self, fn, *args):
+        """fn(*args) in the pool; raises HashingBusy when full or too slow"""
+        if self.workers <= 0:
+            return fn(*args)
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise HashingBusy('Too many sign-ins in progress.')
+        try:
+            future = self._pool().submit(fn, *args)
+        except BrokenProcessPool:
+            slots.release()
+            self.shutdown()
+            raise HashingBusy('Password worker pool restarted.')
+        # The slot is freed when the task really ends, not when this caller gives up
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise HashingBusy('Password check timed out.')
+        except BrokenProcessPool:
+            self.shutdown()
+            raise HashingBusy('Password worker pool restarted.')
+
+    def current_prefix(self):
+        """Method and parameters werkzeug writes for the configured method, e.g. pbkdf2:sha256:600000"""
+        if self._prefix is None:
+            self._prefix = self.run(_hash, '', self.method, 1).split('$', 1)[0]
+        return self._prefix
+
+    def hash(self, password):
+        return self.run(_hash, password, self.method, self.salt_length)
+
+    def verify(self, stored, password):
+        """(matches, replacement hash or None)"""
+        return self.run(_verify, stored, password, self.method, self.salt_length, self.current_prefix())
+
+
+password_hasher = PasswordHasher()
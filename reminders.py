@@ -0,0 +1,52 @@
+"""Overdue / due-soon sweep that produces Reminder records.
+
+Open loans due before the horizon are walked in (due_date, id) order through
+the partial index on open loans, one batch per transaction, so the sweep
+never holds more than `batch_size` rows or a long write lock. Reminders are
+unique per (loan, kind), which makes the sweep safe to re-run from cron.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import tuple_
+
+from extensions import db
+from models import Borrowing, Reminder
+
+
+def sweep_reminders(now=None, due_soon_days=3, batch_size=500):
+    """Create missing reminders for overdue and due-soon loans; returns counts"""
+    now = now or datetime.now()
+    horizon = now + timedelta(days=due_soon_days)
+    counts = {'scanned': 0, Reminder.KIND_OVERDUE: 0, Reminder.KIND_DUE_SOON: 0, 'batches': 0}
+    last_key = None
+
+    while True:
+        query = (db.session.query(Borrowing.id, Borrowing.user_id, Borrowing.due_date)
+                 .filter(Borrowing.return_date.is_(None), Borrowing.due_date < horizon))
+        if last_key is not None:
+            query = query.filter(tuple_(Borrowing.due_date, Borrowing.id) > tuple_(*last_key))
+        rows = query.order_by(Borrowing.due_date, Borrowing.id).limit(batch_size).all()
+        if not rows:
+            break
+
+        existing = set(
+            db.session.query(Reminder.borrowing_id, Reminder.kind)
+            .filter(Reminder.borrowing_id.in_([row.id for row in rows]))
+        )
+        new_reminders = []
+        for row in rows:
+            kind = Reminder.KIND_OVERDUE if row.due_date < now else Reminder.KIND_DUE_SOON
+            if (row.id, kind) in existing:
+                continue
+            new_reminders.append({'borrowing_id': row.id, 'user_id': row.user_id, 'kind': kind,
+                                  'due_date': row.due_date, 'created_at': now})
+            counts[kind] += 1
+        if new_reminders:
+            db.session.execute(db.insert(Reminder), new_reminders)
+        db.session.commit()
+
+        counts['scanned'] += len(rows)
+        counts['batches'] += 1
+        last_key = (rows[-1].due_date, rows[-1].id)
+
+    return counts
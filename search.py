@@ -0,0 +1,242 @@
+"""Full-text search for the book catalog.
+
+The catalog search goes through `book_search`, which picks a backend for the
+configured database:
+
+- ``sqlite-fts5``: an external-content FTS5 table (``books_fts``) kept in sync
+  with ``books`` by triggers, ranked with bm25.
+- ``postgres``: ``to_tsvector`` matching backed by a GIN expression index.
+- ``like``: the original ``ILIKE '%term%'`` scan, used when nothing better is
+  available.
+
+Set ``SEARCH_BACKEND`` to one of the names above to force a backend, or leave
+it as ``auto``.
+"""
+import re
+
+from sqlalchemy import column, false, func, literal_column, or_, table, text
+from sqlalchemy.exc import OperationalError
+
+from extensions import db
+from models import Book
+
+# Words are matched as prefixes so "harr pot" finds "Harry Potter"
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(term):
+    """Split a user search string into lowercase word tokens"""
+    return [t.lower() for t in _TOKEN_RE.findall(term or '')]
+
+
+class SearchBackend:
+    """Base class for catalog search backends"""
+    name = None
+
+    def is_supported(self, engine):
+        return True
+
+    def install(self, engine):
+        """Create any tables, triggers or indexes the backend needs"""
+
+    def filter(self, query, term):
+        """Restrict a Book query to rows matching a search term"""
+        raise NotImplementedError
+
+    def rank(self, term):
+        """SQL expression ordering matches best-first (ascending), or None"""
+        return None
+
+    def apply(self, query, term):
+        """Filter a Book query by a search term and order it by relevance"""
+        query = self.filter(query, term)
+        rank = self.rank(term)
+        if rank is None:
+            return query
+        return query.order_by(rank, Book.id)
+
+
+class LikeSearchBackend(SearchBackend):
+    """Substring scan over title, author, ISBN and description (no index support)"""
+    name = 'like'
+
+    def filter(self, query, term):
+        pattern = f"%{term}%"
+        return query.filter(or_(
+            Book.title.ilike(pattern),
+            Book.author.ilike(pattern),
+            Book.isbn.ilike(pattern),
+            Book.description.ilike(pattern),
+        ))
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    """SQLite FTS5 index over title, author, ISBN and description"""
+    name = 'sqlite-fts5'
+
+    # bm25 column weights: title, author, isbn, description
+    WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+
+    SETUP_SQL = [
+        """CREATE VIRTUAL TABLE books_fts USING fts5(
+            title, author, isbn, description,
+            content='books', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts(rowid, title, author, isbn, description)
+            VALUES (new.id, new.title, new.author, new.isbn, new.description);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts(books_fts, rowid, title, author, isbn, description)
+            VALUES ('delete', old.id, old.title, old.author, old.isbn, old.description);
+        END""",
+        # Only the indexed columns fire this, so availability updates on
+        # every borrow/return don't touch the index.
+        """CREATE TRIGGER IF NOT EXISTS books_fts_au
+            AFTER UPDATE OF title, author, isbn, description ON books BEGIN
+            INSERT INTO books_fts(books_fts, rowid, title, author, isbn, description)
+            VALUES ('delete', old.id, old.title, old.author, old.isbn, old.description);
+            INSERT INTO books_fts(rowid, title, author, isbn, description)
+            VALUES (new.id, new.title, new.author, new.isbn, new.description);
+        END""",
+    ]
+
+    fts = table('books_fts', column('rowid'))
+
+    def is_supported(self, engine):
+        if engine.dialect.name != 'sqlite':
+            return False
+        with engine.connect() as conn:
+            options = {row[0] for row in conn.exec_driver_sql('PRAGMA compile_options')}
+        return 'ENABLE_FTS5' in options
+
+    def install(self, engine):
+        with engine.begin() as conn:
+            exists = conn.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='books_fts'"
+            ).first()
+            if not exists:
+                conn.exec_driver_sql(self.SETUP_SQL[0])
+            for statement in self.SETUP_SQL[1:]:
+                conn.exec_driver_sql(statement)
+            if not exists:
+                # Index rows that were written before the table existed
+                conn.exec_driver_sql("INSERT INTO books_fts(books_fts) VALUES ('rebuild')")
+
+    def rebuild(self, engine):
+        with engine.begin() as conn:
+            conn.exec_driver_sql("INSERT INTO books_fts(books_fts) VALUES ('rebuild')")
+
+    @staticmethod
+    def match_expression(tokens):
+        return ' '.join(f'"{t}"*' for t in tokens)
+
+    def filter(self, query, term):
+        tokens = tokenize(term)
+        if not tokens:
+            return query.filter(false())
+        return (
+            query.join(self.fts, self.fts.c.rowid == Book.id)
+            .filter(text('books_fts MATCH :fts_query').bindparams(fts_query=self.match_expression(tokens)))
+        )
+
+    def rank(self, term):
+        # No tokens means filter() skipped the books_fts join; there is nothing to rank
+        if not tokenize(term):
+            return None
+        # bm25 scores are negative; lower is a better match
+        weights = ', '.join(str(w) for w in self.WEIGHTS)
+        return literal_column(f'bm25(books_fts, {weights})')
+
+
+class PostgresSearchBackend(SearchBackend):
+    """PostgreSQL text search over a GIN expression index"""
+    name = 'postgres'
+
+    CONFIG = 'simple'
+
+    def _document(self):
+        return func.to_tsvector(
+            self.CONFIG,
+            func.coalesce(Book.title, '') + ' ' + func.coalesce(Book.author, '') + ' '
+            + func.coalesce(Book.isbn, '') + ' ' + func.coalesce(Book.description, ''),
+        )
+
+    def is_supported(self, engine):
+        return engine.dialect.name == 'postgresql'
+
+    def install(self, engine):
+        with engine.begin() as conn:
+            conn.exec_driver_sql(
+                f"CREATE INDEX IF NOT EXISTS ix_books_search ON books USING GIN ("
+                f"to_tsvector('{self.CONFIG}', coalesce(title, '') || ' ' || coalesce(author, '') || ' ' "
+                f"|| coalesce(isbn, '') || ' ' || coalesce(description, '')))"
+            )
+
+    def _ts_query(self, tokens):
+        return func.to_tsquery(self.CONFIG, ' & '.join(f'{t}:*' for t in tokens))
+
+    def filter(self, query, term):
+        tokens = tokenize(term)
+        if not tokens:
+            return query.filter(false())
+        return query.filter(self._document().op('@@')(self._ts_query(tokens)))
+
+    def rank(self, term):
+        tokens = tokenize(term)
+        if not tokens:
+            return None
+        # Negated so that, like bm25, ascending order puts the best match first
+        return -func.ts_rank(self._document(), self._ts_query(tokens))
+
+
+SEARCH_BACKENDS = {
+    backend.name: backend
+    for backend in (SQLiteFTS5Backend, PostgresSearchBackend, LikeSearchBackend)
+}
+
+
+class BookSearch:
+    """Selects and installs a search backend for the app's database"""
+
+    def __init__(self, app=None):
+        self.backend = LikeSearchBackend()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SEARCH_BACKEND', 'auto')
+        with app.app_context():
+            self.backend = self._select_backend(app.config['SEARCH_BACKEND'], db.engine)
+            try:
+                self.backend.install(db.engine)
+            except OperationalError as e:
+                app.logger.warning('Search backend %s unavailable (%s); using LIKE search',
+                                   self.backend.name, e)
+                self.backend = LikeSearchBackend()
+        app.extensions['book_search'] = self
+
+    @staticmethod
+    def _select_backend(name, engine):
+        if name != 'auto':
+            if name not in SEARCH_BACKENDS:
+                raise ValueError(f'Unknown SEARCH_BACKEND {name!r}')
+            return SEARCH_BACKENDS[name]()
+        for backend_cls in SEARCH_BACKENDS.values():
+            backend = backend_cls()
+            if backend.is_supported(engine):
+                return backend
+        return LikeSearchBackend()
+
+    def filter(self, query, term):
+        return self.backend.filter(query, term)
+
+    def rank(self, term):
+        return self.backend.rank(term)
+
+    def apply(self, query, term):
+        return self.backend.apply(query, term)
+
+
+book_search = BookSearch()
@@ -6,7 +6,7 @@ Run: python seed_more_books_with_images.py
 from app import app
 from extensions import db
 from models import Book
-import requests
+from covers import CoverResolver, LookupFailed
 
 # A small curated list of books with ISBNs. We'll attempt to fetch cover images via Open Library.
 books_to_add = [
@@ -20,15 +20,9 @@ books_to_add = [
 def fetch_cover(isbn):
     """Try to get a cover image URL from Open Library covers API."""
     try:
-        # Open Library cover endpoint (small/medium/large). Use large for better quality.
-        url = f"https://covers.openlibrary.org/b/isbn/{isbn}-L.jpg"
-        # Quick HEAD to check if exists (returns 200)
-        r = requests.head(url, timeout=5)
-        if r.status_code == 200:
-            return url
-    except Exception:
-        pass
-    return None
+        return CoverResolver().by_isbn(isbn)
+    except LookupFailed:
+        return None
 
 
 def add_books():
@@ -63,31 +63,6 @@ if (searchInput) {
     });
 }
 
-// ==================== TABLE SORTING ====================
-function sortTable(columnIndex) {
-    const table = document.querySelector('.books-table');
-    const tbody = table.querySelector('tbody');
-    const rows = Array.from(tbody.querySelectorAll('tr'));
-    
-    rows.sort((a, b) => {
-        const aValue = a.cells[columnIndex].textContent.trim();
-        const bValue = b.cells[columnIndex].textContent.trim();
-        
-        // Try numeric sort first
-        const aNum = parseFloat(aValue);
-        const bNum = parseFloat(bValue);
-        
-        if (!isNaN(aNum) && !isNaN(bNum)) {
-            return aNum - bNum;
-        }
-        
-        // Fall back to string sort
-        return aValue.localeCompare(bValue);
-    });
-    
-    rows.forEach(row => tbody.appendChild(row));
-}
-
 // ==================== THEME SWITCHER ====================
 function initThemeSwitcher() {
     const savedTheme = localStorage.getItem('theme') || 'light';
@@ -0,0 +1,98 @@
+"""JSON API: auth, catalog paging, detail aggregates, circulation, wishlist."""
+import pytest
+
+from conftest import login
+
+
+def test_requires_login(app):
+    response = app.test_client().get('/api/v1/books')
+    assert response.status_code == 401 and response.get_json() == {'error': 'Authentication required.'}
+
+
+def test_session_login(app, make_user):
+    make_user('kiosk')
+    client = app.test_client()
+    assert client.post('/api/v1/session', json={'username': 'kiosk', 'password': 'nope'}).status_code == 401
+    assert client.post('/api/v1/session', json={'username': 'kiosk', 'password': 'Passw0rd!'}).status_code == 200
+    assert client.get('/api/v1/me/loans').status_code == 200
+
+
+def test_catalog_pages_with_cursor(app, make_user, make_book):
+    for title in ('Alpha', 'Beta', 'Gamma'):
+        make_book(title, quantity=0 if title == 'Beta' else 1)
+    client = login(app.test_client(), make_user('reader'))
+
+    first = client.get('/api/v1/books?limit=2').get_json()
+    assert [b['title'] for b in first['items']] == ['Alpha', 'Beta'] and first['total'] == 3
+    assert set(first['items'][0]) >= {'id', 'author', 'isbn', 'available', 'available_copies', 'rating_avg'}
+    second = client.get(f'/api/v1/books?limit=2&after={first["next"]}').get_json()
+    assert [b['title'] for b in second['items']] == ['Gamma'] and second['next'] is None
+
+    available = client.get('/api/v1/books?filter=available').get_json()
+    assert [b['title'] for b in available['items']] == ['Alpha', 'Gamma']
+    assert client.get('/api/v1/books?sort=price').status_code == 400
+
+
+def test_borrow_return_and_wishlist(app, make_user, make_book):
+    book_id = make_book('Only Copy', quantity=1)
+    client = login(app.test_client(), make_user('reader'))
+    other = login(app.test_client(), make_user('other'))
+
+    loan = client.post(f'/api/v1/books/{book_id}/borrow')
+    assert loan.status_code == 201
+    assert other.post(f'/api/v1/books/{book_id}/borrow').status_code == 409
+    detail = client.get(f'/api/v1/books/{book_id}').get_json()
+    assert (detail['available'], detail['on_loan']) == (False, 1)
+    assert detail['rating_distribution'] == {'1': 0, '2': 0, '3': 0, '4': 0, '5': 0}
+
+    loan_id = loan.get_json()['id']
+    assert [item['id'] for item in client.get('/api/v1/me/loans').get_json()['items']] == [loan_id]
+    assert other.post(f'/api/v1/loans/{loan_id}/return').status_code == 404
+    assert client.post(f'/api/v1/loans/{loan_id}/return').status_code == 200
+    assert client.get('/api/v1/me/loans').get_json()['items'] == []
+    assert client.get('/api/v1/me/loans?status=returned').get_json()['items'][0]['return_date']
+
+    assert client.post('/api/v1/me/wishlist', json={'book_id': book_id}).status_code == 201
+    assert client.post('/api/v1/me/wishlist', json={'book_id': book_id}).status_code == 409
+    assert client.get('/api/v1/me/wishlist').get_json()['items'][0]['title'] == 'Only Copy'
+    assert client.delete(f'/api/v1/me/wishlist/{book_id}').status_code == 200
+    assert client.delete(f'/api/v1/me/wishlist/{book_id}').status_code == 404
+
+
+def test_tampered_cursors_fall_back_to_the_first_page(app, make_user, make_book):
+    from pagination import decode_cursor, encode_cursor
+
+    make_book('Alpha')
+    client = login(app.test_client(), make_user('reader'))
+    for values in ([[1], 2], [{'x': 1}, 2], [{'dt': 1}, 2]):
+        token = encode_cursor(values)
+        assert decode_cursor(token) is None
+        response = client.get(f'/api/v1/books?after={token}')
+        assert response.status_code == 200 and response.get_json()['items'][0]['title'] == 'Alpha'
+        assert client.get(f'/books?after={token}').status_code == 200
+        assert client.get(f'/profile?history_after={token}').status_code == 200
+
+
+@pytest.mark.parametrize('body', ['[1, 2]', '"kiosk"', '42', 'null', '{not json'])
+def test_bodies_that_are_not_objects_are_rejected(app, make_user, body):
+    client = app.test_client()
+    response = client.post('/api/v1/session', data=body, content_type='application/json')
+    assert response.status_code == 400 and 'error' in response.get_json()
+
+    login(client, make_user('reader'))
+    assert client.post('/api/v1/me/wishlist', data=body, content_type='application/json').status_code == 400
+
+
+def test_login_rejects_credentials_that_are_not_strings(app, make_user):
+    make_user('kiosk')
+    response = app.test_client().post('/api/v1/session', json={'username': ['kiosk'], 'password': 1})
+    assert response.status_code == 400
+
+
+def test_routing_errors_under_the_api_are_json(app):
+    client = app.test_client()
+    missing = client.get('/api/v1/no-such-thing')
+    assert missing.status_code == 404 and 'error' in missing.get_json()
+    wrong_method = client.put('/api/v1/session')
+    assert wrong_method.status_code == 405 and 'error' in wrong_method.get_json()
+    assert client.get('/no-such-page').mimetype == 'text/html'
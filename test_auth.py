@@ -0,0 +1,19 @@
+"""User snapshot cache: expiry and a bounded size."""
+from auth import UserSnapshot, UserSnapshotCache
+
+
+def test_snapshot_cache_evicts_the_least_recently_used():
+    cache = UserSnapshotCache(ttl=30, max_entries=2)
+    for user_id in (1, 2):
+        cache.put(UserSnapshot(user_id, f'user{user_id}', False))
+    assert cache.get(1).username == 'user1'
+    cache.put(UserSnapshot(3, 'user3', False))
+    assert len(cache) == 2
+    assert cache.get(2) is None and cache.get(1) and cache.get(3)
+
+
+def test_expired_snapshots_are_dropped(monkeypatch):
+    cache = UserSnapshotCache(ttl=30)
+    cache.put(UserSnapshot(1, 'user1', False))
+    monkeypatch.setattr('auth.time.monotonic', lambda: float('inf'))
+    assert cache.get(1) is None and len(cache) == 0
@@ -0,0 +1,63 @@
+"""Stress tests for the atomic borrow/return path."""
+import threading
+
+from conftest import login
+from extensions import db
+from models import Book, Borrowing
+
+COPIES = 5
+BORROWERS = 40
+
+
+def _hammer(app, target, args_list):
+    """Run target(*args) for every args tuple at once from its own thread"""
+    barrier = threading.Barrier(len(args_list))
+    errors = []
+
+    def worker(*args):
+        try:
+            barrier.wait()
+            target(*args)
+        except Exception as e:  # surfaced by the assertion below
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=args) for args in args_list]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors, errors
+
+
+def test_popular_title_is_never_oversubscribed(app, make_user, make_book):
+    book_id = make_book('Popular Title', quantity=COPIES)
+    user_ids = [make_user(f'borrower{i}') for i in range(BORROWERS)]
+
+    def borrow(user_id):
+        client = login(app.test_client(), user_id)
+        assert client.post(f'/borrow/{book_id}').status_code == 302
+
+    _hammer(app, borrow, [(uid,) for uid in user_ids])
+
+    with app.app_context():
+        book = db.session.get(Book, book_id)
+        open_loans = Borrowing.query.filter_by(book_id=book_id, return_date=None).count()
+        assert open_loans == COPIES
+        assert book.available_copies == 0
+
+
+def test_concurrent_returns_of_one_loan_restock_once(app, make_user, make_book):
+    book_id = make_book('Returned Title', quantity=1)
+    user_id = make_user('returner')
+    client = login(app.test_client(), user_id)
+    client.post(f'/borrow/{book_id}')
+    with app.app_context():
+        borrowing_id = Borrowing.query.filter_by(book_id=book_id).one().id
+
+    def give_back():
+        login(app.test_client(), user_id).post(f'/return/{borrowing_id}')
+
+    _hammer(app, give_back, [()] * 10)
+
+    with app.app_context():
+        assert db.session.get(Book, book_id).available_copies == 1
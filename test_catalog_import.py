@@ -0,0 +1,91 @@
+"""Bulk catalog import: deduplication, validation and resume."""
+import csv
+
+from catalog_import import checkpoint_path, import_books, import_records
+from extensions import db
+from models import Book
+
+
+def _write_csv(path, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['title', 'author', 'isbn', 'year', 'quantity'])
+        writer.writerows(rows)
+
+
+def test_import_skips_known_and_repeated_isbns(app, make_book, tmp_path):
+    make_book('Already Here', isbn='978-0000000001')
+    source = tmp_path / 'catalog.csv'
+    _write_csv(source, [
+        ('Already Here', 'A', '9780000000001', 2001, 2),   # in the database, different hyphenation
+        ('New One', 'B', '978-0000000002', 2002, 3),
+        ('New One Again', 'B', '978-0000000002', 2002, 3),  # repeated within the file
+        ('No Year', 'C', '978-0000000003', '', 1),           # invalid
+        ('New Two', 'D', '978-0000000004', 'c1999.', ''),
+        ('No ISBN', 'E', 'n/a', 2003, 1),                    # invalid, not a duplicate of the next
+        ('No ISBN Either', 'E', 'unknown', 2003, 1),
+        ('Short ISBN', 'E', '12345', 2003, 1),
+        ('Old Style', 'F', '0-306-40615-x', 1980, 1),        # ISBN-10 with a check digit X
+    ])
+
+    with app.app_context():
+        stats = import_books(str(source), batch_size=1)
+        assert (stats['inserted'], stats['duplicates'], stats['invalid']) == (3, 2, 4)
+        new_one = Book.query.filter_by(isbn='9780000000002').one()
+        assert (new_one.quantity, new_one.available_copies) == (3, 3)
+        assert Book.query.filter_by(isbn='9780000000004').one().publication_year == 1999
+        assert Book.query.filter_by(isbn='030640615X').count() == 1
+
+
+def test_import_resumes_after_the_last_committed_batch(app, tmp_path):
+    source = tmp_path / 'catalog.csv'
+    _write_csv(source, [(f'Book {i}', 'Author', f'97800000000{i:02}', 2000, 1) for i in range(10)])
+
+    with app.app_context():
+        assert import_books(str(source), batch_size=4)['inserted'] == 10
+        # Pretend the first run died after two batches and its rows for the third were lost
+        checkpoint = checkpoint_path(str(source))
+        with open(checkpoint) as f:
+            state = f.read()
+        with open(checkpoint, 'w') as f:
+            f.write(state.replace('"records": 10', '"records": 8'))
+        db.session.execute(db.delete(Book).where(Book.isbn.in_(['9780000000008', '9780000000009'])))
+        db.session.commit()
+
+        stats = import_books(str(source), batch_size=4)
+        assert (stats['skipped'], stats['read'], stats['inserted']) == (8, 2, 2)
+        assert Book.query.count() == 10
+        assert import_books(str(source), resume=False)['duplicates'] == 10
+
+
+def test_bad_jsonl_lines_are_counted_as_invalid(app, tmp_path):
+    source = tmp_path / 'catalog.jsonl'
+    source.write_text('\n'.join([
+        '{"title": "Good", "author": "A", "isbn": "9780000000001", "year": 2001}',
+        '{"title": "Broken", ',
+        '["not", "an", "object"]',
+        '42',
+        '{"title": "Also Good", "author": "B", "isbn": "9780000000002", "year": 2002}',
+    ]) + '\n')
+
+    with app.app_context():
+        stats = import_books(str(source), batch_size=2)
+        assert (stats['read'], stats['inserted'], stats['invalid']) == (5, 2, 3)
+        assert import_books(str(source))['skipped'] == 5
+
+
+def test_rows_skipped_by_the_database_are_not_counted_as_inserted(app):
+    records = [{'title': title, 'author': 'A', 'isbn': isbn, 'year': 2000}
+               for title, isbn in (('Fresh', '9780000000001'), ('Raced', '9780000000002'))]
+
+    def insert_raced_book(stats, seconds):
+        # Another process adds the second book after the import read the catalog's ISBNs
+        if stats['read'] == 1:
+            with db.engine.begin() as conn:
+                conn.execute(db.insert(Book).values(title='Raced', author='A', isbn='9780000000002',
+                                                    publication_year=2000))
+
+    with app.app_context():
+        stats = import_records(records, batch_size=1, progress=insert_raced_book)
+        assert (stats['inserted'], stats['duplicates']) == (1, 1)
+        assert Book.query.count() == 2
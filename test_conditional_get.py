@@ -0,0 +1,84 @@
+"""ETag / Last-Modified revalidation of the catalog and book pages."""
+from conftest import login
+
+
+def _revalidate(client, url, response):
+    return client.get(url, headers={'If-None-Match': response.headers['ETag']})
+
+
+def test_catalog_revalidates_until_a_book_changes(app, make_user, make_book):
+    book_id = make_book('Conditional', quantity=2)
+    client = login(app.test_client(), make_user('reader'))
+
+    first = client.get('/books')
+    assert first.status_code == 200 and first.headers['ETag'] and first.headers['Last-Modified']
+    assert _revalidate(client, '/books', first).status_code == 304
+
+    client.post(f'/borrow/{book_id}')
+    client.get('/dashboard')  # consume the flash message
+    assert _revalidate(client, '/books', first).status_code == 200
+
+
+def test_book_page_tracks_the_users_own_state(app, make_user, make_book):
+    book_id = make_book('Detail', quantity=2)
+    client = login(app.test_client(), make_user('reader'))
+    other = login(app.test_client(), make_user('other'))
+    url = f'/book/{book_id}'
+
+    first = client.get(url)
+    assert _revalidate(client, url, first).status_code == 304
+    # Someone else's cached copy is never valid for this user
+    assert _revalidate(other, url, first).status_code == 200
+
+    client.post(f'/wishlist/add/{book_id}')
+    # The flash from adding shows on the next page even though nothing else changed
+    assert _revalidate(client, url, first).status_code == 200
+    second = client.get(url)
+    assert second.headers['ETag'] != first.headers['ETag']
+    assert _revalidate(client, url, second).status_code == 304
+    assert client.get('/book/999999').status_code == 404
+
+
+def test_book_page_without_timestamps(app, make_user, make_book):
+    from extensions import db
+    from models import Book
+
+    book_id = make_book('Legacy')
+    with app.app_context():
+        db.session.execute(db.update(Book).values(updated_at=None, created_at=None))
+        db.session.commit()
+    client = login(app.test_client(), make_user('reader'))
+    response = client.get(f'/book/{book_id}')
+    assert response.status_code == 200 and 'Last-Modified' not in response.headers
+    assert _revalidate(client, f'/book/{book_id}', response).status_code == 304
+    assert client.get('/book/999999').status_code == 404
+
+
+def test_wishlist_changes_move_last_modified(app, make_user, make_book):
+    from datetime import datetime, timedelta
+
+    from extensions import db
+    from models import Book, User
+
+    book_id = make_book('Wished')
+    user_id = make_user('reader')
+    client = login(app.test_client(), user_id)
+    an_hour_ago = datetime.now() - timedelta(hours=1)
+
+    def backdate():
+        # Last-Modified has one-second resolution; keep every earlier change well in the past
+        with app.app_context():
+            db.session.execute(db.update(Book).values(updated_at=an_hour_ago))
+            db.session.execute(db.update(User).values(wishlist_updated_at=an_hour_ago))
+            db.session.commit()
+
+    def revalidate_by_date(url, response):
+        return client.get(url, headers={'If-Modified-Since': response.headers['Last-Modified']})
+
+    for change in (lambda: client.post('/api/v1/me/wishlist', json={'book_id': book_id}),
+                   lambda: client.delete(f'/api/v1/me/wishlist/{book_id}')):
+        backdate()
+        pages = {url: client.get(url) for url in ('/books', f'/book/{book_id}')}
+        assert all(revalidate_by_date(url, page).status_code == 304 for url, page in pages.items())
+        assert change().status_code in (200, 201)
+        assert all(revalidate_by_date(url, page).status_code == 200 for url, page in pages.items())
@@ -0,0 +1,68 @@
+"""Cover uploads: content-hash dedupe and background-rendered variants."""
+import io
+import os
+
+import pytest
+
+from conftest import login
+from cover_uploads import URL_PREFIX, cover_store
+from extensions import db
+from models import Book
+
+
+@pytest.fixture
+def upload_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(cover_store, 'folder', str(tmp_path))
+    monkeypatch.setattr(cover_store, '_ready', set())
+    return tmp_path
+
+
+def _png(color):
+    Image = pytest.importorskip('PIL.Image')
+    buffer = io.BytesIO()
+    Image.new('RGB', (900, 1350), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def _add_book(client, isbn, data, filename='cover.png'):
+    return client.post('/admin/books', data={
+        'title': f'Book {isbn}', 'author': 'Author', 'isbn': isbn, 'publication_year': '2001',
+        'quantity': '1', 'cover_file': (io.BytesIO(data), filename),
+    }, content_type='multipart/form-data')
+
+
+def test_duplicate_uploads_share_one_file(app, make_user, upload_folder):
+    client = login(app.test_client(), make_user('admin', is_admin=True))
+    image = b'GIF89a not really decoded here'
+    _add_book(client, '111', image, 'first.gif')
+    _add_book(client, '222', image, 'second.GIF')
+    cover_store.join()
+
+    with app.app_context():
+        urls = {url for (url,) in db.session.query(Book.image_url)}
+    assert len(urls) == 1 and urls.pop().startswith(URL_PREFIX)
+    assert len([name for name in os.listdir(upload_folder) if name.endswith('.gif')]) == 1
+
+    assert _add_book(client, '333', b'#!/bin/sh', 'evil.sh').status_code == 302
+    with app.app_context():
+        assert Book.query.filter_by(isbn='333').first() is None
+
+
+def test_variants_are_rendered_and_served(app, make_user, upload_folder):
+    Image = pytest.importorskip('PIL.Image')
+    client = login(app.test_client(), make_user('admin', is_admin=True))
+    _add_book(client, '444', _png('red'))
+    with app.app_context():
+        book = Book.query.filter_by(isbn='444').one()
+        book_id, url = book.id, book.image_url
+    cover_store.join()
+
+    thumb = cover_store.variant_url(url, 'thumb')
+    assert thumb != url
+    with Image.open(os.path.join(upload_folder, thumb[len(URL_PREFIX):])) as variant:
+        assert variant.size == (240, 360)
+    assert thumb in client.get('/books').get_data(as_text=True)
+    assert cover_store.variant_url(url, 'medium') in client.get(f'/book/{book_id}').get_data(as_text=True)
+
+    remote = 'https://covers.openlibrary.org/b/isbn/9780061122415-L.jpg'
+    assert cover_store.variant_url(remote, 'thumb') == 'https://covers.openlibrary.org/b/isbn/9780061122415-M.jpg'
@@ -0,0 +1,96 @@
+"""Cover resolver against a local stub of the Open Library endpoints."""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from covers import CoverResolver, resolve_missing_covers
+from extensions import db
+from models import Book
+
+COVERED_ISBN = '9780000000017'
+
+
+class StubOpenLibrary(BaseHTTPRequestHandler):
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        StubOpenLibrary.requests.append(self.path)
+        self.send_response(200 if COVERED_ISBN in self.path else 404)
+        self.end_headers()
+
+    def do_GET(self):
+        StubOpenLibrary.requests.append(self.path)
+        url = urlparse(self.path)
+        if url.path != '/search.json':
+            self.send_response(404)
+            self.end_headers()
+            return
+        title = parse_qs(url.query).get('title', [''])[0]
+        if title == 'Flaky':
+            self.send_response(503)
+            self.end_headers()
+            return
+        if title == 'Garbled':
+            body = b'<html>Gateway timeout</html>'
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        docs = [{'cover_i': 42}] if title == 'Found By Search' else []
+        body = json.dumps({'docs': docs}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def stub_url():
+    StubOpenLibrary.requests = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubOpenLibrary)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    server.server_close()
+
+
+def test_resolves_concurrently_and_remembers_answers(app, make_book, stub_url, tmp_path):
+    by_isbn = make_book('Has Cover', isbn=COVERED_ISBN)
+    by_search = make_book('Found By Search', isbn='9780000000024')
+    nothing = make_book('Nothing Anywhere', isbn='9780000000031')
+    flaky = make_book('Flaky', isbn='9780000000048')
+    resolver = CoverResolver(covers_url=stub_url, search_url=stub_url + '/search.json', rate=0)
+    cache_path = str(tmp_path / 'covers.sqlite3')
+
+    with app.app_context():
+        stats = resolve_missing_covers(cache_path, resolver=resolver, workers=4, batch_size=3)
+        assert (stats['found'], stats['not_found'], stats['errors']) == (2, 1, 1)
+        images = dict(db.session.query(Book.id, Book.image_url))
+        assert images[by_isbn] == f'{stub_url}/b/isbn/{COVERED_ISBN}-L.jpg'
+        assert images[by_search] == f'{stub_url}/b/id/42-L.jpg'
+        assert images[nothing] is None and images[flaky] is None
+
+        # The "no cover" answer is cached; only the failed lookup is retried
+        StubOpenLibrary.requests = []
+        stats = resolve_missing_covers(cache_path, resolver=resolver, workers=4)
+        assert (stats['cached'], stats['checked'], stats['errors']) == (1, 1, 1)
+        assert all('9780000000031' not in path and 'Nothing' not in path for path in StubOpenLibrary.requests)
+
+
+def test_unreadable_search_responses_count_as_errors(app, make_book, stub_url, tmp_path):
+    garbled = make_book('Garbled', isbn='9780000000055')
+    resolver = CoverResolver(covers_url=stub_url, search_url=stub_url + '/search.json', rate=0)
+
+    with app.app_context():
+        stats = resolve_missing_covers(str(tmp_path / 'covers.sqlite3'), resolver=resolver, workers=2)
+        assert (stats['found'], stats['errors']) == (0, 1)
+        assert db.session.get(Book, garbled).image_url is None
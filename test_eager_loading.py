@@ -0,0 +1,61 @@
+"""Listings eager-load their books: a fixed query count however many rows."""
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm import joinedload
+
+from circulation import checkout_book, return_borrowing
+from conftest import login
+from extensions import db
+from models import Borrowing, Review, Wishlist, eager
+
+PAGES = ('/dashboard', '/profile', '/wishlist')
+
+
+def count_queries(client, url):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(Engine, 'after_cursor_execute', record)
+    try:
+        assert client.get(url).status_code == 200
+    finally:
+        event.remove(Engine, 'after_cursor_execute', record)
+    return len(statements)
+
+
+def reader_with(app, make_user, make_book, name, rows):
+    """A user with `rows` open loans, returned loans, wishlist entries and reviews"""
+    user_id = make_user(name)
+    with app.app_context():
+        for i in range(rows):
+            book_id = make_book(f'{name} {i}', quantity=2)
+            checkout_book(user_id, book_id)
+            return_borrowing(checkout_book(user_id, make_book(f'{name} old {i}')).id)
+            db.session.add(Wishlist(user_id=user_id, book_id=book_id))
+            db.session.add(Review(user_id=make_user(f'{name} critic {i}'), book_id=book_id, rating=4))
+        db.session.commit()
+    return user_id, book_id
+
+
+@pytest.mark.parametrize('url', PAGES + ('book',))
+def test_query_count_does_not_grow_with_rows(app, make_user, make_book, url):
+    counts = []
+    for name, rows in (('light', 1), ('heavy', 6)):
+        user_id, book_id = reader_with(app, make_user, make_book, name, rows)
+        client = login(app.test_client(), user_id)
+        counts.append(count_queries(client, f'/book/{book_id}' if url == 'book' else url))
+    assert counts[0] == counts[1]
+
+
+def test_strict_loading_raises_on_lazy_relationships(app, make_user, make_book):
+    user_id = make_user('reader')
+    with app.app_context():
+        checkout_book(user_id, make_book('Loaned'))
+        loan = Borrowing.query.options(*eager(joinedload(Borrowing.book))).one()
+        assert loan.book.title == 'Loaned'
+        with pytest.raises(InvalidRequestError):
+            loan.user
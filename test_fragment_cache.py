@@ -0,0 +1,32 @@
+"""Cached catalog cards: reuse across users, invalidation, per-user actions."""
+from conftest import login
+from fragments import book_cards
+
+
+def test_cards_are_shared_and_refreshed_on_change(app, make_user, make_book):
+    book_id = make_book('Shared Card', quantity=2)
+    alice = login(app.test_client(), make_user('alice'))
+    bob = login(app.test_client(), make_user('bob'))
+
+    alice.post(f'/wishlist/add/{book_id}')
+    alice.get('/dashboard')  # consume the flash message
+    alice_page = alice.get('/books').get_data(as_text=True)
+    bob_page = bob.get('/books').get_data(as_text=True)
+    assert (book_cards.misses, book_cards.hits) == (1, 1)
+    # Same cached card, different per-user actions
+    assert '♥ In Wishlist' in alice_page and '♥ In Wishlist' not in bob_page
+    assert '(2/2)' in alice_page and '(2/2)' in bob_page
+
+    bob.post(f'/borrow/{book_id}')
+    assert book_cards.invalidations == 1
+    bob.get('/dashboard')
+    bob_page = bob.get('/books').get_data(as_text=True)
+    assert '(1/2)' in bob_page and '✓ Borrowed' in bob_page
+    assert '(1/2)' in alice.get('/books').get_data(as_text=True)
+    assert book_cards.stats()['hit_rate'] == 0.5
+
+
+def test_stats_are_admin_only(app, make_user):
+    assert login(app.test_client(), make_user('reader')).get('/admin/cache-stats').status_code == 302
+    stats = login(app.test_client(), make_user('root', is_admin=True)).get('/admin/cache-stats').get_json()
+    assert set(stats['book_cards']) >= {'hits', 'misses', 'hit_rate'}
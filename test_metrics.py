@@ -0,0 +1,53 @@
+"""Request metrics: Prometheus output, access control, budget logging."""
+import logging
+import re
+
+import pytest
+
+from conftest import login
+from metrics import metrics
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_routes_are_timed_and_their_queries_counted(app, make_user, make_book):
+    make_book('Counted')
+    reader = login(app.test_client(), make_user('reader'))
+    reader.get('/books')
+    reader.get('/books?search=counted')
+
+    text = login(app.test_client(), make_user('root', is_admin=True)).get('/admin/metrics').get_data(as_text=True)
+    assert 'library_request_duration_seconds_count{endpoint="books",method="GET"} 2' in text
+    assert 'library_responses_total{endpoint="books",method="GET",status="200"} 2' in text
+    queries = float(re.search(r'library_request_queries_sum\{endpoint="books",method="GET"\} (\S+)', text).group(1))
+    assert queries >= 4  # at least a validator and a page query per request
+    assert 'library_cache_misses_total{cache="query_cache"}' in text
+
+
+def test_metrics_need_admin_or_token(app, make_user):
+    client = app.test_client()
+    assert client.get('/admin/metrics').status_code == 302
+    assert login(app.test_client(), make_user('reader')).get('/admin/metrics').status_code == 302
+    app.config['METRICS_TOKEN'] = 'scrape-me'
+    try:
+        assert client.get('/admin/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 302
+        response = client.get('/admin/metrics', headers={'Authorization': 'Bearer scrape-me'})
+        assert response.status_code == 200 and response.mimetype == 'text/plain'
+    finally:
+        app.config['METRICS_TOKEN'] = ''
+
+
+def test_requests_over_budget_are_logged(app, make_user, caplog):
+    reader = login(app.test_client(), make_user('reader'))
+    metrics.query_budget = 0
+    try:
+        with caplog.at_level(logging.WARNING, logger=app.logger.name):
+            reader.get('/profile')
+    finally:
+        metrics.query_budget = app.config['METRICS_QUERY_BUDGET']
+    assert any('Over budget (queries): GET /profile [profile]' in message for message in caplog.messages)
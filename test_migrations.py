@@ -0,0 +1,122 @@
+"""Migration runner and query-plan tests for the hot-path indexes."""
+import threading
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+import migrations
+from extensions import db
+from models import Book, Borrowing, Review, Wishlist
+
+# The tables as they were before any migration existed
+LEGACY_SCHEMA = [
+    """CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE,
+       email VARCHAR(120) NOT NULL UNIQUE, password VARCHAR(255) NOT NULL, is_admin BOOLEAN,
+       created_at DATETIME, updated_at DATETIME)""",
+    """CREATE TABLE books (id INTEGER PRIMARY KEY, title VARCHAR(200) NOT NULL, author VARCHAR(120) NOT NULL,
+       isbn VARCHAR(13) NOT NULL UNIQUE, publication_year INTEGER NOT NULL, quantity INTEGER,
+       available BOOLEAN, description TEXT, created_at DATETIME, updated_at DATETIME)""",
+    """CREATE TABLE borrowings (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users(id),
+       book_id INTEGER NOT NULL REFERENCES books(id), borrow_date DATETIME NOT NULL,
+       due_date DATETIME NOT NULL, return_date DATETIME)""",
+    """CREATE TABLE wishlists (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, book_id INTEGER NOT NULL,
+       added_at DATETIME)""",
+    """CREATE TABLE reviews (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, book_id INTEGER NOT NULL,
+       rating INTEGER NOT NULL, comment TEXT, created_at DATETIME, updated_at DATETIME)""",
+    "INSERT INTO users (id, username, email, password) VALUES (1, 'old', 'old@example.com', 'x')",
+    "INSERT INTO books (id, title, author, isbn, publication_year, quantity) VALUES (1, 'Old', 'A', '1', 1999, 3)",
+    """INSERT INTO borrowings (user_id, book_id, borrow_date, due_date)
+       VALUES (1, 1, '2024-01-01 00:00:00', '2024-01-15 00:00:00')""",
+    "INSERT INTO reviews (user_id, book_id, rating) VALUES (1, 1, 4)",
+]
+
+
+def test_upgrade_brings_a_legacy_database_up_to_date(tmp_path):
+    engine = create_engine('sqlite:///' + str(tmp_path / 'legacy.db'))
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.execute(text(statement))
+
+    applied = migrations.upgrade(engine)
+    assert [version for version, _ in applied] == [m[0] for m in migrations.MIGRATIONS]
+    assert migrations.upgrade(engine) == []
+
+    with engine.connect() as conn:
+        row = conn.execute(text('SELECT available_copies, rating_count, rating_avg FROM books')).one()
+        assert tuple(row) == (2, 1, 4.0)
+        assert conn.execute(text('SELECT COUNT(*) FROM books WHERE updated_at IS NULL')).scalar() == 0
+    indexes = {ix['name'] for ix in inspect(engine).get_indexes('borrowings')}
+    assert {'ix_borrowings_open_due', 'ix_borrowings_user_open', 'ix_borrowings_book_return'} <= indexes
+    assert inspect(engine).has_table('reminders')
+    engine.dispose()
+
+
+
+def test_workers_booting_together_apply_each_migration_once(tmp_path, monkeypatch):
+    path = str(tmp_path / 'legacy.db')
+    with create_engine('sqlite:///' + path).begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.execute(text(statement))
+    migrations.applied_versions(create_engine('sqlite:///' + path))
+
+    # Both see every migration as pending, then race for each one
+    engines = [create_engine('sqlite:///' + path, connect_args={'timeout': 30}) for _ in range(2)]
+    barrier = threading.Barrier(len(engines))
+    original = migrations.applied_versions
+
+    def pending_for_all(engine):
+        versions = original(engine)
+        barrier.wait()
+        return versions
+
+    results, errors = [], []
+
+    def boot(engine):
+        try:
+            results.append(migrations.upgrade(engine))
+        except Exception as e:
+            errors.append(e)
+
+    monkeypatch.setattr(migrations, 'applied_versions', pending_for_all)
+    threads = [threading.Thread(target=boot, args=(engine,)) for engine in engines]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for engine in engines:
+        engine.dispose()
+    assert errors == []
+    applied = sorted(version for result in results for version, _ in result)
+    assert applied == [m[0] for m in migrations.MIGRATIONS]
+
+def _plan(query):
+    """SQLite's EXPLAIN QUERY PLAN detail lines for an ORM query"""
+    sql = query.statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+    return [row[-1] for row in db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+
+
+@pytest.mark.parametrize('build_query, index', [
+    (lambda: Borrowing.query.filter_by(user_id=1, return_date=None).order_by(Borrowing.due_date),
+     'ix_borrowings_user_open'),
+    (lambda: db.session.query(db.func.count(Borrowing.id)).filter_by(book_id=1, return_date=None),
+     'ix_borrowings_book_return'),
+    (lambda: Borrowing.overdue_query(datetime(2024, 1, 1)),
+     'ix_borrowings_open_due'),
+    (lambda: Borrowing.query.filter_by(user_id=1).order_by(Borrowing.borrow_date.desc(), Borrowing.id.desc()),
+     'ix_borrowings_user_history'),
+    (lambda: Review.query.filter_by(book_id=1).order_by(Review.created_at.desc()),
+     'ix_reviews_book_created'),
+    (lambda: Wishlist.query.filter_by(user_id=1).order_by(Wishlist.added_at.desc()),
+     'ix_wishlists_user_added'),
+    (lambda: Book.query.order_by(Book.publication_year.desc(), Book.id.desc()),
+     'ix_books_publication_year'),
+    (lambda: Book.query.order_by(Book.available_copies, Book.id),
+     'ix_books_available_copies'),
+])
+def test_hot_queries_use_their_index(app, build_query, index):
+    # No ANALYZE, just like the app: plans come from SQLite's default heuristics
+    with app.app_context():
+        plan = _plan(build_query())
+        assert any(index in line for line in plan), plan
+        assert not any('TEMP B-TREE' in line for line in plan), plan
@@ -0,0 +1,91 @@
+"""Password hashing pool: rehash on login, queue sizing, queue limit and timeout."""
+import threading
+import time
+
+import pytest
+
+from extensions import db
+from models import User
+from werkzeug.security import generate_password_hash
+
+import passwords
+from passwords import HashingBusy, PasswordHasher, password_hasher
+
+
+@pytest.fixture
+def cheap_hashes(app):
+    password_hasher.configure(method='pbkdf2:sha256:1000')
+    yield
+    password_hasher.configure(method=app.config['PASSWORD_HASH_METHOD'])
+
+
+def test_login_upgrades_old_hash_parameters(app, make_user, cheap_hashes):
+    user_id = make_user('reader')  # stored with werkzeug's default parameters
+    client = app.test_client()
+    client.post('/login', data={'username': 'reader', 'password': 'wrong'})
+    with app.app_context():
+        assert not db.session.get(User, user_id).password.startswith('pbkdf2:sha256:1000$')
+
+    response = client.post('/login', data={'username': 'reader', 'password': 'Passw0rd!'})
+    assert response.headers['Location'].endswith('/dashboard')
+    with app.app_context():
+        stored = db.session.get(User, user_id).password
+    assert stored.startswith('pbkdf2:sha256:1000$')
+    assert password_hasher.verify(stored, 'Passw0rd!') == (True, None)
+
+
+def test_salt_length_change_triggers_rehash():
+    stored = generate_password_hash('Passw0rd!', method='pbkdf2:sha256:1000', salt_length=16)
+    prefix = 'pbkdf2:sha256:1000'
+    assert passwords._verify(stored, 'Passw0rd!', prefix, 16, prefix) == (True, None)
+    matches, new_hash = passwords._verify(stored, 'Passw0rd!', prefix, 8, prefix)
+    assert matches and len(new_hash.split('$')[1]) == 8
+    assert passwords._verify(stored, 'wrong', prefix, 8, prefix) == (False, None)
+
+
+def test_default_queue_holds_what_the_workers_finish_in_time(monkeypatch):
+    monkeypatch.setattr(passwords.os, 'cpu_count', lambda: 4)
+    # 2 workers at 0.2 s a hash finish 100 hashes in 10 s; 2 of them are running
+    assert passwords.default_queue_limit(2, 10) == 98
+    assert passwords.default_queue_limit(8, 1) == 12  # only 4 CPUs hash at once
+    hasher = PasswordHasher()
+    hasher.configure(workers=2, timeout=10)
+    assert hasher.queue_size() == 98
+    hasher.configure(queue_limit=5)
+    assert hasher.queue_size() == 5
+
+
+def test_full_queue_and_timeouts_fail_fast():
+    hasher = PasswordHasher()
+    hasher.configure(workers=1, queue_limit=0, timeout=5, nice=0)
+    try:
+        slow = threading.Thread(target=hasher.run, args=(time.sleep, 1))
+        slow.start()
+        time.sleep(0.2)
+        started = time.monotonic()
+        with pytest.raises(HashingBusy):
+            hasher.run(time.sleep, 0)
+        assert time.monotonic() - started < 0.1
+        slow.join()
+
+        hasher.configure(timeout=0.2)
+        with pytest.raises(HashingBusy):
+            hasher.run(time.sleep, 1)
+    finally:
+        hasher.shutdown()
+
+
+def test_api_login_survives_a_failed_hash_upgrade(app, make_user, cheap_hashes, monkeypatch):
+    from sqlalchemy.exc import OperationalError
+
+    user_id = make_user('reader')
+
+    def locked():
+        raise OperationalError('UPDATE users', {}, Exception('database is locked'))
+
+    monkeypatch.setattr(db.session, 'commit', locked)
+    response = app.test_client().post('/api/v1/session', json={'username': 'reader', 'password': 'Passw0rd!'})
+    assert response.status_code == 200 and response.get_json()['id'] == user_id
+    monkeypatch.undo()
+    with app.app_context():
+        assert not db.session.get(User, user_id).password.startswith('pbkdf2:sha256:1000$')
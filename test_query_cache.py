@@ -0,0 +1,70 @@
+"""Query-result cache: catalog reads, commit-driven invalidation, shared backend."""
+import pytest
+from flask import Flask, g
+
+from cache import QueryCache, SQLiteBackend, query_cache
+from conftest import login
+from extensions import db
+from models import Book
+
+
+def test_catalog_page_is_cached_until_a_borrow(app, make_user, make_book):
+    book_id = make_book('Last Copy', quantity=1)
+    reader = login(app.test_client(), make_user('reader'))
+
+    assert 'Last Copy' in reader.get('/books?filter=available').get_data(as_text=True)
+    misses = query_cache.misses
+    assert 'Last Copy' in reader.get('/books?filter=available').get_data(as_text=True)
+    assert query_cache.misses == misses
+
+    reader.post(f'/borrow/{book_id}')
+    reader.get('/dashboard')  # consume the flash message
+    assert 'Last Copy' not in reader.get('/books?filter=available').get_data(as_text=True)
+
+
+def test_rolled_back_writes_do_not_invalidate(app, make_book):
+    book_id = make_book('Unchanged')
+    with app.app_context():
+        calls = []
+        count = lambda: calls.append(1) or Book.query.count()  # noqa: E731
+        query_cache.get_or_set('count', count, tags=('books',))
+        db.session.get(Book, book_id).title = 'Edited'
+        db.session.flush()
+        db.session.rollback()
+        query_cache.get_or_set('count', count, tags=('books',))
+        assert len(calls) == 1
+
+        db.session.execute(db.update(Book).where(Book.id == book_id).values(title='Edited'))
+        db.session.commit()
+        query_cache.get_or_set('count', count, tags=('books',))
+        assert len(calls) == 2
+
+
+def test_sqlite_backend_is_shared_between_caches(tmp_path):
+    # The directory is created on first use, like instance/ on a fresh checkout
+    path = str(tmp_path / 'instance' / 'cache.sqlite3')
+    first, second = QueryCache(), QueryCache()
+    first.backend, second.backend = SQLiteBackend(path), SQLiteBackend(path)
+
+    first.get_or_set('ids', lambda: [1, 2, 3], tags=('books',))
+    assert second.get_or_set('ids', lambda: [], tags=('books',)) == [1, 2, 3]
+    second.invalidate('books')
+    assert first.get_or_set('ids', lambda: [4], tags=('books',)) == [4]
+
+
+def test_memory_backend_is_refused_with_several_workers(monkeypatch):
+    app = Flask('several_workers')
+    app.config['CACHE_BACKEND'] = 'memory'
+    monkeypatch.setenv('WEB_CONCURRENCY', '4')
+    with pytest.raises(ValueError):
+        QueryCache().init_app(app)
+    monkeypatch.setenv('WEB_CONCURRENCY', '1')
+    QueryCache().init_app(app)
+
+
+def test_misses_are_computed_on_the_primary(app):
+    with app.test_request_context():
+        g.read_replica = True
+        assert query_cache.get_or_set('routing', lambda: ('replica' if g.read_replica else 'primary',),
+                                      tags=('books',)) == ('primary',)
+        assert g.read_replica
@@ -0,0 +1,83 @@
+"""Reminder sweep: overdue vs due-soon, batching, re-runs; the admin overdue report."""
+from datetime import datetime, timedelta
+
+from cache import query_cache
+from circulation import checkout_book, return_borrowing
+from conftest import login
+from extensions import db
+from models import Reminder
+from reminders import sweep_reminders
+
+
+def loans(app, make_user, make_book, loan_days):
+    """One open loan per entry in `loan_days`, for one reader"""
+    user_id = make_user('reader')
+    with app.app_context():
+        return [checkout_book(user_id, make_book(f'Book {i}'), loan_days=days).id
+                for i, days in enumerate(loan_days)]
+
+
+def reminder_kinds(app):
+    with app.app_context():
+        return dict(db.session.query(Reminder.borrowing_id, Reminder.kind))
+
+
+def test_splits_overdue_from_due_soon_across_batches(app, make_user, make_book):
+    overdue, soon, later, returned = loans(app, make_user, make_book, [-5, 2, 10, -5])
+    with app.app_context():
+        return_borrowing(returned)
+        # Five loans due within the horizon, two at a time: a batch boundary falls between them
+        more = [checkout_book(make_user(f'reader {i}'), make_book(f'More {i}'), loan_days=-1).id for i in range(3)]
+        counts = sweep_reminders(due_soon_days=3, batch_size=2)
+    assert counts == {'scanned': 5, 'overdue': 4, 'due_soon': 1, 'batches': 3}
+    assert reminder_kinds(app) == {overdue: 'overdue', soon: 'due_soon', **{loan: 'overdue' for loan in more}}
+    assert later not in reminder_kinds(app) and returned not in reminder_kinds(app)
+
+
+def test_rerunning_the_sweep_adds_nothing_until_a_loan_falls_overdue(app, make_user, make_book):
+    overdue, soon = loans(app, make_user, make_book, [-1, 2])
+    with app.app_context():
+        sweep_reminders(due_soon_days=3, batch_size=1)
+        again = sweep_reminders(due_soon_days=3, batch_size=1)
+        assert (again['overdue'], again['due_soon'], again['scanned']) == (0, 0, 2)
+
+        # Three days on, the due-soon loan is overdue and gets its second reminder
+        later = sweep_reminders(now=datetime.now() + timedelta(days=3), due_soon_days=3)
+        assert (later['overdue'], later['due_soon']) == (1, 0)
+        kinds = sorted(db.session.query(Reminder.kind).filter_by(borrowing_id=soon).all())
+        assert kinds == [('due_soon',), ('overdue',)]
+
+
+def test_overdue_report_is_admin_only(app, make_user, make_book):
+    loans(app, make_user, make_book, [-4])
+    reader = login(app.test_client(), make_user('not admin'))
+    response = reader.get('/admin/overdue')
+    assert response.status_code == 302 and response.location.endswith('/dashboard')
+
+    admin = login(app.test_client(), make_user('root', is_admin=True))
+    html = admin.get('/admin/overdue').get_data(as_text=True)
+    assert '1 loan(s) past their due date' in html and 'Book 0' in html
+
+
+def test_overdue_total_is_cached_until_a_loan_changes(app, make_user, make_book, monkeypatch):
+    import app as app_module
+
+    minute = datetime.now()
+
+    class FrozenDatetime(datetime):
+        # One fixed minute, so both views share a cache key
+        @classmethod
+        def now(cls, tz=None):
+            return minute
+
+    monkeypatch.setattr(app_module, 'datetime', FrozenDatetime)
+    loans(app, make_user, make_book, [-4])
+    admin = login(app.test_client(), make_user('root', is_admin=True))
+    admin.get('/admin/overdue')
+    hits = query_cache.hits
+    assert '1 loan(s) past' in admin.get('/admin/overdue').get_data(as_text=True)
+    assert query_cache.hits == hits + 1
+
+    with app.app_context():
+        checkout_book(make_user('late'), make_book('Late'), loan_days=-2)
+    assert '2 loan(s) past' in admin.get('/admin/overdue').get_data(as_text=True)
@@ -0,0 +1,89 @@
+"""Read-replica routing against two SQLite files: reads, writes, read-your-writes."""
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine
+
+from conftest import login
+from extensions import REPLICA_BIND, RYW_SESSION_KEY, db
+from models import Borrowing
+
+
+class Replica:
+    def __init__(self, app, path):
+        self.app = app
+        self.path = path
+        self.engine = create_engine('sqlite:///' + path)
+
+    def sync(self, **titles):
+        """Copy the primary into the replica, then retitle books so the pages show which one served them"""
+        with self.app.app_context():
+            primary = sqlite3.connect(db.engine.url.database)
+        target = sqlite3.connect(self.path)
+        try:
+            primary.backup(target)
+            for book_id, title in titles.items():
+                target.execute('UPDATE books SET title = ? WHERE id = ?', (title, int(book_id)))
+            target.commit()
+        finally:
+            primary.close()
+            target.close()
+
+    def count(self, table):
+        with self.engine.connect() as conn:
+            return conn.exec_driver_sql(f'SELECT count(*) FROM {table}').scalar()
+
+
+@pytest.fixture
+def replica(app, tmp_path):
+    replica = Replica(app, str(tmp_path / 'replica.db'))
+    with app.app_context():
+        db.engines[REPLICA_BIND] = replica.engine
+    app.config['SQLALCHEMY_BINDS'][REPLICA_BIND] = replica.engine.url.render_as_string()
+    try:
+        yield replica
+    finally:
+        del app.config['SQLALCHEMY_BINDS'][REPLICA_BIND]
+        with app.app_context():
+            del db.engines[REPLICA_BIND]
+        replica.engine.dispose()
+
+
+def page(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    return response.get_data(as_text=True)
+
+
+def test_reads_go_to_the_replica_and_writes_to_the_primary(app, make_user, make_book, replica):
+    book_id = make_book('Primary Copy', quantity=2, isbn='0001')
+    client = login(app.test_client(), make_user('reader'))
+    replica.sync(**{str(book_id): 'Replica Copy'})
+
+    assert 'Replica Copy' in page(client, f'/book/{book_id}')
+    assert 'Replica Copy' in page(client, '/books')
+
+    assert client.post(f'/borrow/{book_id}').status_code == 302
+    with app.app_context():
+        assert Borrowing.query.count() == 1
+    assert replica.count('borrowings') == 0
+
+
+def test_own_writes_are_read_from_the_primary_until_the_window_ends(app, make_user, make_book, replica):
+    book_id = make_book('Primary Copy', isbn='0001')
+    client = login(app.test_client(), make_user('reader'))
+    replica.sync(**{str(book_id): 'Replica Copy'})
+    assert 'Replica Copy' in page(client, f'/book/{book_id}')
+    with client.session_transaction() as sess:
+        assert RYW_SESSION_KEY not in sess
+
+    # The redirect after the write shows the review, which the replica has not seen
+    response = client.post(f'/review/{book_id}', data={'rating': 5, 'comment': 'Fresh ink'},
+                           follow_redirects=True)
+    html = response.get_data(as_text=True)
+    assert 'Primary Copy' in html and 'Fresh ink' in html
+    assert replica.count('reviews') == 0
+
+    with client.session_transaction() as sess:
+        sess[RYW_SESSION_KEY] = 0
+    assert 'Replica Copy' in page(client, f'/book/{book_id}')
@@ -0,0 +1,45 @@
+"""Review submission keeps the book's rating aggregates; recount-ratings repairs them."""
+from conftest import login
+from extensions import db
+from models import Book, Review
+
+
+def aggregates(app, book_id):
+    with app.app_context():
+        book = db.session.get(Book, book_id)
+        return book.rating_sum, book.rating_count, book.rating_avg
+
+
+def test_adding_and_updating_reviews_adjusts_aggregates(app, make_user, make_book):
+    book_id = make_book('Reviewed')
+    first = login(app.test_client(), make_user('first'))
+    second = login(app.test_client(), make_user('second'))
+
+    assert first.post(f'/review/{book_id}', data={'rating': 4}).status_code == 302
+    assert aggregates(app, book_id) == (4, 1, 4.0)
+    second.post(f'/review/{book_id}', data={'rating': 1, 'comment': 'Dull'})
+    assert aggregates(app, book_id) == (5, 2, 2.5)
+
+    # A second review from the same reader replaces the first
+    first.post(f'/review/{book_id}', data={'rating': 5, 'comment': 'Better on rereading'})
+    assert aggregates(app, book_id) == (6, 2, 3.0)
+    with app.app_context():
+        assert Review.query.filter_by(book_id=book_id).count() == 2
+
+    first.post(f'/review/{book_id}', data={'rating': 9})
+    assert aggregates(app, book_id) == (6, 2, 3.0)
+
+
+def test_recount_ratings_rebuilds_aggregates_from_reviews(app, make_user, make_book):
+    reviewed = make_book('Reviewed')
+    unreviewed = make_book('Unreviewed')
+    with app.app_context():
+        for name, rating in (('a', 2), ('b', 5)):
+            db.session.add(Review(user_id=make_user(name), book_id=reviewed, rating=rating))
+        db.session.execute(db.update(Book).values(rating_sum=99, rating_count=7, rating_avg=1.5))
+        db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['recount-ratings'])
+    assert result.exit_code == 0 and 'for 2 book(s)' in result.output
+    assert aggregates(app, reviewed) == (7, 2, 3.5)
+    assert aggregates(app, unreviewed) == (0, 0, 0)
@@ -0,0 +1,54 @@
+"""FTS5 catalog search: index sync, prefix matching, ranking, empty terms."""
+import pytest
+
+from conftest import login
+from extensions import db
+from models import Book
+from search import book_search
+
+
+@pytest.fixture(autouse=True)
+def fts5(app):
+    if book_search.backend.name != 'sqlite-fts5':
+        pytest.skip('SQLite build without FTS5')
+
+
+def titles(term):
+    return [book.title for book in book_search.apply(Book.query, term)]
+
+
+def test_triggers_keep_the_index_in_sync(app, make_book):
+    book_id = make_book('Old Lighthouse', isbn='0001')
+    with app.app_context():
+        assert titles('lighthouse') == ['Old Lighthouse']
+        db.session.get(Book, book_id).title = 'New Harbour'
+        db.session.commit()
+        assert titles('lighthouse') == [] and titles('harbour') == ['New Harbour']
+        db.session.delete(db.session.get(Book, book_id))
+        db.session.commit()
+        assert titles('harbour') == []
+
+
+def test_words_match_as_prefixes_across_columns(app, make_book):
+    make_book('Harry Potter', author='Joanne Rowling', isbn='0001')
+    make_book('Harbour Lights', author='Someone Else', isbn='0002')
+    with app.app_context():
+        assert titles('harr pot') == ['Harry Potter']
+        assert titles('rowl') == ['Harry Potter']
+        assert sorted(titles('har')) == ['Harbour Lights', 'Harry Potter']
+
+
+def test_title_matches_rank_above_description_matches(app, make_book):
+    make_book('Field Notes', isbn='0001', description='A field guide to the ocean')
+    make_book('Ocean', isbn='0002', description='Waves')
+    with app.app_context():
+        assert titles('ocean') == ['Ocean', 'Field Notes']
+
+
+@pytest.mark.parametrize('term', ['"', '...', '-'])
+def test_terms_without_words_match_nothing(app, make_user, make_book, term):
+    make_book('Anything')
+    client = login(app.test_client(), make_user('reader'))
+    assert client.get('/books', query_string={'search': term}).status_code == 200
+    response = client.get('/api/v1/books', query_string={'search': term})
+    assert response.status_code == 200 and response.get_json()['items'] == []